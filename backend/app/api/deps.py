@@ -0,0 +1,6 @@
+# FastAPI dependencies for services whose modules pull in heavy SDKs. Importing the service
+# inside the getter keeps the import off the startup path until the first request needs it.
+
+def get_ai_service():
+    from app.services.ai_service import ai_service
+    return ai_service
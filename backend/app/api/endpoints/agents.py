@@ -1,10 +1,16 @@
-from typing import List, Dict
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Dict, Literal, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
+from app.api.responses import list_response
 from app.core.database import get_session
 from app.models import Agent
+from app.runtime.logs import iter_run_log_lines
 from app.services.agent_service import agent_service
-from pydantic import BaseModel
+from app.services.dashboard_service import dashboard_service
+from app.services.retention_service import retention_service
+from app.services.webhook_service import webhook_service
+from pydantic import BaseModel, Field
 
 router = APIRouter()
 
@@ -15,13 +21,44 @@ class AgentCreate(BaseModel):
 class CodeUpdate(BaseModel):
     code: str
 
+class LimitsUpdate(BaseModel):
+    # None uses the server default, 0 disables the limit
+    timeout_seconds: Optional[int] = Field(None, ge=0)
+    max_log_bytes: Optional[int] = Field(None, ge=0)
+    max_log_lines: Optional[int] = Field(None, ge=0)
+
+class TriggerPolicyUpdate(BaseModel):
+    concurrency_policy: Optional[Literal["allow", "skip"]] = None  # None = allow
+    debounce_seconds: Optional[int] = Field(None, ge=0)  # None uses the server default, 0 disables
+
+class CacheUpdate(BaseModel):
+    ttl_seconds: Optional[int] = Field(None, ge=0)  # None or 0 disables the result cache
+
+class WebhookUpdate(BaseModel):
+    enabled: bool = True
+    batch_size: Optional[int] = Field(None, ge=1, le=1000)  # None = one run per event
+    batch_seconds: Optional[float] = Field(None, ge=0, le=3600)
+    rotate_token: bool = False
+
+class RetentionUpdate(BaseModel):
+    keep_last: Optional[int] = Field(None, ge=0)  # None uses the server default, 0 keeps all
+    max_age_days: Optional[int] = Field(None, ge=0)
+
 @router.get("/", response_model=List[Agent])
-def list_agents(session: Session = Depends(get_session)):
-    return agent_service.list_agents(session)
+def list_agents(request: Request, session: Session = Depends(get_session)):
+    return list_response(request, session, agent_service.list_agents_query(), lambda row: row._asdict())
+
+@router.get("/dashboard", response_model=List[dict])
+def get_dashboard(session: Session = Depends(get_session)):
+    """Every agent with latest_run, run_counts and last_success_at, for the agent list."""
+    return dashboard_service.get(session)
 
 @router.post("/", response_model=Agent)
 def create_agent(agent_in: AgentCreate, session: Session = Depends(get_session)):
-    return agent_service.create_agent(session, agent_in.name, agent_in.description)
+    try:
+        return agent_service.create_agent(session, agent_in.name, agent_in.description)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     agent = agent_service.get_agent(session, agent_id)
     if not agent:
@@ -36,9 +73,8 @@ def get_agent_code(agent_id: int, session: Session = Depends(get_session)):
     return {"code": code}
 
 @router.get("/{agent_id}/versions", response_model=List[dict])
-def list_agent_versions(agent_id: int, session: Session = Depends(get_session)):
-    versions = agent_service.list_agent_versions(session, agent_id)
-    return [{"id": v.id, "created_at": v.created_at, "parent_version_id": v.parent_version_id, "code": v.code} for v in versions]
+def list_agent_versions(agent_id: int, request: Request, session: Session = Depends(get_session)):
+    return list_response(request, session, agent_service.list_agent_versions_query(agent_id), lambda row: row._asdict())
 
 @router.post("/{agent_id}/code", response_model=dict)
 def update_agent_code(agent_id: int, update: CodeUpdate, session: Session = Depends(get_session)):
@@ -48,14 +84,65 @@ def update_agent_code(agent_id: int, update: CodeUpdate, session: Session = Depe
     return {"version_id": version.id, "ok": True}
 
 @router.delete("/{agent_id}")
-def delete_agent(agent_id: int, session: Session = Depends(get_session)):
+def delete_agent(agent_id: int, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
     success = agent_service.delete_agent(session, agent_id)
     if not success:
         raise HTTPException(status_code=404, detail="Agent not found")
+    # Runs, versions and artifacts go in small batches after the response
+    background_tasks.add_task(retention_service.purge_agent, agent_id)
     return {"ok": True}
 
+@router.put("/{agent_id}/limits", response_model=Agent)
+def update_agent_limits(agent_id: int, update: LimitsUpdate, session: Session = Depends(get_session)):
+    agent = agent_service.update_limits(session, agent_id, update.model_dump())
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
+@router.put("/{agent_id}/trigger-policy", response_model=Agent)
+def update_agent_trigger_policy(agent_id: int, update: TriggerPolicyUpdate, session: Session = Depends(get_session)):
+    agent = agent_service.update_trigger_policy(session, agent_id, update.model_dump())
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
+@router.put("/{agent_id}/cache", response_model=Agent)
+def update_agent_cache(agent_id: int, update: CacheUpdate, session: Session = Depends(get_session)):
+    agent = agent_service.update_cache(session, agent_id, update.ttl_seconds)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
+@router.put("/{agent_id}/webhook", response_model=dict)
+def update_agent_webhook(agent_id: int, update: WebhookUpdate, session: Session = Depends(get_session)):
+    """Enables/configures the agent's webhook. The token is only returned when it is issued."""
+    result = webhook_service.configure(
+        session, agent_id, update.enabled, update.batch_size, update.batch_seconds, update.rotate_token
+    )
+    if not result:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    agent, token = result
+    return {
+        "enabled": agent.webhook_token_hash is not None,
+        "url": f"/api/webhooks/{agent.id}",
+        "token": token,
+        "batch_size": agent.webhook_batch_size,
+        "batch_seconds": agent.webhook_batch_seconds,
+    }
+
+@router.put("/{agent_id}/retention", response_model=Agent)
+def update_agent_retention(agent_id: int, update: RetentionUpdate, session: Session = Depends(get_session)):
+    agent = agent_service.update_retention(session, agent_id, update.keep_last, update.max_age_days)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
 @router.get("/{agent_id}/logs", response_model=dict)
-def get_agent_logs(agent_id: int, session: Session = Depends(get_session)):
+def get_agent_logs(agent_id: int, stream: bool = False, session: Session = Depends(get_session)):
+    if stream:
+        # Plain text, decompressed block by block instead of materialised in one string
+        run = agent_service.get_latest_run(session, agent_id)
+        return StreamingResponse(iter_run_log_lines(run) if run else iter(()), media_type="text/plain")
     logs = agent_service.get_latest_run_logs(session, agent_id)
     if logs is None:
         # Return empty logs if no run found, or 404? 
@@ -63,11 +150,16 @@ def get_agent_logs(agent_id: int, session: Session = Depends(get_session)):
         return {"logs": ""}
     return {"logs": logs}
 
+@router.get("/{agent_id}/phases", response_model=dict)
+def get_agent_phases(agent_id: int, limit: int = 50, session: Session = Depends(get_session)):
+    if not agent_service.get_agent(session, agent_id):
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent_service.get_phase_breakdown(session, agent_id, limit)
+
 @router.get("/{agent_id}/secrets", response_model=List[dict])
-def list_agent_secrets(agent_id: int, session: Session = Depends(get_session)):
+def list_agent_secrets(agent_id: int, request: Request, session: Session = Depends(get_session)):
     from app.services.secret_service import secret_service
-    secrets = secret_service.get_links(session, agent_id)
-    return [{"id": s.id, "key": s.key} for s in secrets]
+    return list_response(request, session, secret_service.links_query(agent_id), lambda row: row._asdict())
 
 @router.post("/{agent_id}/secrets/{secret_id}")
 def link_secret_to_agent(agent_id: int, secret_id: int, session: Session = Depends(get_session)):
@@ -1,23 +1,38 @@
-from fastapi import APIRouter
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
-from app.services.ai_service import ai_service
+from sqlmodel import Session
+from app.api.deps import get_ai_service
+from app.core.database import engine
+from app.services.agent_service import agent_service
 
 router = APIRouter()
 
 class RefineRequest(BaseModel):
-    code: str
+    code: Optional[str] = None
     instruction: str
     model: str = None
+    agent_id: Optional[int] = None  # refines the agent's current version when code is omitted
+    mode: Literal["patch", "rewrite"] = "patch"
 
 @router.get("/models")
-async def list_models():
+async def list_models(ai_service=Depends(get_ai_service)):
     return await ai_service.list_models()
 
 @router.post("/refine")
-async def refine_code(request: RefineRequest):
+async def refine_code(request: RefineRequest, ai_service=Depends(get_ai_service)):
+    code = request.code
+    if code is None:
+        if request.agent_id is None:
+            raise HTTPException(status_code=422, detail="Either code or agent_id is required")
+        # Not a request-scoped session: it would stay open for the whole model stream
+        with Session(engine) as session:
+            code = agent_service.get_agent_code(session, request.agent_id)
+        if code is None:
+            raise HTTPException(status_code=404, detail="Agent not found")
     return StreamingResponse(
-        ai_service.refine_code(request.code, request.instruction, request.model),
+        ai_service.refine_code(code, request.instruction, request.model, request.mode),
         media_type="text/event-stream"
     )
 
@@ -26,7 +41,7 @@ class ChatRequest(BaseModel):
     model: str = None
 
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, ai_service=Depends(get_ai_service)):
     return StreamingResponse(
         ai_service.chat(request.messages, request.model),
         media_type="text/event-stream"
@@ -1,13 +1,48 @@
 import os
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, UploadFile
 from fastapi.responses import FileResponse
 from sqlmodel import Session
 from app.core.database import get_session
 from app.models import Agent
-from app.services.artifact_service import artifact_service
+from app.services.artifact_service import InboxFileTooLarge, artifact_service
 
 router = APIRouter()
 
+UPLOAD_CHUNK = 1024 * 1024
+
+async def _save_upload(filename: str, chunks) -> dict:
+    try:
+        return await artifact_service.save_inbox_stream(filename, chunks)
+    except InboxFileTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Input inbox: upload files, then reference their ids in POST /api/runs/trigger/{agent_id}
+
+@router.get("/inbox")
+def list_inbox():
+    return artifact_service.list_inbox()
+
+@router.put("/inbox/{filename}")
+async def upload_inbox_file(filename: str, request: Request):
+    """Raw body upload, written to disk as it arrives (preferred for large files)."""
+    return await _save_upload(filename, request.stream())
+
+@router.post("/inbox")
+async def upload_inbox_form(file: UploadFile):
+    """Multipart upload; the form parser spools to a temp file, which is copied over in chunks."""
+    async def chunks():
+        while chunk := await file.read(UPLOAD_CHUNK):
+            yield chunk
+    return await _save_upload(file.filename, chunks())
+
+@router.delete("/inbox/{file_id}")
+def delete_inbox_file(file_id: str):
+    if not artifact_service.delete_inbox_file(file_id):
+        raise HTTPException(status_code=404, detail="Inbox file not found")
+    return {"ok": True}
+
 @router.get("/{agent_id}/{run_id}")
 def list_run_artifacts(agent_id: int, run_id: int, session: Session = Depends(get_session)):
     agent = session.get(Agent, agent_id)
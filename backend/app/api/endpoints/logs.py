@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session
+from app.core.config import settings
+from app.core.database import get_session
+from app.runtime.logs import parse_streams
+from app.services.log_search_service import log_search_service
+
+router = APIRouter()
+
+@router.get("/search", response_model=dict)
+def search_logs(
+    q: str,
+    agent_id: Optional[int] = None,
+    run_id: Optional[int] = None,
+    streams: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    session: Session = Depends(get_session),
+):
+    """Newest matching log lines with HTML-escaped, <mark>-highlighted snippets; pass next_cursor back as cursor to page."""
+    if not settings.LOG_SEARCH_ENABLED:
+        raise HTTPException(status_code=404, detail="Log search is disabled")
+    try:
+        stream_filter = parse_streams(streams)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return log_search_service.search(
+        session, q, agent_id=agent_id, run_id=run_id, streams=stream_filter,
+        since=since, until=until, before=cursor, limit=limit,
+    )
@@ -0,0 +1,127 @@
+import json
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+from app.core.database import get_session
+from app.models import Pipeline, PipelineNode, PipelineRun
+from app.services.pipeline_service import pipeline_service
+from pydantic import BaseModel, Field
+
+router = APIRouter()
+
+class PipelineNodeSpec(BaseModel):
+    id: str = Field(..., min_length=1, max_length=64, pattern=r"^[A-Za-z0-9_.-]+$")  # also the /data/inputs/<id> dir name
+    agent_id: int
+    depends_on: List[str] = []
+    retries: int = Field(0, ge=0, le=10)
+
+class PipelineCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    nodes: List[PipelineNodeSpec]
+
+class PipelineRead(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    nodes: List[PipelineNodeSpec]
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_pipeline(cls, pipeline: Pipeline) -> "PipelineRead":
+        return cls(**pipeline.model_dump(exclude={"spec"}), nodes=json.loads(pipeline.spec))
+
+class PipelineRunRead(BaseModel):
+    id: int
+    pipeline_id: int
+    status: str
+    created_at: datetime
+    end_time: Optional[datetime] = None
+    error: Optional[str] = None
+    nodes: List[PipelineNode] = []
+
+def _run_read(pipeline_run: PipelineRun, nodes: List[PipelineNode]) -> PipelineRunRead:
+    return PipelineRunRead(**pipeline_run.model_dump(), nodes=nodes)
+
+@router.get("/", response_model=List[PipelineRead])
+def list_pipelines(session: Session = Depends(get_session)):
+    return [PipelineRead.from_pipeline(p) for p in pipeline_service.list_pipelines(session)]
+
+@router.post("/", response_model=PipelineRead)
+def create_pipeline(pipeline_in: PipelineCreate, session: Session = Depends(get_session)):
+    nodes = [node.model_dump() for node in pipeline_in.nodes]
+    try:
+        pipeline = pipeline_service.create_pipeline(session, pipeline_in.name, pipeline_in.description, nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return PipelineRead.from_pipeline(pipeline)
+
+@router.get("/{pipeline_id}", response_model=PipelineRead)
+def get_pipeline(pipeline_id: int, session: Session = Depends(get_session)):
+    pipeline = pipeline_service.get_pipeline(session, pipeline_id)
+    if not pipeline:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return PipelineRead.from_pipeline(pipeline)
+
+@router.put("/{pipeline_id}", response_model=PipelineRead)
+def update_pipeline(pipeline_id: int, pipeline_in: PipelineCreate, session: Session = Depends(get_session)):
+    nodes = [node.model_dump() for node in pipeline_in.nodes]
+    try:
+        pipeline = pipeline_service.update_pipeline(session, pipeline_id, pipeline_in.name, pipeline_in.description, nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not pipeline:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return PipelineRead.from_pipeline(pipeline)
+
+@router.delete("/{pipeline_id}")
+def delete_pipeline(pipeline_id: int, session: Session = Depends(get_session)):
+    try:
+        success = pipeline_service.delete_pipeline(session, pipeline_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not success:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return {"ok": True}
+
+# Starting, retrying and cancelling spawn driver tasks, so these handlers run on the event loop
+
+@router.post("/{pipeline_id}/run", response_model=PipelineRunRead)
+async def run_pipeline(pipeline_id: int, session: Session = Depends(get_session)):
+    pipeline_run = pipeline_service.start(session, pipeline_id)
+    if not pipeline_run:
+        raise HTTPException(status_code=404, detail="Pipeline not found")
+    return _run_read(*pipeline_service.get_run(session, pipeline_run.id))
+
+@router.get("/{pipeline_id}/runs", response_model=List[PipelineRun])
+def list_pipeline_runs(pipeline_id: int, session: Session = Depends(get_session)):
+    return pipeline_service.list_runs(session, pipeline_id)
+
+@router.get("/runs/{pipeline_run_id}", response_model=PipelineRunRead)
+def get_pipeline_run(pipeline_run_id: int, session: Session = Depends(get_session)):
+    found = pipeline_service.get_run(session, pipeline_run_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Pipeline run not found")
+    return _run_read(*found)
+
+@router.post("/runs/{pipeline_run_id}/retry", response_model=PipelineRunRead)
+async def retry_pipeline_run(pipeline_run_id: int, session: Session = Depends(get_session)):
+    try:
+        pipeline_run = pipeline_service.retry(session, pipeline_run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not pipeline_run:
+        raise HTTPException(status_code=404, detail="Pipeline run not found")
+    return _run_read(*pipeline_service.get_run(session, pipeline_run_id))
+
+@router.post("/runs/{pipeline_run_id}/cancel", response_model=PipelineRunRead)
+async def cancel_pipeline_run(pipeline_run_id: int, session: Session = Depends(get_session)):
+    try:
+        pipeline_run = pipeline_service.cancel(session, pipeline_run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not pipeline_run:
+        raise HTTPException(status_code=404, detail="Pipeline run not found")
+    return _run_read(*pipeline_service.get_run(session, pipeline_run_id))
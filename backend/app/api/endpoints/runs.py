@@ -1,49 +1,131 @@
-from typing import List
+import json
+from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
 from sqlmodel import Session
 from sse_starlette.sse import EventSourceResponse
-from app.core.database import get_session
-from app.models import Run, AgentVersion
-from app.services.agent_service import agent_service
-from app.runtime.executor import agent_executor
+from app.api.responses import list_response
+from app.core.config import settings
+from app.core.database import engine, get_session
+from app.models import Run, RunRead
+from app.services.agent_service import RUN_LOG_COLUMNS, agent_service
+from app.services.run_service import run_service
+from app.runtime.executor import ExecutorDraining, agent_executor
+from app.runtime.logs import LogRecord, append_system_message, parse_streams, run_logs_text, run_records
+from app.runtime.multiplex import MultiplexSession, log_event
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Run])
-def list_actions(agent_id: int, session: Session = Depends(get_session)):
-    return agent_service.list_runs(session, agent_id)
+def _sse_event(record: LogRecord, typed: bool) -> dict:
+    # Typed events carry the structured record; plain ones keep the "[STDOUT] line" form
+    if typed:
+        return dict(id=str(record.seq), event=record.stream, data=json.dumps(record.to_dict()))
+    return dict(id=str(record.seq), data=record.render())
 
-@router.post("/trigger/{agent_id}", response_model=Run)
-async def trigger_run(agent_id: int, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
-    run = agent_service.create_run(session, agent_id, trigger_type="manual")
-    
-    agent = session.get(Run, run.id).agent
-    version = session.get(Run, run.id).version
-
-    # Load linked secrets
-    secrets = {}
-    if agent.secrets:
-        from app.core.security import decrypt_value
-        for secret in agent.secrets:
-             secrets[secret.key] = decrypt_value(secret.value)
-
-    # Start execution in background immediately
-    await agent_executor.start_run(
-        agent_name=agent.name,
-        run_id=run.id,
-        code=version.code,
-        dependencies=version.dependencies,
-        secrets=secrets
-    )
-    
+def _sse_frame(records: List[LogRecord]) -> dict:
+    return dict(id=str(records[-1].seq), event="frame", data=json.dumps([r.to_dict() for r in records]))
+
+class TriggerRequest(BaseModel):
+    input_files: List[str] = []  # inbox file ids
+
+STORED_FRAME_LINES = 500  # records per frame when replaying a finished run with ?framed=true
+
+def _run_row(row, with_logs: bool) -> dict:
+    run = row._asdict()
+    for column in RUN_LOG_COLUMNS:
+        run.pop(column.key, None)
+    run["logs"] = run_logs_text(row) if with_logs else ""
     return run
 
+@router.get("/", response_model=List[RunRead])
+def list_actions(agent_id: int, request: Request, logs: bool = True, session: Session = Depends(get_session)):
+    """?logs=false leaves every run's logs empty, skipping the log columns and their decoding."""
+    return list_response(request, session, agent_service.list_runs_query(agent_id, logs), lambda row: _run_row(row, logs))
+
+@router.post("/trigger/{agent_id}", response_model=RunRead)
+async def trigger_run(
+    agent_id: int,
+    response: Response,
+    trigger: Optional[TriggerRequest] = None,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    session: Session = Depends(get_session)
+):
+    """
+    Retries carrying the same Idempotency-Key header get the original run back. The
+    X-Trigger-Outcome response header says whether a run was created, idempotent,
+    coalesced (debounced) or skipped (agent already running). An optional body lists
+    inbox file ids (see /api/artifacts/inbox) to copy into the sandbox's /data/inputs.
+    """
+    if agent_executor.draining:
+        raise HTTPException(status_code=503, detail="Server is shutting down")
+    try:
+        run, outcome = await run_service.trigger_run(
+            session,
+            agent_id,
+            trigger_type="manual",
+            idempotency_key=idempotency_key,
+            input_files=trigger.input_files if trigger else None,
+        )
+    except ExecutorDraining as e:
+        # Left queued; the next process's recovery pass picks it up
+        raise HTTPException(status_code=503, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    response.headers["X-Trigger-Outcome"] = outcome
+    return RunRead.from_run(run)
+
+@router.get("/{run_id}/trace")
+def get_run_trace(run_id: int, session: Session = Depends(get_session)):
+    run = session.get(Run, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {"run_id": run.id, "spans": json.loads(run.trace) if run.trace else []}
+
+@router.post("/{run_id}/cancel")
+def cancel_run(run_id: int, session: Session = Depends(get_session)):
+    run = session.get(Run, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if agent_executor.cancel_run(run_id):
+        # The executor kills the sandbox and records the final status
+        return {"ok": True, "status": "cancelling"}
+    if run.status not in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Run already finished ({run.status})")
+    # Not executing in this process (e.g. left over from a restart): just close it out
+    run.status = "cancelled"
+    run.end_time = datetime.utcnow()
+    append_system_message(run, "Run cancelled.")
+    session.add(run)
+    session.commit()
+    return {"ok": True, "status": "cancelled"}
+
 @router.get("/{run_id}/stream")
-async def stream_run(run_id: int, session: Session = Depends(get_session)):
+async def stream_run(
+    run_id: int,
+    typed: bool = False,
+    framed: bool = False,
+    streams: Optional[str] = None,
+    session: Session = Depends(get_session)
+):
+    """
+    Server-sent log events. By default each event's data is a "[STDOUT] line" string;
+    with ?typed=true events are named after their stream and carry the JSON record.
+    ?framed=true sends one "frame" event per executor frame, its data a JSON list of
+    records, which is far cheaper for chatty runs. ?streams=stdout,stderr filters server-side.
+    """
+    typed = typed or framed
     run = session.get(Run, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
+    try:
+        wanted = parse_streams(streams)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # 1. If run is actively controlled by executor, stream from memory
     # 2. If run is 'running' in DB but NOT in executor -> It's a zombie (server restarted). Mark failed.
@@ -71,31 +153,113 @@ async def stream_run(run_id: int, session: Session = Depends(get_session)):
         # Zombie Run
         run.status = "error"
         run.end_time = datetime.utcnow()
-        if not run.logs: run.logs = ""
-        run.logs += "\n[SYSTEM] Run interrupted (Server Restart)\n"
+        append_system_message(run, "Run interrupted (Server Restart)")
         session.add(run)
         session.commit()
+        session.refresh(run)
         # Fall through to finished matching
 
+    # The response outlives this handler; don't keep a pooled connection checked out for it
+    session.close()
+
     if run.status != "running":
         # Return static logs
         # We wrap it in an iterator to work with EventSourceResponse
         # But EventSourceResponse expects "data: ..." format? 
         # Actually EventSourceResponse takes an iterable of strings or dictionaries.
         
-        # We want to emulate the stream replay. 
-        # The logs in DB are a big string. We should split by line?
-        logs = run.logs or ""
+        # We want to emulate the stream replay from the stored records.
         async def finite_stream():
-            for line in logs.splitlines():
-                yield dict(data=line)
-            yield dict(data="[SYSTEM] Run already completed.")
+            if framed:
+                batch = []
+                for record in run_records(run, wanted):
+                    batch.append(record)
+                    if len(batch) >= STORED_FRAME_LINES:
+                        yield _sse_frame(batch)
+                        batch = []
+                if batch:
+                    yield _sse_frame(batch)
+            else:
+                for record in run_records(run, wanted):
+                    yield _sse_event(record, typed)
+            if typed:
+                yield dict(event="end", data=json.dumps({"status": run.status}))
+            else:
+                yield dict(data="[SYSTEM] Run already completed.")
         
         return EventSourceResponse(finite_stream())
 
     # Active running stream
     async def event_generator():
-        async for log_line in agent_executor.stream_logs(run_id):
-            yield dict(data=log_line)
+        async for frame in agent_executor.stream_frames(run_id):
+            records = frame if wanted is None else [r for r in frame if r.stream in wanted]
+            if not records:
+                continue
+            if framed:
+                yield _sse_frame(records)
+            else:
+                for record in records:
+                    yield _sse_event(record, typed)
+        if typed:
+            yield dict(event="end", data=json.dumps({"status": "finished"}))
     
     return EventSourceResponse(event_generator())
+
+
+def _stored_run_events(run_id: int, streams: Optional[set]) -> list:
+    with Session(engine) as session:
+        run = session.get(Run, run_id)
+        if not run:
+            return [{"type": "error", "run_id": run_id, "detail": "Run not found"}]
+        events = [log_event(run_id, record) for record in run_records(run, streams)]
+        events.append({"type": "end", "run_id": run_id, "status": run.status})
+        return events
+
+@router.websocket("/ws")
+async def multiplexed_stream(websocket: WebSocket):
+    """
+    One connection for many runs. Client messages (JSON):
+      {"op": "subscribe", "run_ids": [1, 2], "streams": "stdout,stderr"}   streams optional
+      {"op": "unsubscribe", "run_ids": [1]}
+      {"op": "subscribe_agents", "agent_ids": [3]}    omit agent_ids for every agent
+      {"op": "unsubscribe_agents", "agent_ids": [3]}
+    The server sends {"type": "frame", "events": [...]} once per tick; events are "log",
+    "end" (with final status), "run_started", "run_finished" and "error".
+    """
+    await websocket.accept()
+
+    async def load_finished(run_id: int, streams: Optional[set]) -> list:
+        # Decompressing stored logs is blocking work
+        return await asyncio.to_thread(_stored_run_events, run_id, streams)
+
+    mux = MultiplexSession(
+        agent_executor,
+        send=websocket.send_json,
+        interval=settings.WS_FRAME_INTERVAL_MS / 1000,
+        max_buffered=settings.WS_MAX_BUFFERED_EVENTS,
+        load_finished=load_finished,
+    )
+    mux.start()
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+                op = message.get("op")
+                if op == "subscribe":
+                    await mux.subscribe_runs([int(r) for r in message.get("run_ids", [])], parse_streams(message.get("streams")))
+                elif op == "unsubscribe":
+                    mux.unsubscribe_runs([int(r) for r in message.get("run_ids", [])])
+                elif op == "subscribe_agents":
+                    ids = message.get("agent_ids")
+                    mux.subscribe_agents([int(a) for a in ids] if ids is not None else None)
+                elif op == "unsubscribe_agents":
+                    ids = message.get("agent_ids")
+                    mux.unsubscribe_agents([int(a) for a in ids] if ids is not None else None)
+                else:
+                    mux.push({"type": "error", "detail": f"Unknown op: {op}"})
+            except (AttributeError, TypeError, ValueError) as e:
+                mux.push({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await mux.close()
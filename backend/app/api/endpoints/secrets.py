@@ -1,10 +1,10 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlmodel import Session
+from app.api.responses import list_response
 from app.core.database import get_session
 from app.models.secret import Secret
 from app.services.secret_service import secret_service
-from app.core.security import decrypt_value
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -21,20 +21,8 @@ class SecretRead(BaseModel):
     description: Optional[str] = None
 
 @router.get("/", response_model=List[SecretRead])
-def list_secrets(session: Session = Depends(get_session)):
-    secrets = secret_service.list_secrets(session)
-    results = []
-    for s in secrets:
-        decrypted = decrypt_value(s.value)
-        results.append(
-            SecretRead(
-                id=s.id,
-                key=s.key,
-                last_4_chars=decrypted[-4:] if len(decrypted) > 4 else decrypted,
-                description=s.description
-            )
-        )
-    return results
+def list_secrets(request: Request, session: Session = Depends(get_session)):
+    return list_response(request, session, secret_service.list_secrets_query(), lambda row: row._asdict())
 
 @router.post("/", response_model=Secret)
 def create_secret(secret_in: SecretCreate, session: Session = Depends(get_session)):
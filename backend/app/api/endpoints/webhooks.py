@@ -0,0 +1,27 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+from app.services.webhook_service import WebhookRejected, webhook_service
+
+router = APIRouter()
+
+@router.post("/{agent_id}", status_code=202)
+async def ingest_webhook(
+    agent_id: int,
+    request: Request,
+    token: Optional[str] = None,
+    x_webhook_token: Optional[str] = Header(None),
+    content_length: Optional[int] = Header(None),
+):
+    """
+    Accepts one JSON event for an agent (token in X-Webhook-Token or ?token=). Returns 202
+    once the event is committed; runs are started by the dispatcher, not by this request.
+    """
+    if content_length is not None and content_length > settings.WEBHOOK_MAX_PAYLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Payload exceeds {settings.WEBHOOK_MAX_PAYLOAD_BYTES} bytes")
+    try:
+        event_id = await webhook_service.ingest(agent_id, x_webhook_token or token, await request.body())
+    except WebhookRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return JSONResponse({"accepted": True, "event_id": event_id}, status_code=202)
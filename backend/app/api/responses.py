@@ -0,0 +1,64 @@
+import json
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Callable, Iterator
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from sqlmodel import Session
+from app.core.database import engine
+
+NDJSON = "application/x-ndjson"
+NDJSON_BATCH_ROWS = 500  # rows fetched and written per chunk of a streamed list
+
+
+@lru_cache(maxsize=None)
+def _orjson():
+    # Optional; the stdlib encoder produces the same output, just slower
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON, byte-for-byte what JSONResponse would send for the same dicts."""
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+def list_response(request: Request, session: Session, statement, to_dict: Callable[[Any], dict]) -> Response:
+    """
+    Serves a list endpoint from plain row tuples instead of ORM objects and response models.
+    With `Accept: application/x-ndjson` the rows are streamed one JSON object per line, fetched
+    in batches from a session of their own, so huge lists never sit in memory whole.
+    """
+    if wants_ndjson(request):
+        return StreamingResponse(_ndjson_lines(statement, to_dict), media_type=NDJSON)
+    return FastJSONResponse([to_dict(row) for row in session.exec(statement)])
+
+
+def _ndjson_lines(statement, to_dict: Callable[[Any], dict]) -> Iterator[bytes]:
+    with Session(engine) as session:
+        result = session.exec(statement.execution_options(yield_per=NDJSON_BATCH_ROWS))
+        for rows in result.partitions():
+            yield b"".join(dumps(to_dict(row)) + b"\n" for row in rows)
@@ -8,6 +8,81 @@ class Settings(BaseSettings):
     E2B_API_KEY: str | None = None
     OPENAI_API_KEY: str | None = None
     SECRET_KEY: str = "CHANGE_ME_IN_PROD_BUT_MUST_BE_URL_SAFE_BASE64_32_BYTES" 
+    # Sandbox backend: "e2b" (remote, needs E2B_API_KEY), "local" (subprocesses on this host)
+    # or "synthetic" (generated output, for benchmarks)
+    SANDBOX_BACKEND: str = "e2b"
+    LOCAL_SANDBOX_ROOT: str | None = None  # scratch dir parent for local sandboxes, default system temp
+    LOCAL_SANDBOX_ISOLATION: str = "bwrap"  # bwrap needs bubblewrap; none runs plain subprocesses
+    # How long decrypted agent secrets are cached for run triggers. 0 disables the cache.
+    SECRET_CACHE_TTL_SECONDS: int = 30
+    # Sticky sessions: keep a sandbox per (agent, version, secrets) warm between runs. 0 disables.
+    SANDBOX_IDLE_TTL_SECONDS: int = 0
+    # Finished run logs are compressed at rest by a background job: "zstd" (falls back to
+    # "zlib" when zstandard is not installed) or "zlib". Interval 0 disables compaction.
+    LOG_COMPRESSION_CODEC: str = "zstd"
+    LOG_COMPACTION_INTERVAL_SECONDS: int = 60
+    LOG_COMPACTION_BATCH_SIZE: int = 50
+    # Per-agent dictionary trained once the agent has this many finished runs. Size 0 disables.
+    LOG_DICTIONARY_SIZE: int = 16 * 1024
+    LOG_DICTIONARY_MIN_RUNS: int = 8
+    # Full-text log search: lines are indexed as the executor flushes them; older runs are
+    # backfilled by a background job every LOG_INDEX_INTERVAL_SECONDS (0 disables the backfill).
+    LOG_SEARCH_ENABLED: bool = True
+    LOG_INDEX_INTERVAL_SECONDS: int = 30
+    # Run retention defaults, overridable per agent; 0 keeps everything. Expired runs are
+    # archived (logs, trace and artifacts as .tar.gz under ARTIFACTS_DIR/_archive) then deleted
+    # in small batches so the write lock is never held for long.
+    RUN_RETENTION_KEEP_LAST: int = 0
+    RUN_RETENTION_MAX_AGE_DAYS: int = 0
+    RUN_ARCHIVE_ENABLED: bool = True
+    RETENTION_INTERVAL_SECONDS: int = 300
+    RETENTION_BATCH_SIZE: int = 50
+    RETENTION_BATCH_PAUSE_MS: int = 50
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    # Executing runs and streaming responses keep a pooled connection while they await (queued
+    # runs wait for their MAX_CONCURRENT_RUNS slot without one); size the pool for those.
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_VACUUM_INTERVAL_SECONDS: int = 3600
+    DB_VACUUM_PAGES: int = 2000
+    # Executor limits, overridable per agent; 0 disables. Output limits count stdout, stderr
+    # and error lines; a run that hits one is stopped with status timeout / limit_exceeded.
+    RUN_TIMEOUT_SECONDS: int = 3600
+    RUN_MAX_LOG_BYTES: int = 50 * 1024 * 1024
+    RUN_MAX_LOG_LINES: int = 0
+    # On shutdown, stop accepting runs and wait this long for active ones; stragglers are
+    # marked interrupted and, like runs still queued, started again by the next process.
+    SHUTDOWN_DRAIN_SECONDS: int = 30
+    RECOVER_INTERRUPTED_RUNS: bool = True
+    RUN_MAX_RECOVERY_ATTEMPTS: int = 1
+    # Runs executing at once across the server (sandboxes); further runs wait queued. 0 = no limit.
+    MAX_CONCURRENT_RUNS: int = 0
+    # Input file inbox (/api/artifacts/inbox): uploads are streamed to disk, referenced by id when
+    # triggering a run and copied into the sandbox's /data/inputs. 0 = no size limit / kept forever.
+    INBOX_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024 * 1024
+    INBOX_TTL_SECONDS: int = 7 * 24 * 3600
+    INPUT_UPLOAD_CONCURRENCY: int = 4  # input files copied into a sandbox at once
+    # Webhook ingest: events are group-committed (one transaction for everything that arrives
+    # within the window, up to max events) before the 202 goes out, then batched into runs.
+    WEBHOOK_COMMIT_WINDOW_MS: int = 5
+    WEBHOOK_COMMIT_MAX_EVENTS: int = 1000
+    WEBHOOK_MAX_PAYLOAD_BYTES: int = 256 * 1024
+    WEBHOOK_EVENT_RETENTION_SECONDS: int = 24 * 3600  # dispatched events are then deleted; 0 keeps them
+    # GET /api/agents/dashboard is cached until a run or agent changes, and at most this long.
+    DASHBOARD_CACHE_TTL_SECONDS: int = 10
+    # Run triggers: a repeated Idempotency-Key returns the original run for this long; triggers
+    # within the debounce window (overridable per agent, 0 disables) fold into one queued run.
+    TRIGGER_IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600
+    TRIGGER_DEBOUNCE_SECONDS: int = 0
+    # Multiplexed run streams (/api/runs/ws): events are sent as one frame per tick, and a
+    # client that falls this many events behind starts losing the oldest ones.
+    WS_FRAME_INTERVAL_MS: int = 50
+    WS_MAX_BUFFERED_EVENTS: int = 20000
+    # Executor output coalescing: lines are fanned out, streamed and persisted as frames of at
+    # most this many milliseconds / bytes. Lower = less latency, higher = less per-line overhead;
+    # 0 ms sends every line on its own.
+    LOG_FRAME_INTERVAL_MS: int = 20
+    LOG_FRAME_MAX_BYTES: int = 64 * 1024
 
     class Config:
         env_file = ".env"
@@ -1,10 +1,108 @@
+import time
+from sqlalchemy import event, inspect, text
 from sqlmodel import SQLModel, create_engine, Session
 from app.core.config import settings
+from app.core.metrics import registry
 
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    settings.DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+)
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+DB_COMMIT = registry.histogram(
+    "kernel_db_commit_seconds", "Session commit latency, including flush",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the single writer; busy_timeout makes writers wait
+        # for a lock instead of failing while background jobs hold it briefly
+        cursor = dbapi_connection.cursor()
+        # auto_vacuum only sticks on a brand-new file (before WAL writes the header); existing
+        # databases are converted by vacuum_db
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT.observe(time.perf_counter() - started)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
+    create_search_tables()
+
+def create_search_tables():
+    # FTS5 index over log lines; rowid is (run_id << 32 | seq) so one run is a contiguous
+    # rowid range (cheap run filters and deletes) and rowid order is newest-run-last.
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5("
+            "text, agent_id UNINDEXED, stream UNINDEXED, ts UNINDEXED, tokenize = 'unicode61')"
+        ))
+
+def add_missing_columns():
+    # create_all never alters existing tables, so add columns introduced after a DB was created.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+            # ...and indexes declared on them
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+def vacuum_db(max_pages: int = 1000, convert_free_ratio: float = 0.25) -> int:
+    """
+    Returns free pages to the filesystem. Incremental-vacuum databases release up to max_pages
+    per call, which only holds the write lock briefly; older databases get one full VACUUM to
+    switch them to incremental mode once enough of the file is free pages.
+    """
+    if not IS_SQLITE:
+        return 0
+    with engine.connect() as conn:
+        mode = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+        free = conn.execute(text("PRAGMA freelist_count")).scalar()
+        pages = conn.execute(text("PRAGMA page_count")).scalar()
+    if not free:
+        return 0
+    # VACUUM and incremental_vacuum cannot run inside a transaction
+    raw = engine.raw_connection()
+    dbapi = raw.driver_connection
+    isolation_level = dbapi.isolation_level
+    try:
+        dbapi.isolation_level = None
+        if mode == 2:
+            # Each returned row is one step; the pragma stops early unless they are all fetched
+            dbapi.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+            return min(free, max_pages)
+        if pages and free / pages >= convert_free_ratio:
+            print(f"Converting database to incremental vacuum ({free}/{pages} pages free)")
+            dbapi.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            dbapi.execute("VACUUM")
+            return free
+        return 0
+    finally:
+        dbapi.isolation_level = isolation_level
+        raw.close()
 
 def get_session():
     with Session(engine) as session:
@@ -1,4 +1,3 @@
-from cryptography.fernet import Fernet
 from app.core.config import settings
 import base64
 
@@ -9,6 +8,7 @@ import base64
 # or fall back to a generated one for dev consistency (but dev consistency requires persistence).
 
 def get_cipher():
+    from cryptography.fernet import Fernet
     key = settings.SECRET_KEY
     try:
         # Try to decode to check if valid base64
@@ -45,6 +45,7 @@ _cipher = None
 def get_cipher_suite():
     global _cipher
     if _cipher is None:
+        from cryptography.fernet import Fernet  # imported on first use to keep startup fast
         _cipher = Fernet(get_derived_key())
     return _cipher
 
@@ -1,13 +1,63 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.database import create_db_and_tables
+from fastapi.responses import PlainTextResponse
+from app.core.database import create_db_and_tables, vacuum_db
 from app.api.api import api_router
+from app.core.metrics import registry
+from app.core.config import settings
+from app.runtime.executor import agent_executor
+from app.runtime.maintenance import maintenance_worker
+from app.runtime.sandbox_pool import sandbox_pool
+from app.services.artifact_service import artifact_service
+from app.services.dashboard_service import dashboard_service
+from app.services.log_search_service import log_search_service
+from app.services.log_service import log_service
+from app.services.pipeline_service import pipeline_service
+from app.services.retention_service import retention_service
+from app.services.run_service import run_service
+from app.services.secret_service import secret_service
+from app.services.webhook_service import webhook_service
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    secret_service.backfill_last_4()
+    maintenance_worker.register(
+        "log_compaction",
+        settings.LOG_COMPACTION_INTERVAL_SECONDS,
+        lambda: log_service.compact_pending(settings.LOG_COMPACTION_BATCH_SIZE),
+    )
+    maintenance_worker.register(
+        "log_index_backfill",
+        settings.LOG_INDEX_INTERVAL_SECONDS,
+        log_search_service.backfill,
+    )
+    maintenance_worker.register("retention", settings.RETENTION_INTERVAL_SECONDS, retention_service.run_pass)
+    maintenance_worker.register(
+        "inbox_cleanup",
+        settings.RETENTION_INTERVAL_SECONDS if settings.INBOX_TTL_SECONDS > 0 else 0,
+        lambda: artifact_service.purge_inbox(settings.INBOX_TTL_SECONDS),
+    )
+    maintenance_worker.register(
+        "webhook_event_cleanup",
+        settings.RETENTION_INTERVAL_SECONDS if settings.WEBHOOK_EVENT_RETENTION_SECONDS > 0 else 0,
+        lambda: webhook_service.purge_dispatched(settings.WEBHOOK_EVENT_RETENTION_SECONDS),
+    )
+    maintenance_worker.register("vacuum", settings.DB_VACUUM_INTERVAL_SECONDS, lambda: vacuum_db(settings.DB_VACUUM_PAGES))
+    maintenance_worker.start()
+    agent_executor.add_listener(dashboard_service.on_run_event)
+    agent_executor.accept_runs()
+    await run_service.recover_runs()
+    pipeline_service.resume()
+    webhook_service.start()
     yield
+    # Stop taking events first; anything not yet in a run is dispatched by the next process
+    await webhook_service.stop()
+    await agent_executor.drain(settings.SHUTDOWN_DRAIN_SECONDS)
+    await pipeline_service.stop()
+    await maintenance_worker.stop()
+    await sandbox_pool.close()
 
 app = FastAPI(title="Kernel API", lifespan=lifespan)
 
@@ -25,3 +75,7 @@ app.include_router(api_router, prefix="/api")
 @app.get("/")
 def read_root():
     return {"status": "ok", "service": "Kernel API"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,3 +1,6 @@
 from .agent import Agent, AgentVersion
-from .run import Run
+from .run import Run, RunRead
 from .secret import Secret
+from .log_dictionary import LogDictionary
+from .pipeline import Pipeline, PipelineNode, PipelineRun
+from .webhook_event import WebhookEvent
@@ -8,12 +8,31 @@ if TYPE_CHECKING:
 
 class AgentBase(SQLModel):
     name: str = Field(index=True)
-    status: str = Field(default="active")  # active, paused
+    status: str = Field(default="active")  # active, paused, deleting
     schedule: Optional[str] = None
     description: Optional[str] = None
+    # Run retention; None falls back to the RUN_RETENTION_* settings, 0 keeps everything
+    retention_keep_last: Optional[int] = None
+    retention_max_age_days: Optional[int] = None
+    # Executor limits; None falls back to the RUN_* settings, 0 disables
+    timeout_seconds: Optional[int] = None
+    max_log_bytes: Optional[int] = None
+    max_log_lines: Optional[int] = None
+    # Triggering: "allow" (default) starts a run per trigger, "skip" returns the agent's queued or
+    # running run instead. Triggers within debounce_seconds (None = server default) share one run.
+    concurrency_policy: Optional[str] = None
+    debounce_seconds: Optional[int] = None
+    # Result cache for deterministic agents: a run with the same code, dependencies and payload
+    # as a successful run from the last cache_ttl_seconds reuses its logs and artifacts. None/0 = off.
+    cache_ttl_seconds: Optional[int] = None
+    # Webhook ingest (/api/webhooks/{id}): events are batched into runs of up to batch_size
+    # events, started once full or when the oldest has waited batch_seconds. None = one per event.
+    webhook_batch_size: Optional[int] = None
+    webhook_batch_seconds: Optional[float] = None
 
 class Agent(AgentBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    webhook_token_hash: Optional[str] = Field(default=None, exclude=True)  # sha256 of the token; None = webhook disabled
     current_version_id: Optional[int] = Field(default=None)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
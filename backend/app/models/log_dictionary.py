@@ -0,0 +1,13 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Column, LargeBinary
+from sqlmodel import Field, SQLModel
+
+class LogDictionary(SQLModel, table=True):
+    """Compression dictionary trained on one agent's logs; runs reference it by id."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    agent_id: int = Field(index=True)
+    codec: str
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    sample_runs: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
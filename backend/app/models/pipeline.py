@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+class PipelineBase(SQLModel):
+    name: str = Field(index=True)
+    description: Optional[str] = None
+    # JSON list of nodes: {"id": "fetch", "agent_id": 1, "depends_on": [], "retries": 0}
+    spec: str = "[]"
+
+class Pipeline(PipelineBase, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PipelineRun(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    pipeline_id: int = Field(foreign_key="pipeline.id", index=True)
+    status: str = Field(default="running")  # running, success, failed, cancelled
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    end_time: Optional[datetime] = None
+    error: Optional[str] = None  # why the driver gave up, when it failed rather than a node
+
+class PipelineNode(SQLModel, table=True):
+    """One node of one pipeline run; run_id is its latest attempt."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    pipeline_run_id: int = Field(foreign_key="pipelinerun.id", index=True)
+    node: str
+    agent_id: int
+    status: str = Field(default="pending")  # pending, running, success, failed, skipped, cancelled
+    depends_on: str = "[]"  # JSON list of node names, copied from the spec when the run starts
+    retries: int = 0  # automatic retries of a failed attempt
+    run_id: Optional[int] = Field(default=None, index=True)
+    attempts: int = 0
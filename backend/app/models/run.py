@@ -1,20 +1,59 @@
 from datetime import datetime
 from typing import Optional, List
+from sqlalchemy import Column, Index, LargeBinary
 from sqlmodel import Field, SQLModel, Relationship
 
 class RunBase(SQLModel):
-    status: str = Field(default="queued")  # queued, running, success, error
+    status: str = Field(default="queued")  # queued, running, success, error, cancelled, timeout, limit_exceeded, interrupted
     trigger_type: str = "manual"
     input_payload: Optional[str] = None
+    input_files: Optional[str] = None  # JSON list of inbox file ids, copied into /data/inputs before execution
 
 class Run(RunBase, table=True):
+    # Covers the dashboard's per-agent window scan without touching log rows
+    __table_args__ = (Index("ix_run_dashboard", "agent_id", "id", "status", "end_time", "start_time", "trigger_type"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     agent_id: int = Field(foreign_key="agent.id")
     version_id: Optional[int] = Field(foreign_key="agentversion.id")
     start_time: Optional[datetime] = None
     end_time: Optional[datetime] = None
-    logs: Optional[str] = ""
+    logs: Optional[str] = ""  # legacy "[STDOUT] line" text, only for runs recorded before log_data
+    log_data: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))  # encoded LogRecords, see app.runtime.logs
+    log_codec: Optional[str] = None  # None while raw; "zlib"/"zstd" once compacted into blocks
+    log_dict_id: Optional[int] = None  # LogDictionary used for compression, if any
+    log_indexed: Optional[bool] = False  # all lines are in the log_fts search index
     artifacts_written: Optional[str] = "[]"  # JSON list of paths
+    sandbox_reused: Optional[bool] = False
+    sandbox_reuse_count: Optional[int] = 0  # times the sandbox had been reused when this run got it
+    setup_seconds_saved: Optional[float] = 0.0  # create + install time skipped thanks to reuse
+    trace: Optional[str] = None  # JSON list of OpenTelemetry-style phase spans
+    recovery_attempts: Optional[int] = 0  # times the run was requeued after a restart
+    created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    idempotency_key: Optional[str] = Field(default=None, index=True)  # Idempotency-Key of the trigger request
+    coalesced_triggers: Optional[int] = 0  # further triggers folded into this run while it was debounced
+    cache_key: Optional[str] = Field(default=None, index=True)  # hash of code, dependencies and payload, for cacheable agents
+    cached_from_run_id: Optional[int] = None  # set on cache hits: the run whose result was reused
 
     agent: "Agent" = Relationship(back_populates="runs")
     version: "AgentVersion" = Relationship(back_populates="runs")
+
+class RunRead(RunBase):
+    id: int
+    agent_id: int
+    version_id: Optional[int] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    logs: str = ""  # rendered text, whatever the storage format
+    artifacts_written: Optional[str] = "[]"
+    sandbox_reused: Optional[bool] = False
+    sandbox_reuse_count: Optional[int] = 0
+    setup_seconds_saved: Optional[float] = 0.0
+    created_at: Optional[datetime] = None
+    coalesced_triggers: Optional[int] = 0
+    cached_from_run_id: Optional[int] = None
+
+    @classmethod
+    def from_run(cls, run: Run) -> "RunRead":
+        from app.runtime.logs import run_logs_text
+        return cls.model_validate(run, update={"logs": run_logs_text(run)})
@@ -13,5 +13,6 @@ class SecretBase(SQLModel):
 class Secret(SecretBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     description: Optional[str] = None
+    last_4_chars: Optional[str] = None  # computed from the plaintext at write time
     
     agents: List["Agent"] = Relationship(back_populates="secrets", link_model=LinkAgentSecret)
@@ -0,0 +1,11 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+class WebhookEvent(SQLModel, table=True):
+    """An accepted webhook delivery; run_id is set once it has been batched into a run."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    agent_id: int = Field(index=True)
+    received_at: datetime = Field(default_factory=datetime.utcnow)
+    payload: str  # the JSON body as received
+    run_id: Optional[int] = Field(default=None, index=True)
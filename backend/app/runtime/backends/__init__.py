@@ -0,0 +1,30 @@
+from typing import Dict
+from app.core.config import settings
+from app.runtime.backends.base import (
+    DIR, FILE, CommandExitError, Execution, ExecutionError, Sandbox, SandboxBackend, SandboxEntry,
+)
+
+_backends: Dict[str, SandboxBackend] = {}
+
+
+def register_sandbox_backend(backend: SandboxBackend):
+    """Installs a backend instance under its name (also used to swap in fakes)."""
+    _backends[backend.name] = backend
+
+
+def get_sandbox_backend(name: str = None) -> SandboxBackend:
+    name = name or settings.SANDBOX_BACKEND
+    if name not in _backends:
+        # Imported on demand so the E2B SDK is only loaded when it is actually used
+        if name == "e2b":
+            from app.runtime.backends.e2b_backend import E2BBackend
+            register_sandbox_backend(E2BBackend())
+        elif name == "local":
+            from app.runtime.backends.local_backend import LocalBackend
+            register_sandbox_backend(LocalBackend())
+        elif name == "synthetic":
+            from app.runtime.backends.synthetic_backend import SyntheticBackend
+            register_sandbox_backend(SyntheticBackend())
+        else:
+            raise ValueError(f"Unknown sandbox backend: {name}")
+    return _backends[name]
@@ -0,0 +1,109 @@
+import inspect
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import IO, Any, Awaitable, Callable, Dict, List, Optional, Union
+
+# Output callbacks receive one decoded line at a time, sync or async.
+LineCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+FILE = "file"
+DIR = "dir"
+
+
+@dataclass
+class SandboxEntry:
+    name: str
+    path: str
+    type: str  # FILE or DIR
+
+
+@dataclass
+class ExecutionError:
+    name: str
+    value: str
+    traceback: str = ""
+
+
+@dataclass
+class Execution:
+    error: Optional[ExecutionError] = None
+
+
+class CommandExitError(Exception):
+    def __init__(self, exit_code: int, stderr: str = ""):
+        super().__init__(f"Command exited with code {exit_code}: {stderr.strip()[-500:]}")
+        self.exit_code = exit_code
+        self.stderr = stderr
+
+
+async def emit(callback: Optional[LineCallback], line: str):
+    if callback is None:
+        return
+    result = callback(line)
+    if inspect.isawaitable(result):
+        await result
+
+
+class SandboxCommands(ABC):
+    @abstractmethod
+    async def run(
+        self,
+        cmd: str,
+        on_stdout: Optional[LineCallback] = None,
+        on_stderr: Optional[LineCallback] = None,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Runs a shell command, streaming output line by line. Raises CommandExitError on failure."""
+
+
+class SandboxFiles(ABC):
+    @abstractmethod
+    async def make_dir(self, path: str) -> None: ...
+
+    @abstractmethod
+    async def list(self, path: str) -> List[SandboxEntry]: ...
+
+    @abstractmethod
+    async def read(self, path: str) -> bytes: ...
+
+    @abstractmethod
+    async def write(self, path: str, data: Union[str, bytes, IO]) -> None: ...
+
+    @abstractmethod
+    async def remove(self, path: str) -> None: ...
+
+
+class Sandbox(ABC):
+    commands: SandboxCommands
+    files: SandboxFiles
+
+    @abstractmethod
+    async def run_code(
+        self,
+        code: str,
+        context: Any = None,
+        on_stdout: Optional[LineCallback] = None,
+        on_stderr: Optional[LineCallback] = None,
+        envs: Optional[Dict[str, str]] = None,
+    ) -> Execution: ...
+
+    async def create_code_context(self) -> Any:
+        """Fresh interpreter state for one run_code call. Backends without shared state return None."""
+        return None
+
+    async def remove_code_context(self, context: Any) -> None:
+        return None
+
+    async def set_timeout(self, seconds: int) -> None:
+        """Extends the sandbox lifetime, for backends that expire idle sandboxes."""
+        return None
+
+    @abstractmethod
+    async def kill(self) -> None: ...
+
+
+class SandboxBackend(ABC):
+    name: str
+
+    @abstractmethod
+    async def create(self, envs: Dict[str, str]) -> Sandbox: ...
@@ -0,0 +1,92 @@
+from typing import IO, Any, Dict, List, Optional, Union
+from e2b import CommandExitException
+from e2b_code_interpreter import AsyncSandbox, FileType
+
+from app.core.config import settings
+from app.runtime.backends.base import (
+    DIR, FILE, Execution, ExecutionError, LineCallback, Sandbox, SandboxBackend,
+    SandboxCommands, SandboxEntry, SandboxFiles, CommandExitError,
+)
+
+
+def _lines(callback: Optional[LineCallback]):
+    # commands.run hands us str, run_code hands us OutputMessage
+    if callback is None:
+        return None
+    return lambda o: callback(getattr(o, "line", str(o)))
+
+
+class E2BCommands(SandboxCommands):
+    def __init__(self, sandbox: AsyncSandbox):
+        self._sandbox = sandbox
+
+    async def run(self, cmd, on_stdout=None, on_stderr=None, timeout=None) -> int:
+        try:
+            result = await self._sandbox.commands.run(
+                cmd, on_stdout=_lines(on_stdout), on_stderr=_lines(on_stderr), timeout=timeout or 60
+            )
+        except CommandExitException as e:
+            raise CommandExitError(e.exit_code, e.stderr) from e
+        return result.exit_code
+
+
+class E2BFiles(SandboxFiles):
+    def __init__(self, sandbox: AsyncSandbox):
+        self._sandbox = sandbox
+
+    async def make_dir(self, path: str) -> None:
+        await self._sandbox.files.make_dir(path)
+
+    async def list(self, path: str) -> List[SandboxEntry]:
+        entries = await self._sandbox.files.list(path)
+        return [
+            SandboxEntry(name=e.name, path=e.path, type=DIR if e.type == FileType.DIR else FILE)
+            for e in entries
+        ]
+
+    async def read(self, path: str) -> bytes:
+        return bytes(await self._sandbox.files.read(path, format="bytes"))
+
+    async def write(self, path: str, data: Union[str, bytes, IO]) -> None:
+        await self._sandbox.files.write(path, data)
+
+    async def remove(self, path: str) -> None:
+        await self._sandbox.files.remove(path)
+
+
+class E2BSandbox(Sandbox):
+    def __init__(self, sandbox: AsyncSandbox):
+        self._sandbox = sandbox
+        self.commands = E2BCommands(sandbox)
+        self.files = E2BFiles(sandbox)
+
+    async def run_code(self, code, context=None, on_stdout=None, on_stderr=None, envs=None) -> Execution:
+        execution = await self._sandbox.run_code(
+            code, context=context, on_stdout=_lines(on_stdout), on_stderr=_lines(on_stderr), envs=envs
+        )
+        if not execution.error:
+            return Execution()
+        return Execution(error=ExecutionError(
+            name=execution.error.name,
+            value=execution.error.value,
+            traceback=execution.error.traceback or "",
+        ))
+
+    async def create_code_context(self) -> Any:
+        return await self._sandbox.create_code_context()
+
+    async def remove_code_context(self, context: Any) -> None:
+        await self._sandbox.remove_code_context(context)
+
+    async def set_timeout(self, seconds: int) -> None:
+        await self._sandbox.set_timeout(seconds)
+
+    async def kill(self) -> None:
+        await self._sandbox.kill()
+
+
+class E2BBackend(SandboxBackend):
+    name = "e2b"
+
+    async def create(self, envs: Dict[str, str]) -> Sandbox:
+        return E2BSandbox(await AsyncSandbox.create(api_key=settings.E2B_API_KEY, envs=envs))
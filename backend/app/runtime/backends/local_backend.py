@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import IO, Dict, List, Union
+
+from app.core.config import settings
+from app.runtime.backends.base import (
+    DIR, FILE, CommandExitError, Execution, ExecutionError, Sandbox, SandboxBackend,
+    SandboxCommands, SandboxEntry, SandboxFiles, emit,
+)
+
+# Wraps agent code so exceptions come back structured, like E2B's ExecutionError
+_RUNNER = """
+import json, runpy, sys, traceback
+code_path, error_path = sys.argv[1], sys.argv[2]
+sys.argv = [code_path]
+try:
+    runpy.run_path(code_path, run_name="__main__")
+except SystemExit:
+    raise
+except BaseException as e:
+    with open(error_path, "w") as f:
+        json.dump({"name": type(e).__name__, "value": str(e), "traceback": traceback.format_exc()}, f)
+    sys.exit(1)
+"""
+
+# Without bubblewrap there is no mount namespace, so the runner maps /data onto the scratch
+# data dir in the Python file APIs instead; agent code written for /data keeps working
+_REMAP = """
+import builtins, io, os
+_DATA = os.environ["DATA_DIR"]
+
+
+def _remap(path):
+    if isinstance(path, os.PathLike):
+        path = os.fspath(path)
+    if isinstance(path, str) and (path == "/data" or path.startswith("/data/")):
+        return _DATA + path[5:]
+    if isinstance(path, bytes) and (path == b"/data" or path.startswith(b"/data/")):
+        return os.fsencode(_DATA) + path[5:]
+    return path
+
+
+def _wrap(func, arity):
+    def wrapper(*args, **kwargs):
+        args = [_remap(a) if i < arity else a for i, a in enumerate(args)]
+        return func(*args, **kwargs)
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+builtins.open = io.open = _wrap(io.open, 1)
+for _name in ("open", "stat", "lstat", "listdir", "scandir", "mkdir", "makedirs", "remove", "unlink",
+              "rmdir", "access", "chmod", "utime", "truncate", "chdir", "readlink", "walk"):
+    setattr(os, _name, _wrap(getattr(os, _name), 1))
+for _name in ("rename", "replace", "symlink", "link"):
+    setattr(os, _name, _wrap(getattr(os, _name), 2))
+"""
+
+_STREAM_LIMIT = 1024 * 1024  # longer lines are passed on in pieces of about this size
+_COPY_CHUNK = 1024 * 1024
+
+
+class LocalSandbox(Sandbox):
+    """
+    A sandbox backed by a scratch directory and subprocesses on this host.
+
+    With bubblewrap available the process sees its scratch dir mounted at /data and /workspace
+    inside fresh namespaces; otherwise it runs as a plain subprocess with cwd at the scratch dir
+    and DATA_DIR pointing at its data directory. /data is remapped there for Python file access,
+    though shell commands still see the host's /data, so this is only suitable for trusted agents.
+    """
+
+    def __init__(self, root: str, envs: Dict[str, str], isolated: bool):
+        self.root = root
+        self.isolated = isolated
+        self.commands = LocalCommands(self)
+        self.files = LocalFiles(self)
+        self._processes: set = set()
+        self._counter = 0
+
+        os.makedirs(os.path.join(root, "data"), exist_ok=True)
+        os.makedirs(os.path.join(root, ".kernel"), exist_ok=True)
+        with open(os.path.join(root, ".kernel", "runner.py"), "w") as f:
+            f.write(_RUNNER if isolated else _REMAP + _RUNNER)
+
+        workspace = "/workspace" if isolated else root
+        site = os.path.join(workspace, ".site-packages")
+        self.env = {
+            "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+            "LANG": os.environ.get("LANG", "C.UTF-8"),
+            "HOME": workspace,
+            "DATA_DIR": "/data" if isolated else os.path.join(root, "data"),
+            "PIP_TARGET": site,
+            "PIP_DISABLE_PIP_VERSION_CHECK": "1",
+            "PYTHONPATH": site,
+            "PYTHONUNBUFFERED": "1",
+            **envs,
+        }
+
+    def host_path(self, path: str) -> str:
+        """Maps a sandbox path (/data/x, /workspace/x or relative) onto the scratch dir."""
+        path = os.path.normpath(path)
+        for prefix, target in (("/workspace", ""), ("/data", "data")):
+            if path == prefix or path.startswith(prefix + "/"):
+                path = os.path.join(target, path[len(prefix):].lstrip("/"))
+                break
+        resolved = os.path.abspath(os.path.join(self.root, path.lstrip("/")))
+        if resolved != self.root and not resolved.startswith(self.root + os.sep):
+            raise PermissionError(f"Path escapes sandbox: {path}")
+        return resolved
+
+    def _argv(self, argv: List[str]) -> List[str]:
+        if not self.isolated:
+            return argv
+        return [
+            "bwrap", "--die-with-parent", "--unshare-all", "--share-net",
+            "--ro-bind", "/", "/",
+            "--dev", "/dev", "--proc", "/proc", "--tmpfs", "/tmp",
+            "--bind", self.root, "/workspace",
+            "--bind", os.path.join(self.root, "data"), "/data",
+            "--chdir", "/workspace",
+            *argv,
+        ]
+
+    async def exec(self, argv, on_stdout=None, on_stderr=None, timeout=None, envs=None) -> tuple:
+        proc = await asyncio.create_subprocess_exec(
+            *self._argv(argv),
+            cwd=self.root,
+            env={**self.env, **(envs or {})},
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=_STREAM_LIMIT,
+        )
+        self._processes.add(proc)
+        stderr_tail: List[str] = []
+
+        async def pump(stream, callback, keep=None):
+            while True:
+                try:
+                    raw = await stream.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    raw = e.partial  # output ending without a newline; empty at EOF
+                    if not raw:
+                        break
+                except asyncio.LimitOverrunError as e:
+                    # No newline within the limit: emit what is buffered as a line of its own
+                    raw = await stream.readexactly(e.consumed)
+                line = raw.decode("utf-8", errors="replace").rstrip("\n")
+                if keep is not None:
+                    keep.append(line)
+                    del keep[:-50]
+                await emit(callback, line)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(pump(proc.stdout, on_stdout), pump(proc.stderr, on_stderr, stderr_tail), proc.wait()),
+                timeout,
+            )
+        except BaseException:
+            # Timeout, cancel or a failing output callback: don't leave the child running
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+            await proc.wait()
+            raise
+        finally:
+            self._processes.discard(proc)
+        return proc.returncode, "\n".join(stderr_tail)
+
+    async def run_code(self, code, context=None, on_stdout=None, on_stderr=None, envs=None) -> Execution:
+        self._counter += 1
+        kernel_dir = os.path.join(self.root, ".kernel")
+        code_path = os.path.join(kernel_dir, f"main_{self._counter}.py")
+        error_path = os.path.join(kernel_dir, f"error_{self._counter}.json")
+        with open(code_path, "w") as f:
+            f.write(code)
+
+        inner = "/workspace/.kernel" if self.isolated else kernel_dir
+        await self.exec(
+            [sys.executable, "-u", f"{inner}/runner.py",
+             f"{inner}/main_{self._counter}.py", f"{inner}/error_{self._counter}.json"],
+            on_stdout=on_stdout, on_stderr=on_stderr, envs=envs,
+        )
+        if not os.path.exists(error_path):
+            return Execution()
+        with open(error_path) as f:
+            err = json.load(f)
+        return Execution(error=ExecutionError(name=err["name"], value=err["value"], traceback=err["traceback"]))
+
+    async def kill(self) -> None:
+        for proc in list(self._processes):
+            if proc.returncode is None:
+                proc.kill()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class LocalCommands(SandboxCommands):
+    def __init__(self, sandbox: LocalSandbox):
+        self._sandbox = sandbox
+
+    async def run(self, cmd, on_stdout=None, on_stderr=None, timeout=None) -> int:
+        code, stderr = await self._sandbox.exec(["/bin/sh", "-c", cmd], on_stdout, on_stderr, timeout)
+        if code != 0:
+            raise CommandExitError(code, stderr)
+        return code
+
+
+class LocalFiles(SandboxFiles):
+    def __init__(self, sandbox: LocalSandbox):
+        self._sandbox = sandbox
+
+    async def make_dir(self, path: str) -> None:
+        os.makedirs(self._sandbox.host_path(path), exist_ok=True)
+
+    async def list(self, path: str) -> List[SandboxEntry]:
+        base = self._sandbox.host_path(path)
+        entries = []
+        with os.scandir(base) as it:
+            for e in it:
+                entries.append(SandboxEntry(
+                    name=e.name, path=os.path.join(path, e.name), type=DIR if e.is_dir() else FILE
+                ))
+        return entries
+
+    async def read(self, path: str) -> bytes:
+        return await asyncio.to_thread(self._read, self._sandbox.host_path(path))
+
+    async def write(self, path: str, data: Union[str, bytes, IO]) -> None:
+        await asyncio.to_thread(self._write, self._sandbox.host_path(path), data)
+
+    async def remove(self, path: str) -> None:
+        target = self._sandbox.host_path(path)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _write(path: str, data: Union[str, bytes, IO]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            if isinstance(data, str):
+                f.write(data.encode("utf-8"))
+            elif isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f, _COPY_CHUNK)
+
+
+class LocalBackend(SandboxBackend):
+    name = "local"
+
+    def __init__(self):
+        mode = settings.LOCAL_SANDBOX_ISOLATION
+        has_bwrap = shutil.which("bwrap") is not None
+        if mode not in ("bwrap", "none"):
+            raise RuntimeError(f"LOCAL_SANDBOX_ISOLATION must be bwrap or none, not {mode!r}")
+        if mode == "bwrap" and not has_bwrap:
+            raise RuntimeError(
+                "LOCAL_SANDBOX_ISOLATION=bwrap but bubblewrap is not installed; install it, or set "
+                "LOCAL_SANDBOX_ISOLATION=none to run trusted agents as plain subprocesses"
+            )
+        self.isolated = mode == "bwrap"
+        if not self.isolated:
+            print("LocalBackend: running agents as plain subprocesses (no namespace isolation)")
+
+    async def create(self, envs: Dict[str, str]) -> Sandbox:
+        base = settings.LOCAL_SANDBOX_ROOT
+        if base:
+            os.makedirs(base, exist_ok=True)
+        root = tempfile.mkdtemp(prefix="kernel-sandbox-", dir=base)
+        return LocalSandbox(os.path.realpath(root), envs, self.isolated)
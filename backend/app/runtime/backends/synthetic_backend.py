@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from typing import IO, Dict, List, Union
+
+from app.runtime.backends.base import (
+    FILE, Execution, Sandbox, SandboxBackend, SandboxCommands, SandboxEntry, SandboxFiles, emit,
+)
+
+
+class SyntheticBackend(SandboxBackend):
+    """
+    In-memory sandbox that generates output instead of executing code, for benchmarks and
+    load tests. Each stdout line starts with "<seq> <perf_counter_ns>" so consumers can
+    measure end-to-end latency; lines are padded to line_size bytes.
+    """
+
+    name = "synthetic"
+
+    def __init__(
+        self,
+        lines: int = 1000,
+        lines_per_second: float = 0,  # 0 = as fast as the executor can take them
+        line_size: int = 80,
+        artifact_count: int = 1,
+        artifact_size: int = 1024,
+        create_delay: float = 0.0,
+        install_lines: int = 0,
+    ):
+        self.lines = lines
+        self.lines_per_second = lines_per_second
+        self.line_size = line_size
+        self.artifact_count = artifact_count
+        self.artifact_size = artifact_size
+        self.create_delay = create_delay
+        self.install_lines = install_lines
+
+    async def create(self, envs: Dict[str, str]) -> Sandbox:
+        if self.create_delay:
+            await asyncio.sleep(self.create_delay)
+        return SyntheticSandbox(self)
+
+
+class SyntheticSandbox(Sandbox):
+    def __init__(self, backend: SyntheticBackend):
+        self.backend = backend
+        self.store: Dict[str, bytes] = {}
+        self.commands = SyntheticCommands(self)
+        self.files = SyntheticFiles(self)
+
+    def make_line(self, seq: int) -> str:
+        head = f"{seq} {time.perf_counter_ns()} "
+        return head + "x" * max(0, self.backend.line_size - len(head))
+
+    async def run_code(self, code, context=None, on_stdout=None, on_stderr=None, envs=None) -> Execution:
+        backend = self.backend
+        started = time.perf_counter()
+        seq = 0
+        while seq < backend.lines:
+            if backend.lines_per_second:
+                # Emit whatever is due, then yield so the line rate stays close to the target
+                due = min(backend.lines, int((time.perf_counter() - started) * backend.lines_per_second) + 1)
+                while seq < due:
+                    await emit(on_stdout, self.make_line(seq))
+                    seq += 1
+                await asyncio.sleep(0.001)
+            else:
+                await emit(on_stdout, self.make_line(seq))
+                seq += 1
+                if seq % 256 == 0:
+                    await asyncio.sleep(0)
+
+        for i in range(backend.artifact_count):
+            self.store[f"/data/artifact_{i}.bin"] = os.urandom(backend.artifact_size)
+        return Execution()
+
+    async def kill(self) -> None:
+        self.store.clear()
+
+
+class SyntheticCommands(SandboxCommands):
+    def __init__(self, sandbox: SyntheticSandbox):
+        self._sandbox = sandbox
+
+    async def run(self, cmd, on_stdout=None, on_stderr=None, timeout=None) -> int:
+        for i in range(self._sandbox.backend.install_lines):
+            await emit(on_stdout, f"Collecting package-{i}")
+        return 0
+
+
+class SyntheticFiles(SandboxFiles):
+    def __init__(self, sandbox: SyntheticSandbox):
+        self._store = sandbox.store
+
+    async def make_dir(self, path: str) -> None:
+        return None
+
+    async def list(self, path: str) -> List[SandboxEntry]:
+        prefix = path.rstrip("/") + "/"
+        return [
+            SandboxEntry(name=p[len(prefix):], path=p, type=FILE)
+            for p in self._store if p.startswith(prefix) and "/" not in p[len(prefix):]
+        ]
+
+    async def read(self, path: str) -> bytes:
+        return self._store[path]
+
+    async def write(self, path: str, data: Union[str, bytes, IO]) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        elif not isinstance(data, (bytes, bytearray)):
+            data = data.read()
+        self._store[path] = bytes(data)
+
+    async def remove(self, path: str) -> None:
+        prefix = path.rstrip("/") + "/"
+        for p in [p for p in self._store if p == path or p.startswith(prefix)]:
+            del self._store[p]
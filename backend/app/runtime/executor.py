@@ -1,19 +1,71 @@
 import asyncio
 import json
+import os
+import time
 from datetime import datetime
-from typing import Dict, Any, AsyncGenerator, Optional
-from e2b_code_interpreter import AsyncSandbox as Sandbox, FileType
-from sqlmodel import Session, select
+from typing import Dict, Any, AsyncGenerator, Callable, List, Optional
+from sqlmodel import Session
 
 from app.core.config import settings
 from app.core.database import engine
-from app.models import Run
+from app.core.metrics import registry
+from app.models import Agent, Run
+from app.runtime.backends import DIR, get_sandbox_backend
+from app.runtime.logs import ERROR, STDERR, STDOUT, SYSTEM, LogRecord, decode_records, encode_records, raw_log_blocks
+from app.runtime.sandbox_pool import sandbox_pool, PooledSandbox
+from app.runtime.tracing import RunTrace
 from app.services.artifact_service import artifact_service
+from app.services.log_search_service import log_search_service
+
+RUNS_STARTED = registry.counter("kernel_runs_started_total", "Runs accepted by the executor")
+RUNS_FINISHED = registry.counter("kernel_runs_finished_total", "Runs finished, by final status", ["status"])
+RUNS_ACTIVE = registry.gauge("kernel_runs_active", "Runs currently executing")
+RUN_QUEUE_DEPTH = registry.gauge("kernel_run_queue_depth", "Runs accepted but not yet marked running")
+RUN_SLOT_WAIT = registry.histogram("kernel_run_slot_wait_seconds", "Time runs waited for a MAX_CONCURRENT_RUNS slot")
+INPUT_BYTES = registry.counter("kernel_run_input_bytes_total", "Bytes of input files streamed into sandboxes")
+RUN_DURATION = registry.histogram("kernel_run_duration_seconds", "Wall-clock run duration")
+SANDBOX_CREATE = registry.histogram("kernel_sandbox_create_seconds", "Sandbox creation latency", ["backend"])
+DEPENDENCY_INSTALL = registry.histogram("kernel_dependency_install_seconds", "pip install duration")
+ARTIFACT_COLLECT = registry.histogram("kernel_artifact_collect_seconds", "Time to copy /data artifacts out of the sandbox")
+SANDBOX_REUSED = registry.counter("kernel_sandbox_reuse_total", "Runs that reused a warm sandbox")
+SETUP_SECONDS_SAVED = registry.counter("kernel_sandbox_setup_seconds_saved_total", "Sandbox setup time skipped by reuse")
+LOG_LINES = registry.counter("kernel_log_lines_total", "Log lines broadcast by the executor")
+LOG_FRAMES = registry.counter("kernel_log_frames_total", "Coalesced log frames fanned out by the executor")
+LOG_FRAME_LINES = registry.histogram(
+    "kernel_log_frame_lines", "Lines per coalesced log frame", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+STREAM_SUBSCRIBERS = registry.gauge("kernel_stream_subscribers", "Active log stream subscribers")
+RUNS_STOPPED = registry.counter("kernel_runs_stopped_total", "Runs stopped by the executor before finishing", ["reason"])
+
+# Final status -> message for runs the executor stopped
+STOP_MESSAGES = {
+    "cancelled": "Run cancelled.",
+    "timeout": "Run exceeded its time limit and was stopped.",
+    "limit_exceeded": "Run exceeded its output limit and was stopped.",
+    "interrupted": "Run interrupted by server shutdown; it will be retried on restart.",
+}
+OUTPUT_STREAMS = (STDOUT, STDERR, ERROR)
+INPUTS_DIR = "/data/inputs"  # input files and payload.json are placed here
+
+class ExecutorDraining(RuntimeError):
+    """Raised by start_run once the executor has begun shutting down."""
+
+
+def _limit(agent_value: Optional[int], default: int) -> int:
+    return agent_value if agent_value is not None else default
 
 class AgentExecutor:
     def __init__(self):
-        # run_id -> { "queues": [...], "history": [], "task": asyncio.Task }
+        # run_id -> { "queues": [...], "history": [LogRecord, ...], "task": asyncio.Task,
+        #            "started": bool, "stop_reason": Optional[str], "agent_id": Optional[int],
+        #            "status": final status once known, "waiting": queued for a run slot }
+        # A queue is anything with put_nowait(frame), a frame being a list of LogRecords;
+        # None is put once the run ends.
         self._active_runs: Dict[int, Dict[str, Any]] = {}
+        self._draining = False
+        # Callables receiving {"type": "run_started" | "run_running" | "run_finished", ...} lifecycle events
+        self._listeners: List[Callable[[dict], None]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
 
     async def start_run(
         self,
@@ -22,11 +74,17 @@ class AgentExecutor:
         code: str,
         dependencies: str = "",
         secrets: Dict[str, str] = {},
-        payload: Dict[str, Any] = {}
+        payload: Dict[str, Any] = {},
+        agent_id: Optional[int] = None,
+        version_id: Optional[int] = None,
+        inputs: Optional[Dict[str, str]] = None
     ):
         """
-        Starts the execution of the agent code in a background task.
+        Starts the execution of the agent code in a background task. `inputs` maps sandbox
+        paths to local files that are streamed into the sandbox before the code runs.
         """
+        if self._draining:
+            raise ExecutorDraining("Server is shutting down; not accepting new runs")
         if run_id in self._active_runs:
             # Already running
             return
@@ -35,43 +93,147 @@ class AgentExecutor:
         self._active_runs[run_id] = {
             "queues": [],
             "history": [],
-            "task": None
+            "task": None,
+            "started": False,
+            "stop_reason": None,
+            "agent_id": agent_id,
+            "status": None,
+            "waiting": False,
         }
+        RUNS_STARTED.inc()
+        RUN_QUEUE_DEPTH.inc()
+        self._notify({"type": "run_started", "run_id": run_id, "agent_id": agent_id})
 
         # Start background task
         task = asyncio.create_task(
-            self._manage_run(agent_name, run_id, code, dependencies, secrets, payload)
+            self._manage_run(agent_name, run_id, code, dependencies, secrets, payload, agent_id, version_id, inputs)
         )
         self._active_runs[run_id]["task"] = task
 
-    async def stream_logs(self, run_id: int) -> AsyncGenerator[str, None]:
+    def is_active(self, run_id: int) -> bool:
+        return run_id in self._active_runs
+
+    def cancel_run(self, run_id: int, reason: str = "cancelled") -> bool:
+        """
+        Stops an active run: its sandbox is killed and the run ends with status `reason`
+        (cancelled, timeout or limit_exceeded). Returns False if the run is not active here.
+        """
+        run_data = self._active_runs.get(run_id)
+        if run_data is None:
+            return False
+        if run_data["stop_reason"] is None:
+            run_data["stop_reason"] = reason
+            # A run that hasn't reached the sandbox yet sees stop_reason and finishes on its own
+            if (run_data["started"] or run_data["waiting"]) and run_data["task"] is not None:
+                run_data["task"].cancel()
+        return True
+
+    def _run_slots(self) -> Optional[asyncio.Semaphore]:
+        # Created on first use so it binds to the running loop
+        if self._slots is None and settings.MAX_CONCURRENT_RUNS > 0:
+            self._slots = asyncio.Semaphore(settings.MAX_CONCURRENT_RUNS)
+        return self._slots
+
+    async def _upload_inputs(self, sandbox, inputs: Dict[str, str]):
+        """Writes input files into the sandbox a few at a time, each from an open file handle."""
+        for directory in sorted({os.path.dirname(target) for target in inputs}):
+            await sandbox.files.make_dir(directory)
+        limit = asyncio.Semaphore(max(1, settings.INPUT_UPLOAD_CONCURRENCY))
+
+        async def upload(target: str, source: str):
+            async with limit:
+                with open(source, "rb") as f:
+                    await sandbox.files.write(target, f)
+                INPUT_BYTES.inc(os.path.getsize(source))
+
+        await asyncio.gather(*(upload(target, source) for target, source in inputs.items()))
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    def accept_runs(self):
+        self._draining = False
+
+    async def drain(self, timeout: float):
+        """
+        Shutdown: refuse new runs, give active ones `timeout` seconds to finish, then stop the
+        rest as interrupted. Every run's finalizer flushes its buffered logs before this returns.
+        """
+        self._draining = True
+        tasks = [data["task"] for data in self._active_runs.values() if data["task"] is not None]
+        if not tasks:
+            return
+        print(f"Draining {len(tasks)} active runs (up to {timeout}s)...")
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            for run_id in list(self._active_runs):
+                self.cancel_run(run_id, "interrupted")
+            await asyncio.wait(pending, timeout=10)
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[dict], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: dict):
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Run event listener failed: {e}")
+
+    def subscribe(self, run_id: int, queue) -> bool:
         """
-        Yields logs for a given run_id. Matches keys in _active_runs.
+        Replays the run's history into queue as one frame, then feeds it live frames and a
+        final None. Returns False if the run is not active here. Pair every success with
+        unsubscribe().
+        """
+        run_data = self._active_runs.get(run_id)
+        if run_data is None:
+            return False
+        if run_data["history"]:
+            queue.put_nowait(list(run_data["history"]))
+        run_data["queues"].append(queue)
+        STREAM_SUBSCRIBERS.inc()
+        return True
+
+    def unsubscribe(self, run_id: int, queue):
+        STREAM_SUBSCRIBERS.dec()
+        run_data = self._active_runs.get(run_id)
+        if run_data is not None and queue in run_data["queues"]:
+            run_data["queues"].remove(queue)
+
+    def final_status(self, run_id: int) -> Optional[str]:
+        run_data = self._active_runs.get(run_id)
+        return run_data["status"] if run_data else None
+
+    async def stream_frames(self, run_id: int) -> AsyncGenerator[List[LogRecord], None]:
+        """
+        Yields log frames for a given run_id. Matches keys in _active_runs.
         If run is active, yields history + live updates.
         """
-        if run_id not in self._active_runs:
+        queue = asyncio.Queue()
+        if not self.subscribe(run_id, queue):
             print(f"Warning: Attempted to stream unknown or finished run {run_id}")
             return
 
-        run_data = self._active_runs[run_id]
-        queue = asyncio.Queue()
-        
-        # 1. Replay history immediately
-        for log in run_data["history"]:
-            queue.put_nowait(log)
-            
-        run_data["queues"].append(queue)
-        
         try:
             while True:
-                msg = await queue.get()
-                if msg is None: # Sentinel
+                frame = await queue.get()
+                if frame is None: # Sentinel
                     break
-                yield msg
+                yield frame
         finally:
-            if run_id in self._active_runs:
-                if queue in run_data["queues"]:
-                    run_data["queues"].remove(queue)
+            self.unsubscribe(run_id, queue)
+
+    async def stream_logs(self, run_id: int) -> AsyncGenerator[LogRecord, None]:
+        """Like stream_frames, one record at a time."""
+        async for frame in self.stream_frames(run_id):
+            for record in frame:
+                yield record
 
     async def _manage_run(
         self,
@@ -80,7 +242,10 @@ class AgentExecutor:
         code: str,
         dependencies: str,
         secrets: Dict[str, str],
-        payload: Dict[str, Any]
+        payload: Dict[str, Any],
+        agent_id: Optional[int] = None,
+        version_id: Optional[int] = None,
+        inputs: Optional[Dict[str, str]] = None
     ):
         """
         Background task that actually runs the code, updates DB, and broadcasts logs.
@@ -89,56 +254,167 @@ class AgentExecutor:
         # Local buffer for DB updates to avoid too many commits
         db_buffer = []
         last_db_update = datetime.utcnow()
+        queued = True
+        started = None
+        trace = RunTrace(run_id)
+        seq = 0
+        max_log_bytes = max_log_lines = 0
+        output_bytes = output_lines = 0
+        limit_hit = False
+        # Coalescing: lines collect in `pending` and go out as one frame per interval (or
+        # sooner once max bytes are buffered) to history, the DB buffer and every subscriber.
+        frame_interval = settings.LOG_FRAME_INTERVAL_MS / 1000
+        frame_max_bytes = settings.LOG_FRAME_MAX_BYTES
+        pending: List[LogRecord] = []
+        pending_bytes = 0
+        frame_handle: Optional[asyncio.TimerHandle] = None
+        db_target = None  # (session, run) once the run row is loaded, for periodic persistence
+
+        def emit_frame():
+            nonlocal pending, pending_bytes, frame_handle
+            if frame_handle is not None:
+                frame_handle.cancel()
+                frame_handle = None
+            if not pending or run_id not in self._active_runs:
+                return
+            frame, pending, pending_bytes = pending, [], 0
+            run_data = self._active_runs[run_id]
+            run_data["history"].extend(frame)
+            db_buffer.extend(frame)
+            for q in run_data["queues"]:
+                q.put_nowait(frame)
+            LOG_FRAMES.inc()
+            LOG_FRAME_LINES.observe(len(frame))
+            if db_target is not None:
+                flush_db(*db_target)
         
-        def broadcast(msg: str | None):
+        def broadcast(stream: str | None, text: str = ""):
+            """Records one line on a stream; broadcast(None) ends the stream for subscribers."""
+            nonlocal seq, output_bytes, output_lines, limit_hit, pending_bytes, frame_handle
             # 1. Update In-Memory
             if run_id in self._active_runs:
                 run_data = self._active_runs[run_id]
-                if msg is not None:
-                    run_data["history"].append(msg)
-                    db_buffer.append(msg)
-                
-                # Push to all waiting queues
-                for q in run_data["queues"]:
-                    q.put_nowait(msg)
+                if stream in OUTPUT_STREAMS:
+                    if limit_hit:
+                        return  # over the limit; drop output until the run is torn down
+                    output_lines += 1
+                    if max_log_bytes:
+                        output_bytes += len(text.encode("utf-8"))
+                    if (max_log_lines and output_lines > max_log_lines) or (max_log_bytes and output_bytes > max_log_bytes):
+                        limit_hit = True
+                        broadcast(SYSTEM, f"Output limit reached ({max_log_lines or '-'} lines / {max_log_bytes or '-'} bytes).")
+                        # Output callbacks may run inside the run's own task; cancel from the loop instead
+                        asyncio.get_running_loop().call_soon(self.cancel_run, run_id, "limit_exceeded")
+                        return
+                if stream is None:
+                    # End of run: deliver what is left, then the sentinel
+                    emit_frame()
+                    for q in run_data["queues"]:
+                        q.put_nowait(None)
+                    return
 
-        async def flush_db(session: Session, run_obj: Run, force: bool = False):
+                pending.append(LogRecord(seq, time.time(), stream, text))
+                seq += 1
+                pending_bytes += len(text) + 16
+                LOG_LINES.inc()
+                # Status and error lines are rare and people wait on them; send those right away
+                if stream in (SYSTEM, ERROR) or not frame_interval or pending_bytes >= frame_max_bytes:
+                    emit_frame()
+                elif frame_handle is None:
+                    frame_handle = asyncio.get_running_loop().call_later(frame_interval, emit_frame)
+
+        def flush_db(session: Session, run_obj: Run, force: bool = False):
             nonlocal last_db_update, db_buffer
             now = datetime.utcnow()
+            if force:
+                emit_frame()
             if not db_buffer:
                 return
             
-            # Save if forced, or enough time passed, or buffer is large
-            if force or (now - last_db_update).total_seconds() > 2 or len(db_buffer) >= 20:
-                chunk = "\n".join(db_buffer) + "\n"
+            # Save if forced or enough time passed; each save rewrites the log blob, so batch
+            if force or (now - last_db_update).total_seconds() > 2:
+                chunk = encode_records(db_buffer)
                 
                 # Append to logs
-                if not run_obj.logs:
-                    run_obj.logs = ""
-                run_obj.logs += chunk
+                run_obj.log_data = (run_obj.log_data or b"") + chunk
+                log_search_service.index_records(session, run_obj.id, run_obj.agent_id, db_buffer)
                 
                 session.add(run_obj)
                 session.commit()
-                session.refresh(run_obj)
                 
                 db_buffer.clear()
                 last_db_update = now
 
         # --- Execution Logic ---
-        with Session(engine) as session:
+        timeout_handle = None
+        slots = None
+        interrupted = None
+        run_data = self._active_runs[run_id]
+        if self._run_slots() is not None and not run_data["stop_reason"]:
+            # Global concurrency limit: wait (still queued) for a free slot before opening a
+            # session, so queued runs don't each hold a pooled DB connection
+            wait_started = time.perf_counter()
+            run_data["waiting"] = True
+            try:
+                await self._slots.acquire()
+                slots = self._slots
+                RUN_SLOT_WAIT.observe(time.perf_counter() - wait_started)
+            except asyncio.CancelledError as e:
+                if run_data["stop_reason"] is None:
+                    interrupted = e  # not ours; re-raised below so the usual cleanup runs
+                else:
+                    task = asyncio.current_task()
+                    if hasattr(task, "uncancel"):
+                        task.uncancel()
+            finally:
+                run_data["waiting"] = False
+
+        # Objects stay loaded across commits, so the connection goes back to the pool after each
+        # flush instead of being held (for a refresh) while the run awaits its sandbox
+        with Session(engine, expire_on_commit=False) as session:
             run = None
             try:
+                if interrupted is not None:
+                    raise interrupted
                 run = session.get(Run, run_id)
                 if not run:
-                    broadcast("[SYSTEM] Error: Run record not found in database.")
+                    broadcast(SYSTEM, "Error: Run record not found in database.")
+                    return
+
+                if run_data["stop_reason"]:
+                    # Cancelled while still queued
+                    run.status = run_data["stop_reason"]
+                    broadcast(SYSTEM, STOP_MESSAGES.get(run.status, "Run stopped."))
                     return
 
+                if run.log_data:
+                    # Requeued after a restart: keep appending to the earlier attempt's records
+                    raw = b"".join(raw_log_blocks(run))
+                    for record in decode_records(raw):
+                        seq = record.seq + 1
+                    run.log_data, run.log_codec, run.log_dict_id = raw, None, None
+                    if not run.log_indexed:
+                        log_search_service.index_run(session, run)
+
+                agent = session.get(Agent, run.agent_id)
+                timeout = _limit(agent.timeout_seconds if agent else None, settings.RUN_TIMEOUT_SECONDS)
+                max_log_bytes = _limit(agent.max_log_bytes if agent else None, settings.RUN_MAX_LOG_BYTES)
+                max_log_lines = _limit(agent.max_log_lines if agent else None, settings.RUN_MAX_LOG_LINES)
+                run_data["started"] = True
+                if timeout > 0:
+                    timeout_handle = asyncio.get_running_loop().call_later(timeout, self.cancel_run, run_id, "timeout")
+
                 # Mark as Running
                 run.status = "running"
                 run.start_time = datetime.utcnow()
                 session.add(run)
                 session.commit()
-                session.refresh(run)
+                queued = False
+                RUN_QUEUE_DEPTH.dec()
+                RUNS_ACTIVE.inc()
+                self._notify({"type": "run_running", "run_id": run_id, "agent_id": agent_id})
+                db_target = (session, run)
+                started = time.perf_counter()
 
                 # Prepare Environment
                 env_vars = secrets.copy()
@@ -146,107 +422,196 @@ class AgentExecutor:
                     env_vars["E2B_API_KEY"] = settings.E2B_API_KEY
 
                 # -- Sandbox Operations --
+                pool_key = sandbox_pool.make_key(agent_id, version_id, secrets)
+                pooled: Optional[PooledSandbox] = sandbox_pool.acquire(pool_key) if pool_key else None
                 sandbox = None
+                keep_sandbox = False
                 try:
-                    broadcast(f"[SYSTEM] Initializing Sandbox for Run {run_id}...")
-                    try:
-                        sandbox = await Sandbox.create(api_key=settings.E2B_API_KEY, envs=env_vars)
-                    except Exception as e:
-                        broadcast(f"[SYSTEM] Failed to create sandbox: {e}")
-                        raise e
-
-                    broadcast("[SYSTEM] Sandbox started.")
-                    await flush_db(session, run)
-
-                    # 1. Install Dependencies
-                    if dependencies and dependencies.strip():
-                        deps = " ".join(dependencies.splitlines())
-                        broadcast(f"[SYSTEM] Installing: {deps}")
-                        await flush_db(session, run)
-                        
-                        await sandbox.commands.run(
-                            f"pip install {deps}",
-                            on_stdout=lambda o: broadcast(f"[STDOUT] {getattr(o, 'line', str(o))}"),
-                            on_stderr=lambda o: broadcast(f"[STDERR] {getattr(o, 'line', str(o))}")
-                        )
+                    if pooled:
+                        try:
+                            # Reset /data so the previous run's artifacts don't leak into this one
+                            with trace.span("sandbox.reuse", reuse_count=pooled.reuse_count):
+                                await pooled.sandbox.files.remove("/data")
+                                await pooled.sandbox.files.make_dir("/data")
+                            sandbox = pooled.sandbox
+                            broadcast(SYSTEM, f"Reusing warm sandbox for Run {run_id} (reuse #{pooled.reuse_count}).")
+                            run.sandbox_reused = True
+                            run.sandbox_reuse_count = pooled.reuse_count
+                            run.setup_seconds_saved = round(pooled.setup_seconds, 3)
+                            SANDBOX_REUSED.inc()
+                            SETUP_SECONDS_SAVED.inc(pooled.setup_seconds)
+                        except Exception as e:
+                            broadcast(SYSTEM, f"Warm sandbox unusable, starting a fresh one: {e}")
+                            try:
+                                await pooled.sandbox.kill()
+                            except Exception:
+                                pass
+                            pooled = None
+
+                    if sandbox is None:
+                        setup_started = time.monotonic()
+                        broadcast(SYSTEM, f"Initializing Sandbox for Run {run_id}...")
+                        try:
+                            backend = get_sandbox_backend()
+                            with trace.span("sandbox.create", backend=backend.name), SANDBOX_CREATE.labels(backend.name).time():
+                                sandbox = await backend.create(envs=env_vars)
+                        except Exception as e:
+                            broadcast(SYSTEM, f"Failed to create sandbox: {e}")
+                            raise e
+
+                        broadcast(SYSTEM, "Sandbox started.")
+                        flush_db(session, run)
+
+                        # 1. Install Dependencies
+                        if dependencies and dependencies.strip():
+                            deps = " ".join(dependencies.splitlines())
+                            broadcast(SYSTEM, f"Installing: {deps}")
+                            flush_db(session, run)
+                            
+                            with trace.span("dependencies.install", packages=deps), DEPENDENCY_INSTALL.time():
+                                await sandbox.commands.run(
+                                    f"pip install {deps}",
+                                    on_stdout=lambda line: broadcast(STDOUT, line),
+                                    on_stderr=lambda line: broadcast(STDERR, line)
+                                )
+
+                        # 2. Setup Data
+                        await sandbox.files.make_dir("/data")
 
-                    # 2. Setup Data
-                    await sandbox.files.make_dir("/data")
+                        if pool_key:
+                            pooled = PooledSandbox(
+                                key=pool_key, sandbox=sandbox, setup_seconds=time.monotonic() - setup_started
+                            )
+
+                    # 3. Inputs: the trigger payload, then files (inbox uploads, upstream pipeline artifacts)
+                    if payload:
+                        await sandbox.files.make_dir(INPUTS_DIR)
+                        await sandbox.files.write(f"{INPUTS_DIR}/payload.json", json.dumps(payload))
+                    if inputs:
+                        with trace.span("inputs.upload", files=len(inputs)):
+                            await self._upload_inputs(sandbox, inputs)
+                        broadcast(SYSTEM, f"Copied {len(inputs)} input files into the sandbox.")
 
-                    # 3. Execute Code
-                    broadcast("[SYSTEM] Executing code...")
-                    await flush_db(session, run)
+                    # 4. Execute Code
+                    broadcast(SYSTEM, "Executing code...")
+                    flush_db(session, run)
                     
-                    exec_result = await sandbox.run_code(
-                        code,
-                        on_stdout=lambda o: broadcast(f"[STDOUT] {getattr(o, 'line', str(o))}"),
-                        on_stderr=lambda o: broadcast(f"[STDERR] {getattr(o, 'line', str(o))}")
-                    )
+                    with trace.span("code.execute") as span:
+                        # A pooled sandbox outlives this run, so give the code its own interpreter state
+                        context = await sandbox.create_code_context() if pooled else None
+                        exec_result = await sandbox.run_code(
+                            code,
+                            context=context,
+                            on_stdout=lambda line: broadcast(STDOUT, line),
+                            on_stderr=lambda line: broadcast(STDERR, line)
+                        )
+                        if exec_result.error:
+                            span["attributes"]["error.type"] = exec_result.error.name
 
                     if exec_result.error:
-                        broadcast(f"[ERROR] {exec_result.error.name}: {exec_result.error.value}")
+                        broadcast(ERROR, f"{exec_result.error.name}: {exec_result.error.value}")
                         if exec_result.error.traceback:
-                            broadcast("\n".join(exec_result.error.traceback))
+                            broadcast(ERROR, exec_result.error.traceback)
                     else:
-                        broadcast("[SYSTEM] Execution completed successfully.")
+                        broadcast(SYSTEM, "Execution completed successfully.")
 
-                    # 4. Artifacts
-                    try:
-                        files = await sandbox.files.list("/data")
-                        if files:
-                             broadcast(f"[SYSTEM] Found {len(files)} artifacts.")
+                    # 5. Artifacts
+                    with trace.span("artifacts.collect"), ARTIFACT_COLLECT.time():
+                        try:
+                            files = await sandbox.files.list("/data")
+                            if files:
+                                 broadcast(SYSTEM, f"Found {len(files)} artifacts.")
                         
-                        saved_artifacts = []
-                        for file_info in files:
-                            if file_info.type == FileType.DIR:
-                                continue
+                            saved_artifacts = []
+                            for file_info in files:
+                                if file_info.type == DIR:
+                                    continue
                             
-                            content = await sandbox.files.read(f"/data/{file_info.name}")
-                            if isinstance(content, str):
-                                content = content.encode('utf-8')
+                                content = await sandbox.files.read(f"/data/{file_info.name}")
                             
-                            artifact_service.save_artifact(
-                                agent_name, run_id, file_info.name, content
-                            )
-                            broadcast(f"[SYSTEM] Saved artifact: {file_info.name}")
-                            saved_artifacts.append(file_info.name)
+                                artifact_service.save_artifact(
+                                    agent_name, run_id, file_info.name, content
+                                )
+                                broadcast(SYSTEM, f"Saved artifact: {file_info.name}")
+                                saved_artifacts.append(file_info.name)
                             
-                        # Update Run record with artifacts list
-                        if saved_artifacts:
-                            run.artifacts_written = json.dumps(saved_artifacts)
-                            session.add(run)
+                            # Update Run record with artifacts list
+                            if saved_artifacts:
+                                run.artifacts_written = json.dumps(saved_artifacts)
+                                session.add(run)
 
-                    except Exception as e:
-                        broadcast(f"[SYSTEM] Error saving artifacts: {str(e)}")
+                        except Exception as e:
+                            broadcast(SYSTEM, f"Error saving artifacts: {str(e)}")
+
+                    if context:
+                        await sandbox.remove_code_context(context)
+                    keep_sandbox = pooled is not None
+
+                except asyncio.CancelledError:
+                    reason = self._active_runs[run_id]["stop_reason"]
+                    if reason is None:
+                        raise  # not ours (e.g. the loop is shutting down)
+                    # Our own cancel: clear it so the cleanup below can still await (3.11+)
+                    task = asyncio.current_task()
+                    if hasattr(task, "uncancel"):
+                        task.uncancel()
+                    keep_sandbox = False
+                    run.status = reason
+                    broadcast(SYSTEM, STOP_MESSAGES.get(reason, "Run stopped."))
+                    RUNS_STOPPED.labels(reason).inc()
 
                 except Exception as e:
-                    broadcast(f"[SYSTEM] Sandbox Error: {str(e)}")
+                    broadcast(SYSTEM, f"Sandbox Error: {str(e)}")
                     run.status = "error" # Infrastructure error
                     
                 finally:
-                    if sandbox:
-                        await sandbox.kill()
+                    with trace.span("sandbox.release", kept=keep_sandbox):
+                        if keep_sandbox:
+                            await sandbox_pool.release(pooled)
+                        elif sandbox:
+                            await sandbox.kill()
+                    # Too late to stop now; a cancel from here on only records the request
+                    self._active_runs[run_id]["started"] = False
 
             except Exception as e:
                 # Top-level DB/Code error
                 print(f"AgentExecutor Critical Error: {e}")
                 
             finally:
+                if timeout_handle is not None:
+                    timeout_handle.cancel()
+                if slots is not None:
+                    slots.release()
                 # Finalize DB
                 try:
                     if run:
-                        await flush_db(session, run, force=True)
+                        flush_db(session, run, force=True)
+                        db_target = None
                         if run.status == "running":
                             run.status = "success"
                         
                         run.end_time = datetime.utcnow()
+                        run.log_indexed = settings.LOG_SEARCH_ENABLED
+                        trace.finish(run.status)
+                        run.trace = trace.to_json()
                         session.add(run)
                         session.commit()
                 except Exception as e:
                     print(f"Error finalizing run in DB: {e}")
 
+                if queued:
+                    RUN_QUEUE_DEPTH.dec()
+                if started is not None:
+                    RUNS_ACTIVE.dec()
+                    RUN_DURATION.observe(time.perf_counter() - started)
+                RUNS_FINISHED.labels(run.status if run else "missing").inc()
+
                 # Cleanup Local State
+                final_status = run.status if run else "missing"
+                if run_id in self._active_runs:
+                    self._active_runs[run_id]["status"] = final_status
                 broadcast(None) # Signal end of stream
+                self._notify({"type": "run_finished", "run_id": run_id, "agent_id": agent_id, "status": final_status})
                 if run_id in self._active_runs:
                     del self._active_runs[run_id]
 
@@ -0,0 +1,112 @@
+import struct
+import zlib
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional
+
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+BLOCK_SIZE = 64 * 1024  # raw bytes per compressed block, the unit of streaming decompression
+ZLIB_DICT_SIZE = 32 * 1024  # zlib only looks back 32KB, so a bigger preset dictionary is wasted
+
+# compressed length, raw length
+_BLOCK_HEADER = struct.Struct("<II")
+
+
+@lru_cache(maxsize=None)
+def _zstandard():
+    # Optional and imported on first use; zlib (with preset dictionaries) is always available
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def available_codec(preferred: str) -> str:
+    if preferred == ZSTD and _zstandard() is None:
+        return ZLIB
+    return preferred
+
+
+def _compressor(codec: str, dictionary: Optional[bytes]):
+    if codec == ZSTD:
+        zstandard = _zstandard()
+        zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        cctx = zstandard.ZstdCompressor(level=9, dict_data=zdict)
+        return cctx.compress
+    if codec == ZLIB:
+        def compress(data: bytes) -> bytes:
+            obj = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=dictionary) if dictionary else zlib.compressobj(9, zlib.DEFLATED, -15)
+            return obj.compress(data) + obj.flush()
+        return compress
+    raise ValueError(f"Unknown log codec: {codec}")
+
+
+def _decompressor(codec: str, dictionary: Optional[bytes]):
+    if codec == ZSTD:
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed logs")
+        zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        dctx = zstandard.ZstdDecompressor(dict_data=zdict)
+        return lambda data, size: dctx.decompress(data, max_output_size=size)
+    if codec == ZLIB:
+        def decompress(data: bytes, size: int) -> bytes:
+            obj = zlib.decompressobj(-15, zdict=dictionary) if dictionary else zlib.decompressobj(-15)
+            return obj.decompress(data) + obj.flush()
+        return decompress
+    raise ValueError(f"Unknown log codec: {codec}")
+
+
+def split_blocks(raw_chunks: Iterable[bytes], block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """Groups whole encoded records into blocks of roughly block_size bytes."""
+    pending: List[bytes] = []
+    size = 0
+    for chunk in raw_chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= block_size:
+            yield b"".join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+def compress_blocks(blocks: Iterable[bytes], codec: str, dictionary: Optional[bytes] = None) -> bytes:
+    compress = _compressor(codec, dictionary)
+    out = []
+    for block in blocks:
+        packed = compress(block)
+        out.append(_BLOCK_HEADER.pack(len(packed), len(block)))
+        out.append(packed)
+    return b"".join(out)
+
+
+def iter_blocks(data: bytes, codec: str, dictionary: Optional[bytes] = None) -> Iterator[bytes]:
+    """Yields decompressed blocks one at a time, so readers never inflate a whole log at once."""
+    decompress = _decompressor(codec, dictionary)
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        packed_len, raw_len = _BLOCK_HEADER.unpack_from(view, offset)
+        offset += _BLOCK_HEADER.size
+        yield decompress(bytes(view[offset:offset + packed_len]), raw_len)
+        offset += packed_len
+
+
+def train_dictionary(codec: str, samples: List[bytes], size: int) -> Optional[bytes]:
+    """Builds a shared dictionary from sample blocks of an agent's logs, or None if too little data."""
+    samples = [s for s in samples if s]
+    if not samples:
+        return None
+    if codec == ZSTD:
+        zstandard = _zstandard()
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError:
+            # Training needs a fair number of samples; fall back to no dictionary
+            return None
+    # zlib has no trainer; recent content works well as a preset dictionary, most common last
+    joined = b"".join(samples)
+    return joined[-min(size, ZLIB_DICT_SIZE):]
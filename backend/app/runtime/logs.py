@@ -0,0 +1,142 @@
+import struct
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+STDOUT = "stdout"
+STDERR = "stderr"
+SYSTEM = "system"
+ERROR = "error"
+STREAMS = (STDOUT, STDERR, SYSTEM, ERROR)
+
+_STREAM_CODES = {name: code for code, name in enumerate(STREAMS)}
+_PREFIXES = {STDOUT: "[STDOUT] ", STDERR: "[STDERR] ", SYSTEM: "[SYSTEM] ", ERROR: "[ERROR] "}
+
+# seq (uint32), unix timestamp (float64), stream code (uint8), utf-8 text length (uint32)
+_HEADER = struct.Struct("<IdBI")
+
+
+class LogRecord(NamedTuple):
+    seq: int
+    ts: float
+    stream: str
+    text: str
+
+    def render(self) -> str:
+        """The legacy "[STDOUT] line" form, for plain-text consumers."""
+        return _PREFIXES[self.stream] + self.text
+
+    def to_dict(self) -> dict:
+        return {"seq": self.seq, "ts": self.ts, "stream": self.stream, "text": self.text}
+
+
+def make_record(seq: int, stream: str, text: str) -> LogRecord:
+    return LogRecord(seq, time.time(), stream, text)
+
+
+def encode_records(records: Iterable[LogRecord]) -> bytes:
+    parts = []
+    pack = _HEADER.pack
+    for record in records:
+        data = record.text.encode("utf-8")
+        parts.append(pack(record.seq, record.ts, _STREAM_CODES[record.stream], len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_records(data: bytes) -> Iterator[LogRecord]:
+    view = memoryview(data)
+    offset = 0
+    size = _HEADER.size
+    unpack = _HEADER.unpack_from
+    while offset < len(view):
+        seq, ts, code, length = unpack(view, offset)
+        offset += size
+        text = bytes(view[offset:offset + length]).decode("utf-8", errors="replace")
+        offset += length
+        yield LogRecord(seq, ts, STREAMS[code], text)
+
+
+def encoded_chunks(data: bytes) -> Iterator[bytes]:
+    """Splits encoded data into one bytes object per record, without decoding the text."""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        length = _HEADER.unpack_from(view, offset)[3]
+        end = offset + _HEADER.size + length
+        yield bytes(view[offset:end])
+        offset = end
+
+
+def parse_legacy(text: str) -> List[LogRecord]:
+    """Best-effort records from pre-structured "[PREFIX] line" logs (timestamps unknown)."""
+    records: List[LogRecord] = []
+    stream = SYSTEM
+    for line in text.splitlines():
+        for name, prefix in _PREFIXES.items():
+            if line.startswith(prefix):
+                stream, line = name, line[len(prefix):]
+                break
+        # Unprefixed lines (tracebacks) continue the previous stream
+        records.append(LogRecord(len(records), 0.0, stream, line))
+    return records
+
+
+def raw_log_blocks(run) -> Iterator[bytes]:
+    """The run's encoded records as raw byte blocks, decompressing one block at a time."""
+    if not run.log_data:
+        return
+    if not run.log_codec:
+        yield run.log_data
+        return
+    from app.services.log_service import log_service
+    yield from log_service.iter_raw_blocks(run)
+
+
+def run_records(run, streams: Optional[set] = None) -> Iterator[LogRecord]:
+    """All stored records for a run, structured or legacy, optionally filtered by stream."""
+    if run.log_data:
+        records = (record for block in raw_log_blocks(run) for record in decode_records(block))
+    else:
+        records = iter(parse_legacy(run.logs or ""))
+    for record in records:
+        if streams is None or record.stream in streams:
+            yield record
+
+
+def iter_run_log_lines(run) -> Iterator[str]:
+    if not run.log_data:
+        if run.logs:
+            yield run.logs
+        return
+    for record in run_records(run):
+        yield record.render() + "\n"
+
+
+def run_logs_text(run) -> str:
+    return "".join(iter_run_log_lines(run))
+
+
+def append_system_message(run, text: str):
+    """Appends one system line to a stored run, keeping whichever format the run already uses."""
+    if run.logs and not run.log_data:
+        run.logs += f"\n{_PREFIXES[SYSTEM]}{text}\n"
+        return
+    raw = b"".join(raw_log_blocks(run))
+    last_seq = -1
+    for record in decode_records(raw):
+        last_seq = record.seq
+    # Back to raw; compaction will compress it again
+    run.log_data = raw + encode_records([make_record(last_seq + 1, SYSTEM, text)])
+    run.log_codec = None
+    run.log_dict_id = None
+
+
+def parse_streams(value: Optional[str]) -> Optional[set]:
+    """Parses a comma-separated ?streams= filter; None means everything."""
+    if not value:
+        return None
+    streams = {s.strip().lower() for s in value.split(",") if s.strip()}
+    unknown = streams - set(STREAMS)
+    if unknown:
+        raise ValueError(f"Unknown log streams: {', '.join(sorted(unknown))}")
+    return streams
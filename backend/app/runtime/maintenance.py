@@ -0,0 +1,55 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from app.core.metrics import registry
+
+MAINTENANCE_DURATION = registry.histogram("kernel_maintenance_job_seconds", "Duration of background maintenance jobs", ["job"])
+MAINTENANCE_ERRORS = registry.counter("kernel_maintenance_job_errors_total", "Failed background maintenance job passes", ["job"])
+
+
+@dataclass
+class MaintenanceJob:
+    name: str
+    interval: float
+    fn: Callable[[], object]  # blocking; runs in a worker thread
+
+
+class MaintenanceWorker:
+    """Runs periodic blocking jobs (log compaction and the like) off the event loop."""
+
+    def __init__(self):
+        self._jobs: List[MaintenanceJob] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, name: str, interval: float, fn: Callable[[], object]):
+        if interval > 0:
+            self._jobs.append(MaintenanceJob(name, interval, fn))
+
+    async def run_once(self, job: MaintenanceJob):
+        try:
+            with MAINTENANCE_DURATION.labels(job.name).time():
+                await asyncio.to_thread(job.fn)
+        except Exception as e:
+            MAINTENANCE_ERRORS.labels(job.name).inc()
+            print(f"Maintenance job {job.name} failed: {e}")
+
+    async def _loop(self, job: MaintenanceJob):
+        while True:
+            await asyncio.sleep(job.interval)
+            await self.run_once(job)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(job)) for job in self._jobs]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_job(self, name: str) -> Optional[MaintenanceJob]:
+        return next((job for job in self._jobs if job.name == name), None)
+
+
+maintenance_worker = MaintenanceWorker()
@@ -0,0 +1,160 @@
+import asyncio
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.core.metrics import registry
+from app.runtime.executor import AgentExecutor
+from app.runtime.logs import LogRecord
+
+MUX_CONNECTIONS = registry.gauge("kernel_mux_connections", "Open multiplexed stream connections")
+MUX_SUBSCRIPTIONS = registry.gauge("kernel_mux_run_subscriptions", "Runs watched through multiplexed connections")
+MUX_FRAMES = registry.counter("kernel_mux_frames_total", "Frames sent on multiplexed connections")
+MUX_DROPPED = registry.counter("kernel_mux_dropped_events_total", "Events dropped because a client fell behind")
+
+
+def log_event(run_id: int, record: LogRecord) -> dict:
+    return {"type": "log", "run_id": run_id, "seq": record.seq, "ts": record.ts, "stream": record.stream, "text": record.text}
+
+
+class _RunTap:
+    """Stands in for a subscriber queue in the executor's fan-out, tagging records with the run id."""
+
+    def __init__(self, session: "MultiplexSession", run_id: int, streams: Optional[set]):
+        self.session = session
+        self.run_id = run_id
+        self.streams = streams
+
+    def put_nowait(self, frame: Optional[List[LogRecord]]):
+        if frame is None:
+            self.session._run_ended(self)
+            return
+        for record in frame:
+            if self.streams is None or record.stream in self.streams:
+                self.session.push(log_event(self.run_id, record))
+
+
+class MultiplexSession:
+    """
+    One client watching many runs (and agent-level run lifecycle events) over a single
+    connection. Live runs are fed straight from AgentExecutor's fan-out through taps; events
+    are buffered and handed to `send` as one frame per tick, so a busy run costs one write per
+    interval instead of one per line. A client that falls behind loses its oldest events and
+    is told how many were dropped.
+    """
+
+    def __init__(
+        self,
+        executor: AgentExecutor,
+        send: Callable[[dict], Any],
+        interval: float,
+        max_buffered: int,
+        load_finished: Callable[[int, Optional[set]], Any],
+    ):
+        self.executor = executor
+        self.send = send
+        self.interval = interval
+        self.max_buffered = max_buffered
+        self.load_finished = load_finished  # async (run_id, streams) -> list of events, for runs not in memory
+        self._taps: Dict[int, _RunTap] = {}
+        self._agents: Set[int] = set()
+        self._all_agents = False
+        self._buffer: deque = deque()
+        self._dropped = 0
+        self._wake = asyncio.Event()
+        self._closed = False
+        self._sender: Optional[asyncio.Task] = None
+
+    def start(self):
+        MUX_CONNECTIONS.inc()
+        self.executor.add_listener(self._on_run_event)
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        MUX_CONNECTIONS.dec()
+        self.executor.remove_listener(self._on_run_event)
+        for run_id in list(self._taps):
+            self._remove_tap(run_id)
+        if self._sender:
+            self._sender.cancel()
+            await asyncio.gather(self._sender, return_exceptions=True)
+
+    # -- buffering --
+
+    def push(self, event: dict):
+        if self._closed:
+            return
+        if len(self._buffer) >= self.max_buffered:
+            self._buffer.popleft()
+            self._dropped += 1
+            MUX_DROPPED.inc()
+        self._buffer.append(event)
+        self._wake.set()
+
+    def extend(self, events: List[dict]):
+        for event in events:
+            self.push(event)
+
+    async def _send_loop(self):
+        while True:
+            await self._wake.wait()
+            # Let the tick fill up before sending
+            await asyncio.sleep(self.interval)
+            self._wake.clear()
+            events, self._buffer = list(self._buffer), deque()
+            frame = {"type": "frame", "events": events}
+            if self._dropped:
+                frame["dropped"] = self._dropped
+                self._dropped = 0
+            MUX_FRAMES.inc()
+            await self.send(frame)
+
+    # -- subscriptions --
+
+    async def subscribe_runs(self, run_ids: List[int], streams: Optional[set] = None):
+        for run_id in run_ids:
+            if run_id in self._taps:
+                continue
+            tap = _RunTap(self, run_id, streams)
+            if self.executor.subscribe(run_id, tap):
+                self._taps[run_id] = tap
+                MUX_SUBSCRIPTIONS.inc()
+            else:
+                # Finished (or unknown): replay what is stored, then end
+                self.extend(await self.load_finished(run_id, streams))
+
+    def unsubscribe_runs(self, run_ids: List[int]):
+        for run_id in run_ids:
+            self._remove_tap(run_id)
+
+    def _remove_tap(self, run_id: int):
+        tap = self._taps.pop(run_id, None)
+        if tap is not None:
+            self.executor.unsubscribe(run_id, tap)
+            MUX_SUBSCRIPTIONS.dec()
+
+    def _run_ended(self, tap: _RunTap):
+        self.push({"type": "end", "run_id": tap.run_id, "status": self.executor.final_status(tap.run_id)})
+        if self._taps.get(tap.run_id) is tap:
+            # Called while the executor iterates its subscriber list; detach afterwards
+            asyncio.get_running_loop().call_soon(self._remove_tap, tap.run_id)
+
+    def subscribe_agents(self, agent_ids: Optional[List[int]]):
+        # None means every agent
+        if agent_ids is None:
+            self._all_agents = True
+        else:
+            self._agents.update(agent_ids)
+
+    def unsubscribe_agents(self, agent_ids: Optional[List[int]]):
+        if agent_ids is None:
+            self._all_agents = False
+            self._agents.clear()
+        else:
+            self._agents.difference_update(agent_ids)
+
+    def _on_run_event(self, event: dict):
+        if self._all_agents or event.get("agent_id") in self._agents:
+            self.push(dict(event))
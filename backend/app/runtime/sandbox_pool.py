@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+POOL_IDLE = registry.gauge("kernel_sandbox_pool_idle", "Warm sandboxes parked in the pool")
+
+# (agent_id, version_id, secrets-hash)
+PoolKey = Tuple[int, int, str]
+
+
+def secrets_fingerprint(secrets: Dict[str, str]) -> str:
+    """Stable hash of the env a sandbox was created with, so secret changes invalidate it."""
+    return hashlib.sha256(json.dumps(secrets, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class PooledSandbox:
+    key: PoolKey
+    sandbox: Any
+    setup_seconds: float  # create + dependency install cost, paid once per sandbox
+    reuse_count: int = 0
+    expiry: Optional[asyncio.TimerHandle] = None
+
+
+class SandboxPool:
+    """
+    Sticky sessions: keeps at most one idle sandbox per (agent_id, version_id, secrets-hash)
+    alive for SANDBOX_IDLE_TTL_SECONDS so sequential runs can skip creation and pip install.
+    All bookkeeping happens on the event loop; invalidate_agent is safe to call from threads.
+    """
+
+    def __init__(self):
+        self._idle: Dict[PoolKey, PooledSandbox] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SANDBOX_IDLE_TTL_SECONDS > 0
+
+    def make_key(self, agent_id: Optional[int], version_id: Optional[int], secrets: Dict[str, str]) -> Optional[PoolKey]:
+        if not self.enabled or agent_id is None or version_id is None:
+            return None
+        return (agent_id, version_id, secrets_fingerprint(secrets))
+
+    def acquire(self, key: PoolKey) -> Optional[PooledSandbox]:
+        """Takes the idle sandbox for key out of the pool, if any. The caller owns it until release()."""
+        self._loop = asyncio.get_running_loop()
+        # Anything else idle for this agent belongs to an older version or secret set
+        self._evict_agent(key[0], keep=key)
+        entry = self._idle.pop(key, None)
+        POOL_IDLE.set(len(self._idle))
+        if entry is None:
+            return None
+        if entry.expiry:
+            entry.expiry.cancel()
+            entry.expiry = None
+        entry.reuse_count += 1
+        return entry
+
+    async def release(self, entry: PooledSandbox):
+        """Returns a healthy sandbox to the pool for the idle window."""
+        self._loop = asyncio.get_running_loop()
+        ttl = settings.SANDBOX_IDLE_TTL_SECONDS
+        if not self.enabled or entry.key in self._idle:
+            # Another run already parked a sandbox for this key; one is enough
+            await self._kill(entry)
+            return
+
+        self._evict_agent(entry.key[0], keep=entry.key)
+        try:
+            # E2B kills sandboxes on their own timeout; stretch it over the idle window
+            await entry.sandbox.set_timeout(ttl + 30)
+        except Exception as e:
+            print(f"SandboxPool: could not extend sandbox timeout, discarding: {e}")
+            await self._kill(entry)
+            return
+
+        entry.expiry = self._loop.call_later(ttl, self._expire, entry)
+        self._idle[entry.key] = entry
+        POOL_IDLE.set(len(self._idle))
+
+    def invalidate_agent(self, agent_id: int):
+        """Drops idle sandboxes for an agent (code, secrets or links changed)."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._evict_agent(agent_id)
+        else:
+            self._loop.call_soon_threadsafe(self._evict_agent, agent_id)
+
+    async def close(self):
+        entries = list(self._idle.values())
+        self._idle.clear()
+        POOL_IDLE.set(0)
+        for entry in entries:
+            await self._kill(entry)
+
+    def _evict_agent(self, agent_id: int, keep: Optional[PoolKey] = None):
+        for key in [k for k in self._idle if k[0] == agent_id and k != keep]:
+            self._discard(self._idle.pop(key))
+        POOL_IDLE.set(len(self._idle))
+
+    def _expire(self, entry: PooledSandbox):
+        if self._idle.get(entry.key) is entry:
+            del self._idle[entry.key]
+            POOL_IDLE.set(len(self._idle))
+            self._discard(entry)
+
+    def _discard(self, entry: PooledSandbox):
+        if entry.expiry:
+            entry.expiry.cancel()
+            entry.expiry = None
+        asyncio.ensure_future(self._kill(entry), loop=self._loop)
+
+    async def _kill(self, entry: PooledSandbox):
+        try:
+            await entry.sandbox.kill()
+        except Exception as e:
+            print(f"SandboxPool: failed to kill sandbox: {e}")
+
+
+sandbox_pool = SandboxPool()
@@ -0,0 +1,76 @@
+import json
+import secrets
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from app.core.metrics import registry
+
+PHASE_DURATION = registry.histogram("kernel_run_phase_seconds", "Duration of run phases", ["phase"])
+
+
+def _span_id() -> str:
+    return secrets.token_hex(8)
+
+
+class RunTrace:
+    """
+    Phase spans for one run, shaped like OpenTelemetry spans (trace/span ids, unix-nano
+    timestamps, attributes, status) so they can be exported to a tracing backend as-is.
+    Every phase is a child of a root "run" span.
+    """
+
+    def __init__(self, run_id: int):
+        self.trace_id = secrets.token_hex(16)
+        self.root = self._new_span("run", None, {"run.id": run_id})
+        self.spans: List[Dict[str, Any]] = [self.root]
+
+    def _new_span(self, name: str, parent: Optional[str], attributes: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": _span_id(),
+            "parent_span_id": parent,
+            "name": name,
+            "start_time_unix_nano": time.time_ns(),
+            "end_time_unix_nano": None,
+            "attributes": attributes,
+            "status": "unset",
+        }
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = self._new_span(name, self.root["span_id"], attributes)
+        self.spans.append(span)
+        started = time.perf_counter()
+        try:
+            yield span
+            span["status"] = "ok"
+        except BaseException:
+            span["status"] = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            # Anchor to the wall-clock start but use the monotonic clock for the duration
+            span["end_time_unix_nano"] = span["start_time_unix_nano"] + int(elapsed * 1e9)
+            PHASE_DURATION.labels(name).observe(elapsed)
+
+    def finish(self, status: str):
+        self.root["end_time_unix_nano"] = time.time_ns()
+        self.root["status"] = "ok" if status == "success" else "error"
+        self.root["attributes"]["run.status"] = status
+
+    def to_json(self) -> str:
+        return json.dumps(self.spans)
+
+
+def phase_durations(trace_json: Optional[str]) -> Dict[str, float]:
+    """Seconds spent per phase name in a stored trace (repeated phases are summed)."""
+    if not trace_json:
+        return {}
+    durations: Dict[str, float] = {}
+    for span in json.loads(trace_json):
+        if span.get("end_time_unix_nano") is None:
+            continue
+        seconds = (span["end_time_unix_nano"] - span["start_time_unix_nano"]) / 1e9
+        durations[span["name"]] = durations.get(span["name"], 0.0) + seconds
+    return durations
@@ -1,14 +1,36 @@
+import json
+import statistics
 from typing import List, Optional
 from datetime import datetime
 from sqlmodel import Session, select
-from app.models import Agent, AgentVersion, Run
+from app.models import Agent, AgentVersion, Run, RunRead
+from app.runtime.sandbox_pool import sandbox_pool
+from app.runtime.logs import run_logs_text
+from app.runtime.tracing import phase_durations
+from app.services.artifact_service import RESERVED_PREFIX
+from app.services.dashboard_service import dashboard_service
+
+# Plain columns behind the list endpoints' row-tuple fast path (see app.api.responses)
+AGENT_LIST_COLUMNS = [getattr(Agent, name) for name, field in Agent.model_fields.items() if not field.exclude]
+RUN_LIST_COLUMNS = [getattr(Run, name) for name in RunRead.model_fields if name != "logs"]
+RUN_LOG_COLUMNS = [Run.logs, Run.log_data, Run.log_codec, Run.log_dict_id]
+
+def validate_agent_name(name: str):
+    """Agent names are artifact directory names; the artifact store reserves a prefix for its own."""
+    if name.startswith(RESERVED_PREFIX):
+        raise ValueError(f"Agent names starting with '{RESERVED_PREFIX}' are reserved")
 
 class AgentService:
     def list_agents(self, session: Session) -> List[Agent]:
-        return session.exec(select(Agent)).all()
+        return session.exec(select(Agent).where(Agent.status != "deleting")).all()
+
+    def list_agents_query(self):
+        return select(*AGENT_LIST_COLUMNS).where(Agent.status != "deleting")
 
     def get_agent(self, session: Session, agent_id: int) -> Optional[Agent]:
-        return session.get(Agent, agent_id)
+        agent = session.get(Agent, agent_id)
+        # Agents being purged in the background are already gone as far as the API is concerned
+        return agent if agent and agent.status != "deleting" else None
 
     def get_agent_code(self, session: Session, agent_id: int) -> Optional[str]:
         agent = self.get_agent(session, agent_id)
@@ -20,6 +42,13 @@ class AgentService:
     def list_agent_versions(self, session: Session, agent_id: int) -> List[AgentVersion]:
         return session.exec(select(AgentVersion).where(AgentVersion.agent_id == agent_id).order_by(AgentVersion.created_at.desc())).all()
 
+    def list_agent_versions_query(self, agent_id: int):
+        return (
+            select(AgentVersion.id, AgentVersion.created_at, AgentVersion.parent_version_id, AgentVersion.code)
+            .where(AgentVersion.agent_id == agent_id)
+            .order_by(AgentVersion.created_at.desc())
+        )
+
     def update_agent_code(self, session: Session, agent_id: int, new_code: str) -> Optional[AgentVersion]:
         agent = self.get_agent(session, agent_id)
         if not agent:
@@ -48,10 +77,13 @@ class AgentService:
         session.add(agent)
         session.commit()
         session.refresh(agent)
+        sandbox_pool.invalidate_agent(agent.id)
+        dashboard_service.invalidate()
         
         return new_version
 
     def create_agent(self, session: Session, name: str, description: str = None) -> Agent:
+        validate_agent_name(name)
         agent = Agent(name=name, description=description)
         session.add(agent)
         session.commit()
@@ -87,20 +119,67 @@ if __name__ == "__main__":
         session.add(agent)
         session.commit()
         session.refresh(agent)
+        dashboard_service.invalidate()
         return agent
 
     def delete_agent(self, session: Session, agent_id: int) -> bool:
-        agent = session.get(Agent, agent_id)
+        """Marks the agent for deletion; retention_service.purge_agent removes its data in batches."""
+        agent = self.get_agent(session, agent_id)
         if not agent:
             return False
-        session.delete(agent)
+        agent.status = "deleting"
+        session.add(agent)
         session.commit()
+        sandbox_pool.invalidate_agent(agent_id)
+        dashboard_service.invalidate()
         return True
 
+    def _update_fields(self, session: Session, agent_id: int, fields: dict) -> Optional[Agent]:
+        agent = self.get_agent(session, agent_id)
+        if not agent:
+            return None
+        for field, value in fields.items():
+            setattr(agent, field, value)
+        agent.updated_at = datetime.utcnow()
+        session.add(agent)
+        session.commit()
+        session.refresh(agent)
+        dashboard_service.invalidate()
+        return agent
+
+    def update_limits(self, session: Session, agent_id: int, limits: dict) -> Optional[Agent]:
+        """Sets timeout_seconds / max_log_bytes / max_log_lines; None restores the server default."""
+        return self._update_fields(session, agent_id, limits)
+
+    def update_trigger_policy(self, session: Session, agent_id: int, policy: dict) -> Optional[Agent]:
+        """Sets concurrency_policy / debounce_seconds; None restores the default."""
+        return self._update_fields(session, agent_id, policy)
+
+    def update_cache(self, session: Session, agent_id: int, ttl_seconds: Optional[int]) -> Optional[Agent]:
+        return self._update_fields(session, agent_id, {"cache_ttl_seconds": ttl_seconds})
+
+    def update_retention(self, session: Session, agent_id: int, keep_last: Optional[int], max_age_days: Optional[int]) -> Optional[Agent]:
+        agent = self.get_agent(session, agent_id)
+        if not agent:
+            return None
+        return self._update_fields(session, agent_id, {"retention_keep_last": keep_last, "retention_max_age_days": max_age_days})
+
     def list_runs(self, session: Session, agent_id: int) -> List[Run]:
         return session.exec(select(Run).where(Run.agent_id == agent_id).order_by(Run.start_time.desc())).all()
 
-    def create_run(self, session: Session, agent_id: int, trigger_type: str = "manual") -> Run:
+    def list_runs_query(self, agent_id: int, with_logs: bool = True):
+        """RunRead columns, plus the stored log columns when the caller renders logs."""
+        columns = RUN_LIST_COLUMNS + (RUN_LOG_COLUMNS if with_logs else [])
+        return select(*columns).where(Run.agent_id == agent_id).order_by(Run.start_time.desc())
+
+    def create_run(
+        self,
+        session: Session,
+        agent_id: int,
+        trigger_type: str = "manual",
+        idempotency_key: Optional[str] = None,
+        input_files: Optional[List[str]] = None,
+    ) -> Run:
         agent = self.get_agent(session, agent_id)
         if not agent:
             raise ValueError("Agent not found")
@@ -109,6 +188,8 @@ if __name__ == "__main__":
             agent_id=agent.id,
             version_id=agent.current_version_id,
             trigger_type=trigger_type,
+            idempotency_key=idempotency_key,
+            input_files=json.dumps(input_files) if input_files else None,
             status="queued"
         )
         session.add(run)
@@ -116,9 +197,48 @@ if __name__ == "__main__":
         session.refresh(run)
         return run
 
+    def get_latest_run(self, session: Session, agent_id: int) -> Optional[Run]:
+        return session.exec(select(Run).where(Run.agent_id == agent_id).order_by(Run.start_time.desc())).first()
+
     def get_latest_run_logs(self, session: Session, agent_id: int) -> Optional[str]:
-        run = session.exec(select(Run).where(Run.agent_id == agent_id).order_by(Run.start_time.desc())).first()
-        return run.logs if run else None
+        run = self.get_latest_run(session, agent_id)
+        return run_logs_text(run) if run else None
+
+    def get_phase_breakdown(self, session: Session, agent_id: int, limit: int = 50) -> dict:
+        """Per-run phase timings (newest first) plus per-phase stats over those runs."""
+        rows = session.exec(
+            select(Run.id, Run.start_time, Run.status, Run.version_id, Run.sandbox_reused, Run.trace)
+            .where(Run.agent_id == agent_id, Run.trace.is_not(None))
+            .order_by(Run.id.desc())
+            .limit(limit)
+        ).all()
+
+        runs = []
+        samples: dict = {}
+        for run_id, start_time, status, version_id, reused, trace in rows:
+            phases = phase_durations(trace)
+            for name, seconds in phases.items():
+                samples.setdefault(name, []).append(seconds)
+            runs.append({
+                "run_id": run_id,
+                "start_time": start_time,
+                "status": status,
+                "version_id": version_id,
+                "sandbox_reused": bool(reused),
+                "phases": {name: round(seconds, 4) for name, seconds in phases.items()},
+            })
+
+        summary = {}
+        for name, values in samples.items():
+            ordered = sorted(values)
+            summary[name] = {
+                "count": len(values),
+                "mean": round(statistics.fmean(values), 4),
+                "p50": round(ordered[len(ordered) // 2], 4),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+                "max": round(ordered[-1], 4),
+            }
+        return {"agent_id": agent_id, "runs": runs, "summary": summary}
 
 
 agent_service = AgentService()
@@ -1,20 +1,60 @@
-from openai import AsyncOpenAI
-import httpx
 import os
+import time
+from app.core.metrics import registry
+from app.services.code_patch import PATCH_FORMAT, PatchError, patch_code
+
+AI_REQUESTS = registry.counter("kernel_ai_requests_total", "Streaming completion requests", ["op"])
+AI_CHUNKS = registry.counter("kernel_ai_stream_chunks_total", "Streamed completion chunks (roughly one token each)", ["op"])
+AI_TOKENS = registry.counter("kernel_ai_tokens_total", "Tokens reported in usage, when the server sends it", ["op", "kind"])
+AI_FIRST_CHUNK = registry.histogram("kernel_ai_time_to_first_chunk_seconds", "Latency until the first streamed chunk", ["op"])
+AI_DURATION = registry.histogram("kernel_ai_request_seconds", "Total streaming completion duration", ["op"])
+AI_PATCHES = registry.counter("kernel_ai_patches_total", "Model patches by outcome (applied, failed)", ["op", "outcome"])
 
 class AIService:
     def __init__(self):
-        # Default to local Ollama if no API key/base provided
-        self.client = AsyncOpenAI(
-            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"),
-            api_key=os.getenv("OLLAMA_API_KEY", "ollama"),  # required but ignored by ollama
-        )
+        self._client = None
         self.model = os.getenv("OLLAMA_MODEL", "gpt-4o") # User aliased model
         self.ollama_base = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
+    @property
+    def client(self):
+        # The openai SDK is slow to import, so only load it once a request needs it
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Default to local Ollama if no API key/base provided
+            self._client = AsyncOpenAI(
+                base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"),
+                api_key=os.getenv("OLLAMA_API_KEY", "ollama"),  # required but ignored by ollama
+            )
+        return self._client
+
+    async def _instrumented(self, op: str, **kwargs):
+        """Creates a streaming completion and yields its chunks while recording throughput metrics."""
+        AI_REQUESTS.labels(op).inc()
+        chunks = AI_CHUNKS.labels(op)
+        started = time.perf_counter()
+        first = True
+        try:
+            stream = await self.client.chat.completions.create(stream=True, **kwargs)
+            async for chunk in stream:
+                if first:
+                    AI_FIRST_CHUNK.labels(op).observe(time.perf_counter() - started)
+                    first = False
+                chunks.inc()
+                usage = getattr(chunk, "usage", None)
+                if usage:
+                    AI_TOKENS.labels(op, "prompt").inc(usage.prompt_tokens or 0)
+                    AI_TOKENS.labels(op, "completion").inc(usage.completion_tokens or 0)
+                if not chunk.choices:
+                    continue
+                yield chunk
+        finally:
+            AI_DURATION.labels(op).observe(time.perf_counter() - started)
+
     async def list_models(self):
         # Fetch from Ollama
         try:
+            import httpx
             async with httpx.AsyncClient() as client:
                 res = await client.get(f"{self.ollama_base}/api/tags")
                 if res.status_code == 200:
@@ -63,9 +103,20 @@ class AIService:
         # Fallback to any model
         return self._available_models[0]
 
-    async def refine_code(self, code: str, instruction: str, model: str = None):
+    async def refine_code(self, code: str, instruction: str, model: str = None, mode: str = "patch"):
+        """
+        Streams the refined code. In "patch" mode the model only writes SEARCH/REPLACE blocks,
+        so its output scales with the edit rather than the file; the patched code is sent once
+        it applies and compiles, and a full rewrite is streamed only if it doesn't.
+        """
         resolved_model = await self._resolve_model(model)
-        
+
+        if mode == "patch" and code.strip():
+            patched = await self._refine_patch(code, instruction, resolved_model)
+            if patched is not None:
+                yield patched
+                return
+
         prompt = f"""You are an expert Python coding assistant.
 User Instruction: {instruction}
 
@@ -77,16 +128,46 @@ Current Code:
 Please rewrite the code to satisfy the instruction. 
 IMPORTANT: Return ONLY the python code. No markdown formatting (```python), no explanations. Just the raw code.
 """
-        stream = await self.client.chat.completions.create(
+        stream = self._instrumented(
+            "refine",
             model=resolved_model,
             messages=[{"role": "user", "content": prompt}],
-            stream=True,
         )
 
         async for chunk in stream:
             if chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
 
+    async def _refine_patch(self, code: str, instruction: str, model: str):
+        prompt = f"""You are an expert Python coding assistant.
+User Instruction: {instruction}
+
+Current Code:
+```python
+{code}
+```
+
+Change the code to satisfy the instruction by replying ONLY with edit blocks in this format:
+
+{PATCH_FORMAT}
+
+Each SEARCH section must copy a few lines of the current code exactly, including indentation,
+and match only one place. Use one block per change. To add code, SEARCH for a nearby line and
+repeat it in REPLACE together with the new lines. No explanations.
+"""
+        parts = []
+        async for chunk in self._instrumented("refine_patch", model=model, messages=[{"role": "user", "content": prompt}]):
+            if chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+        try:
+            patched = patch_code(code, "".join(parts))
+        except PatchError as e:
+            print(f"Refine patch failed, falling back to a full rewrite: {e}")
+            AI_PATCHES.labels("refine", "failed").inc()
+            return None
+        AI_PATCHES.labels("refine", "applied").inc()
+        return patched
+
     async def chat(self, messages: list, model: str = None):
         from app.services.agent_service import agent_service
         from app.core.database import engine
@@ -115,7 +196,7 @@ IMPORTANT: Return ONLY the python code. No markdown formatting (```python), no e
                 "type": "function",
                 "function": {
                     "name": "update_agent_code",
-                    "description": "Update the python code for a specific agent",
+                    "description": "Replace the whole python code of an agent. For changes to existing code prefer patch_agent_code",
                     "parameters": {
                         "type": "object",
                         "properties": {
@@ -126,6 +207,24 @@ IMPORTANT: Return ONLY the python code. No markdown formatting (```python), no e
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "patch_agent_code",
+                    "description": "Edit an agent's current code with SEARCH/REPLACE blocks instead of resending the whole file",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "agent_id": {"type": "integer", "description": "ID of the agent"},
+                            "patch": {
+                                "type": "string",
+                                "description": "One or more blocks of the form:\n" + PATCH_FORMAT + "\nSEARCH must copy current lines exactly and match once",
+                            }
+                        },
+                        "required": ["agent_id", "patch"]
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -172,11 +271,11 @@ IMPORTANT: Return ONLY the python code. No markdown formatting (```python), no e
 
         while True:
             # Call Model
-            stream = await self.client.chat.completions.create(
+            stream = self._instrumented(
+                "chat",
                 model=resolved_model,
                 messages=history,
                 tools=tools,
-                stream=True,
             )
 
             tool_calls = []
@@ -237,6 +336,21 @@ IMPORTANT: Return ONLY the python code. No markdown formatting (```python), no e
                         elif func_name == "update_agent_code":
                             agent_service.update_agent_code(session, args["agent_id"], args["code"])
                             result = {"status": "updated"}
+                        elif func_name == "patch_agent_code":
+                            code = agent_service.get_agent_code(session, args["agent_id"])
+                            if code is None:
+                                result = {"error": "Agent not found"}
+                            else:
+                                try:
+                                    patched = patch_code(code, args["patch"])
+                                except PatchError as e:
+                                    # The model can retry with a corrected patch or fall back to update_agent_code
+                                    AI_PATCHES.labels("chat", "failed").inc()
+                                    result = {"error": f"Patch not applied: {e}"}
+                                else:
+                                    agent_service.update_agent_code(session, args["agent_id"], patched)
+                                    AI_PATCHES.labels("chat", "applied").inc()
+                                    result = {"status": "updated", "lines": len(patched.splitlines())}
                         elif func_name == "delete_agent":
                             ok = agent_service.delete_agent(session, args["agent_id"])
                             result = {"status": "deleted" if ok else "not found"}
@@ -1,14 +1,128 @@
+import hashlib
 import os
+import re
 import shutil
-from typing import List
+import time
+import uuid
+from typing import AsyncIterator, List, Optional
+import aiofiles
 from app.core.config import settings
+from app.core.metrics import registry
+
+ARTIFACTS_SAVED = registry.counter("kernel_artifacts_saved_total", "Artifacts written to the artifact store")
+ARTIFACT_BYTES = registry.counter("kernel_artifact_bytes_total", "Bytes written to the artifact store")
+ARTIFACT_SAVE = registry.histogram("kernel_artifact_save_seconds", "Time to write one artifact to disk")
+INBOX_UPLOADS = registry.counter("kernel_inbox_uploads_total", "Files uploaded to the input inbox")
+INBOX_BYTES = registry.counter("kernel_inbox_upload_bytes_total", "Bytes uploaded to the input inbox")
+
+_INBOX_ID = re.compile(r"^[0-9a-f]{32}$")
+# Run artifacts live under <agent name>/, so store-level directories start with this, which
+# agent names can't
+RESERVED_PREFIX = "_"
+INBOX_DIR_NAME = RESERVED_PREFIX + "inbox"
+ARCHIVE_DIR_NAME = RESERVED_PREFIX + "archive"
+_DIGEST_FILE = ".sha256"  # next to an upload; dotfiles are never taken for the upload itself
+
+class InboxFileTooLarge(ValueError):
+    """Raised while streaming an upload past INBOX_MAX_UPLOAD_BYTES."""
 
 class ArtifactService:
     def __init__(self):
+        # Directories are created on first write rather than at import time
         self.base_dir = settings.ARTIFACTS_DIR
-        os.makedirs(self.base_dir, exist_ok=True)
-        # Ensure subdirectories
-        os.makedirs(os.path.join(self.base_dir, "inbox"), exist_ok=True)
+
+    @property
+    def inbox_dir(self) -> str:
+        return os.path.join(self.base_dir, INBOX_DIR_NAME)
+
+    def get_inbox_dir(self) -> str:
+        os.makedirs(self.inbox_dir, exist_ok=True)
+        return self.inbox_dir
+
+    async def save_inbox_stream(self, filename: str, chunks: AsyncIterator[bytes]) -> dict:
+        """
+        Writes an upload to _inbox/<id>/<filename> chunk by chunk, so memory stays flat whatever
+        the file size. The file only appears under its name once complete.
+        """
+        name = os.path.basename(filename or "")
+        if name in ("", ".", "..") or name.startswith("."):
+            raise ValueError("Invalid file name")
+        file_id = uuid.uuid4().hex
+        entry_dir = os.path.join(self.get_inbox_dir(), file_id)
+        os.makedirs(entry_dir)
+        part = os.path.join(entry_dir, f".{name}.part")
+        size = 0
+        digest = hashlib.sha256()
+        try:
+            async with aiofiles.open(part, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if settings.INBOX_MAX_UPLOAD_BYTES and size > settings.INBOX_MAX_UPLOAD_BYTES:
+                        raise InboxFileTooLarge(f"File exceeds {settings.INBOX_MAX_UPLOAD_BYTES} bytes")
+                    digest.update(chunk)
+                    await f.write(chunk)
+            with open(os.path.join(entry_dir, _DIGEST_FILE), "w") as f:
+                f.write(digest.hexdigest())
+            os.replace(part, os.path.join(entry_dir, name))
+        except BaseException:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            raise
+        INBOX_UPLOADS.inc()
+        INBOX_BYTES.inc(size)
+        return {"id": file_id, "name": name, "size": size, "sha256": digest.hexdigest()}
+
+    def inbox_file_path(self, file_id: str) -> Optional[str]:
+        if not _INBOX_ID.match(file_id or ""):
+            return None
+        entry_dir = os.path.join(self.inbox_dir, file_id)
+        try:
+            names = [n for n in os.listdir(entry_dir) if not n.startswith(".")]
+        except OSError:
+            return None
+        return os.path.join(entry_dir, names[0]) if names else None
+
+    def inbox_file_digest(self, path: str) -> Optional[str]:
+        """The sha256 recorded while an inbox file was uploaded; None for other files."""
+        if os.path.dirname(os.path.dirname(path)) != self.inbox_dir:
+            return None
+        try:
+            with open(os.path.join(os.path.dirname(path), _DIGEST_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def list_inbox(self) -> List[dict]:
+        inbox = self.inbox_dir
+        files = []
+        for file_id in sorted(os.listdir(inbox)) if os.path.isdir(inbox) else []:
+            path = self.inbox_file_path(file_id)
+            if path:
+                stat = os.stat(path)
+                files.append({"id": file_id, "name": os.path.basename(path), "size": stat.st_size, "uploaded_at": stat.st_mtime})
+        return files
+
+    def delete_inbox_file(self, file_id: str) -> bool:
+        if self.inbox_file_path(file_id) is None:
+            return False
+        shutil.rmtree(os.path.join(self.inbox_dir, file_id), ignore_errors=True)
+        return True
+
+    def purge_inbox(self, max_age_seconds: int) -> int:
+        """Maintenance: removes uploads (and abandoned partial uploads) older than max_age_seconds."""
+        inbox = self.inbox_dir
+        if not os.path.isdir(inbox):
+            return 0
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for file_id in os.listdir(inbox):
+            entry_dir = os.path.join(inbox, file_id)
+            try:
+                if os.stat(entry_dir).st_mtime < cutoff:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
 
     def get_run_dir(self, agent_name: str, run_id: int) -> str:
         """Creates and returns the directory for a specific run."""
@@ -16,15 +130,52 @@ class ArtifactService:
         os.makedirs(path, exist_ok=True)
         return path
 
+    def run_dir_path(self, agent_name: str, run_id: int) -> str:
+        return os.path.join(self.base_dir, agent_name, str(run_id))
+
+    def remove_run_dir(self, agent_name: str, run_id: int):
+        shutil.rmtree(self.run_dir_path(agent_name, run_id), ignore_errors=True)
+        try:
+            # Drop the agent directory once its last run is gone
+            os.rmdir(os.path.join(self.base_dir, agent_name))
+        except OSError:
+            pass
+
+    def archive_path(self, agent_id: int, run_id: int) -> str:
+        path = os.path.join(self.base_dir, ARCHIVE_DIR_NAME, str(agent_id))
+        os.makedirs(path, exist_ok=True)
+        return os.path.join(path, f"{run_id}.tar.gz")
+
     def save_artifact(self, agent_name: str, run_id: int, filename: str, content: bytes):
         run_dir = self.get_run_dir(agent_name, run_id)
         # Security check to prevent .. traversal
         safe_filename = os.path.basename(filename)
         path = os.path.join(run_dir, safe_filename)
-        with open(path, "wb") as f:
-            f.write(content)
+        with ARTIFACT_SAVE.time():
+            with open(path, "wb") as f:
+                f.write(content)
+        ARTIFACTS_SAVED.inc()
+        ARTIFACT_BYTES.inc(len(content))
         return path
 
+    def link_run_artifacts(self, agent_name: str, source_run_id: int, run_id: int) -> List[str]:
+        """Hard-links one run's artifacts into another's directory (copies across filesystems)."""
+        source = self.run_dir_path(agent_name, source_run_id)
+        if not os.path.isdir(source):
+            return []
+        target = self.get_run_dir(agent_name, run_id)
+        names = []
+        for name in os.listdir(source):
+            src = os.path.join(source, name)
+            if not os.path.isfile(src):
+                continue
+            try:
+                os.link(src, os.path.join(target, name))
+            except OSError:
+                shutil.copy2(src, os.path.join(target, name))
+            names.append(name)
+        return names
+
     def list_artifacts(self, agent_name: str, run_id: int) -> List[str]:
         run_dir = self.get_run_dir(agent_name, run_id)
         if not os.path.exists(run_dir):
@@ -0,0 +1,85 @@
+import re
+from typing import List, Tuple
+
+# One edit: the exact lines to find, then what replaces them
+_BLOCK = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$",
+    re.MULTILINE | re.DOTALL,
+)
+
+PATCH_FORMAT = """<<<<<<< SEARCH
+lines copied exactly from the current code
+=======
+the lines that replace them
+>>>>>>> REPLACE"""
+
+
+class PatchError(ValueError):
+    pass
+
+
+def parse_patch(text: str) -> List[Tuple[str, str]]:
+    """SEARCH/REPLACE blocks in model output as (search, replace) pairs; text around them is ignored."""
+    blocks = [(search, replace) for search, replace in _BLOCK.findall(text)]
+    if not blocks:
+        raise PatchError("No SEARCH/REPLACE blocks found")
+    return blocks
+
+
+def _find_lines(code: str, search: str, loose: bool = False) -> List[Tuple[int, int]]:
+    """
+    Character spans of whole lines of `code` matching the lines of `search`, so a SEARCH never
+    matches inside a longer line. `loose` ignores trailing whitespace on both sides.
+    """
+    norm = str.rstrip if loose else (lambda line: line.rstrip("\r\n"))
+    lines = code.splitlines(keepends=True)
+    wanted = [norm(line) for line in search.splitlines()]
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    spans = []
+    for start in range(len(lines) - len(wanted) + 1):
+        if all(norm(lines[start + i]) == wanted[i] for i in range(len(wanted))):
+            spans.append((offsets[start], offsets[start + len(wanted)]))
+    return spans
+
+
+def apply_patch(code: str, blocks: List[Tuple[str, str]]) -> str:
+    """
+    Applies blocks in order. Each SEARCH must match whole lines exactly once, verbatim or else
+    with trailing whitespace ignored; anything else raises PatchError naming the block.
+    """
+    for number, (search, replace) in enumerate(blocks, 1):
+        if not search.strip():
+            raise PatchError(f"Block {number}: empty SEARCH")
+        spans = _find_lines(code, search)
+        if len(spans) > 1:
+            raise PatchError(f"Block {number}: SEARCH matches {len(spans)} places; include more context")
+        if not spans:
+            spans = _find_lines(code, search, loose=True)
+        if len(spans) != 1:
+            reason = "does not match the current code" if not spans else f"matches {len(spans)} places; include more context"
+            raise PatchError(f"Block {number}: SEARCH {reason}")
+        start, end = spans[0]
+        # Whole lines are replaced, so keep the region's final line ending
+        if replace and code[start:end].endswith("\n") and not replace.endswith("\n"):
+            replace += "\n"
+        code = code[:start] + replace + code[end:]
+    return code
+
+
+def patch_code(code: str, patch: str) -> str:
+    """
+    Parses, applies and validates a patch. If the current code compiles, the result must too,
+    so a patch that leaves broken syntax is rejected rather than saved.
+    """
+    patched = apply_patch(code, parse_patch(patch))
+    try:
+        compile(code, "<agent>", "exec")
+    except SyntaxError:
+        return patched
+    try:
+        compile(patched, "<agent>", "exec")
+    except SyntaxError as e:
+        raise PatchError(f"Patched code does not compile: {e.msg} (line {e.lineno})")
+    return patched
@@ -0,0 +1,93 @@
+import threading
+import time
+from typing import List, Optional
+from sqlalchemy import case, func
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models import Agent, Run
+
+DASHBOARD_CACHE = registry.counter("kernel_dashboard_cache_lookups_total", "Dashboard requests by cache result", ["result"])
+
+FAILED_STATUSES = ("error", "timeout", "limit_exceeded")
+ACTIVE_STATUSES = ("queued", "running", "interrupted")
+
+
+class DashboardService:
+    """
+    Every agent with its latest run, run counts and last success, from one query.
+    The result is cached until an executor lifecycle event or an agent change invalidates it;
+    DASHBOARD_CACHE_TTL_SECONDS bounds staleness from writes that bypass both (startup
+    recovery, cancelling a queued run).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cached: Optional[List[dict]] = None
+        self._expires = 0.0
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._cached = None
+            self._generation += 1
+
+    def on_run_event(self, event: dict):
+        # Executor listener: run_started / run_running / run_finished
+        self.invalidate()
+
+    def get(self, session: Session) -> List[dict]:
+        ttl = settings.DASHBOARD_CACHE_TTL_SECONDS
+        with self._lock:
+            if ttl > 0 and self._cached is not None and self._expires > time.monotonic():
+                DASHBOARD_CACHE.labels("hit").inc()
+                return self._cached
+            generation = self._generation
+        DASHBOARD_CACHE.labels("miss").inc()
+        rows = self._query(session)
+        with self._lock:
+            # Don't store a result an invalidation raced with
+            if ttl > 0 and generation == self._generation:
+                self._cached = rows
+                self._expires = time.monotonic() + ttl
+        return rows
+
+    def _query(self, session: Session) -> List[dict]:
+        # Per-agent aggregates in one pass over the covering index, then the latest run by
+        # primary key. SQLite's row_number() window would sort every run instead.
+        counts = (
+            select(
+                Run.agent_id,
+                func.max(Run.id).label("latest_id"),
+                func.count().label("total"),
+                func.sum(case((Run.status == "success", 1), else_=0)).label("succeeded"),
+                func.sum(case((Run.status.in_(FAILED_STATUSES), 1), else_=0)).label("failed"),
+                func.sum(case((Run.status.in_(ACTIVE_STATUSES), 1), else_=0)).label("active"),
+                func.max(case((Run.status == "success", Run.end_time))).label("last_success_at"),
+            )
+            .group_by(Run.agent_id)
+            .subquery()
+        )
+        latest = aliased(Run)
+        rows = session.exec(
+            select(Agent, latest.id, latest.status, latest.trigger_type, latest.start_time, latest.end_time,
+                   counts.c.total, counts.c.succeeded, counts.c.failed, counts.c.active, counts.c.last_success_at)
+            .outerjoin(counts, counts.c.agent_id == Agent.id)
+            .outerjoin(latest, latest.id == counts.c.latest_id)
+            .where(Agent.status != "deleting")
+            .order_by(Agent.id)
+        ).all()
+
+        dashboard = []
+        for agent, run_id, status, trigger_type, start_time, end_time, total, succeeded, failed, active, last_success_at in rows:
+            entry = agent.model_dump()
+            entry["latest_run"] = None if run_id is None else {
+                "id": run_id, "status": status, "trigger_type": trigger_type, "start_time": start_time, "end_time": end_time,
+            }
+            entry["run_counts"] = {"total": total or 0, "success": succeeded or 0, "failed": failed or 0, "active": active or 0}
+            entry["last_success_at"] = last_success_at
+            dashboard.append(entry)
+        return dashboard
+
+dashboard_service = DashboardService()
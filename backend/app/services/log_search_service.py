@@ -0,0 +1,160 @@
+import html
+import re
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+from sqlalchemy import text
+from sqlmodel import Session, func, select
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import registry
+from app.models import Run
+from app.runtime.logs import LogRecord, run_records
+
+LINES_INDEXED = registry.counter("kernel_log_lines_indexed_total", "Log lines added to the full-text index")
+SEARCH_LATENCY = registry.histogram("kernel_log_search_seconds", "Full-text log search latency")
+
+_INSERT = text("INSERT INTO log_fts (rowid, text, agent_id, stream, ts) VALUES (:rowid, :text, :agent_id, :stream, :ts)")
+_DELETE_RANGE = text("DELETE FROM log_fts WHERE rowid BETWEEN :lo AND :hi")
+_TOKEN = re.compile(r'\S+')
+# FTS brackets matches with these; the log text is HTML-escaped before they become <mark> tags
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+
+def _highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def _rowid(run_id: int, seq: int) -> int:
+    return (run_id << 32) | seq
+
+
+def _run_range(run_id: int):
+    return _rowid(run_id, 0), _rowid(run_id, 0xFFFFFFFF)
+
+
+def match_expression(query: str) -> str:
+    """
+    Plain words to an FTS5 expression: every word must appear, punctuation is ignored and a
+    trailing * keeps prefix matching, so pasted traceback lines work without FTS syntax.
+    """
+    terms = []
+    for token in _TOKEN.findall(query):
+        prefix = token.endswith("*")
+        word = token.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Run times are stored as naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class LogSearchService:
+    def index_records(self, session: Session, run_id: int, agent_id: int, records: Iterable[LogRecord]):
+        """Adds lines to the index in the caller's transaction, so index and logs commit together."""
+        if not settings.LOG_SEARCH_ENABLED:
+            return
+        rows = [
+            {"rowid": _rowid(run_id, r.seq), "text": r.text, "agent_id": agent_id, "stream": r.stream, "ts": r.ts}
+            for r in records if r.text
+        ]
+        if rows:
+            session.execute(_INSERT, rows)
+            LINES_INDEXED.inc(len(rows))
+
+    def remove_runs(self, session: Session, run_ids: Iterable[int]):
+        for run_id in run_ids:
+            lo, hi = _run_range(run_id)
+            session.execute(_DELETE_RANGE, {"lo": lo, "hi": hi})
+
+    def index_run(self, session: Session, run: Run):
+        """(Re)indexes a whole stored run; used for runs recorded before the index existed."""
+        self.remove_runs(session, [run.id])
+        self.index_records(session, run.id, run.agent_id, run_records(run))
+        run.log_indexed = True
+        session.add(run)
+
+    def backfill(self, batch_size: int = 20) -> int:
+        if not settings.LOG_SEARCH_ENABLED:
+            return 0
+        with Session(engine) as session:
+            runs = session.exec(
+                select(Run)
+                .where(Run.status.not_in(("queued", "running")))
+                .where((Run.log_indexed.is_(None)) | (Run.log_indexed == False))  # noqa: E712
+                .order_by(Run.id.desc())
+                .limit(batch_size)
+            ).all()
+            for run in runs:
+                self.index_run(session, run)
+            session.commit()
+        return len(runs)
+
+    def search(
+        self,
+        session: Session,
+        query: str,
+        agent_id: Optional[int] = None,
+        run_id: Optional[int] = None,
+        streams: Optional[set] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        before: Optional[int] = None,
+        limit: int = 50,
+    ) -> dict:
+        """
+        Newest matches first. Run and time filters become rowid bounds (a run is a contiguous
+        rowid range), so FTS5 only walks the relevant slice of the posting lists.
+        """
+        since, until = _naive_utc(since), _naive_utc(until)
+        expression = match_expression(query)
+        if not expression:
+            return {"results": [], "next_cursor": None}
+
+        lo, hi = 0, _rowid(2**31 - 1, 0xFFFFFFFF)
+        if run_id is not None:
+            lo, hi = _run_range(run_id)
+        if since is not None:
+            first = session.exec(select(func.min(Run.id)).where((Run.end_time.is_(None)) | (Run.end_time >= since))).one()
+            lo = max(lo, _rowid(first, 0)) if first is not None else hi + 1
+        if until is not None:
+            last = session.exec(select(func.max(Run.id)).where(Run.start_time <= until)).one()
+            hi = min(hi, _run_range(last)[1]) if last is not None else -1
+        if before is not None:
+            hi = min(hi, before - 1)
+
+        clauses = ["log_fts MATCH :q", "rowid BETWEEN :lo AND :hi"]
+        params = {"q": expression, "lo": lo, "hi": hi, "limit": limit, "mark_start": _MARK_START, "mark_end": _MARK_END}
+        if agent_id is not None:
+            clauses.append("agent_id = :agent_id")
+            params["agent_id"] = agent_id
+        if streams:
+            names = sorted(streams)
+            clauses.append("stream IN (" + ", ".join(f":s{i}" for i in range(len(names))) + ")")
+            params.update({f"s{i}": name for i, name in enumerate(names)})
+        if since is not None:
+            clauses.append("ts >= :since")
+            params["since"] = (since - datetime(1970, 1, 1)).total_seconds()
+        if until is not None:
+            clauses.append("ts <= :until")
+            params["until"] = (until - datetime(1970, 1, 1)).total_seconds()
+
+        sql = text(
+            "SELECT rowid, agent_id, stream, ts, snippet(log_fts, 0, :mark_start, :mark_end, '…', 16) "
+            f"FROM log_fts WHERE {' AND '.join(clauses)} ORDER BY rowid DESC LIMIT :limit"
+        )
+        with SEARCH_LATENCY.time():
+            rows = session.execute(sql, params).all()
+
+        results: List[dict] = [
+            {"run_id": rowid >> 32, "seq": rowid & 0xFFFFFFFF, "agent_id": agent, "stream": stream, "ts": ts, "snippet": _highlight(snippet)}
+            for rowid, agent, stream, ts, snippet in rows
+        ]
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return {"results": results, "next_cursor": next_cursor}
+
+log_search_service = LogSearchService()
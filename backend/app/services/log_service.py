@@ -0,0 +1,129 @@
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import registry
+from app.models import LogDictionary, Run
+from app.runtime import log_codec
+from app.runtime.logs import encode_records, encoded_chunks, parse_legacy
+
+LOG_BYTES_COMPACTED = registry.counter("kernel_log_compaction_bytes_total", "Run log bytes before/after compaction", ["stage"])
+RUNS_COMPACTED = registry.counter("kernel_log_compaction_runs_total", "Runs whose logs were compressed at rest")
+
+class LogService:
+    """
+    Compression of finished run logs. Logs are stored as independent blocks so readers inflate
+    one block at a time, and each agent gets a dictionary trained on its own earlier runs since
+    an agent tends to print the same lines every run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dictionaries: Dict[int, bytes] = {}
+        # (agent_id, codec) -> newest run of a sample set that failed to train; retried only
+        # once LOG_DICTIONARY_MIN_RUNS newer runs have finished
+        self._training_failed: Dict[Tuple[int, str], int] = {}
+
+    def get_dictionary(self, dict_id: Optional[int]) -> Optional[bytes]:
+        if dict_id is None:
+            return None
+        with self._lock:
+            data = self._dictionaries.get(dict_id)
+        if data is None:
+            with Session(engine) as session:
+                row = session.get(LogDictionary, dict_id)
+            if row is None:
+                raise LookupError(f"Log dictionary {dict_id} is missing")
+            data = row.data
+            with self._lock:
+                self._dictionaries[dict_id] = data
+        return data
+
+    def iter_raw_blocks(self, run: Run) -> Iterator[bytes]:
+        yield from log_codec.iter_blocks(run.log_data, run.log_codec, self.get_dictionary(run.log_dict_id))
+
+    def _raw_log_data(self, run: Run) -> bytes:
+        if run.log_codec:
+            return b"".join(self.iter_raw_blocks(run))
+        if run.log_data:
+            return run.log_data
+        return encode_records(parse_legacy(run.logs or ""))
+
+    def get_agent_dictionary(self, session: Session, agent_id: int, codec: str) -> Optional[LogDictionary]:
+        existing = session.exec(
+            select(LogDictionary)
+            .where(LogDictionary.agent_id == agent_id, LogDictionary.codec == codec)
+            .order_by(LogDictionary.id.desc())
+        ).first()
+        if existing or settings.LOG_DICTIONARY_SIZE <= 0:
+            return existing
+
+        # Runs compacted without a dictionary count too (they are inflated for training), since
+        # an agent with few runs per compaction pass never has enough raw ones at once
+        samples_needed = settings.LOG_DICTIONARY_MIN_RUNS
+        run_ids = session.exec(
+            select(Run.id)
+            .where(Run.agent_id == agent_id, Run.status.not_in(("queued", "running")))
+            .where((Run.log_data.is_not(None)) | (Run.logs != ""))
+            .order_by(Run.id.desc())
+            .limit(samples_needed)
+        ).all()
+        if len(run_ids) < samples_needed:
+            return None
+        failed = self._training_failed.get((agent_id, codec))
+        if failed is not None and run_ids[-1] <= failed:
+            return None  # not a fresh sample set since the last failed attempt
+        runs = session.exec(select(Run).where(Run.id.in_(run_ids))).all()
+        # Train on block-sized samples so the dictionary matches what it will compress
+        samples = [block for run in runs for block in log_codec.split_blocks(encoded_chunks(self._raw_log_data(run)), 4096)]
+        data = log_codec.train_dictionary(codec, samples, settings.LOG_DICTIONARY_SIZE)
+        if not data:
+            self._training_failed[(agent_id, codec)] = run_ids[0]
+            return None
+        self._training_failed.pop((agent_id, codec), None)
+        dictionary = LogDictionary(agent_id=agent_id, codec=codec, data=data, sample_runs=len(runs))
+        session.add(dictionary)
+        session.commit()
+        session.refresh(dictionary)
+        return dictionary
+
+    def compress_run(self, session: Session, run: Run, codec: str, dictionary: Optional[LogDictionary] = None) -> bool:
+        """Compresses one finished run's logs in place (legacy text included). Caller commits."""
+        if run.log_codec or not (run.log_data or run.logs):
+            return False
+        raw = self._raw_log_data(run)
+        dict_data = dictionary.data if dictionary else None
+        packed = log_codec.compress_blocks(log_codec.split_blocks(encoded_chunks(raw)), codec, dict_data)
+        LOG_BYTES_COMPACTED.labels("before").inc(len(raw) if run.log_data else len((run.logs or "").encode("utf-8")))
+        LOG_BYTES_COMPACTED.labels("after").inc(len(packed))
+        run.log_data = packed
+        run.log_codec = codec
+        run.log_dict_id = dictionary.id if dictionary else None
+        run.logs = ""
+        session.add(run)
+        RUNS_COMPACTED.inc()
+        return True
+
+    def compact_pending(self, batch_size: int = 50) -> int:
+        """Compresses up to batch_size finished runs that are still stored raw."""
+        codec = log_codec.available_codec(settings.LOG_COMPRESSION_CODEC)
+        compacted = 0
+        with Session(engine) as session:
+            runs = session.exec(
+                select(Run)
+                .where(Run.status.not_in(("queued", "running")), Run.log_codec.is_(None))
+                .where((Run.log_data.is_not(None)) | (Run.logs != ""))
+                .order_by(Run.id)
+                .limit(batch_size)
+            ).all()
+            dictionaries: Dict[int, Optional[LogDictionary]] = {}
+            for run in runs:
+                if run.agent_id not in dictionaries:
+                    dictionaries[run.agent_id] = self.get_agent_dictionary(session, run.agent_id, codec)
+                if self.compress_run(session, run, codec, dictionaries[run.agent_id]):
+                    compacted += 1
+            session.commit()
+        return compacted
+
+log_service = LogService()
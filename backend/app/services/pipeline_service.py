@@ -0,0 +1,348 @@
+import asyncio
+import json
+import traceback
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from app.core.database import engine
+from app.core.metrics import registry
+from app.models import Agent, Pipeline, PipelineNode, PipelineRun, Run
+from app.runtime.executor import agent_executor
+from app.runtime.logs import append_system_message
+from app.services.agent_service import agent_service
+from app.services.run_service import run_service
+
+PIPELINE_RUNS = registry.counter("kernel_pipeline_runs_total", "Finished pipeline runs, by status", ["status"])
+PIPELINE_NODE_RETRIES = registry.counter("kernel_pipeline_node_retries_total", "Pipeline node attempts started after a failure")
+
+ACTIVE_RUN_STATUSES = ("queued", "running", "interrupted")
+FAILED_NODE_STATUSES = ("failed", "skipped", "cancelled")
+POLL_SECONDS = 5  # fallback wake-up; finished runs normally wake the driver straight away
+
+
+def validate_nodes(session: Session, nodes: List[dict]) -> List[dict]:
+    """Checks a pipeline spec (unique node ids, known agents and dependencies, no cycles)."""
+    if not nodes:
+        raise ValueError("A pipeline needs at least one node")
+    by_id: Dict[str, dict] = {}
+    for node in nodes:
+        node_id = node["id"]
+        if node_id in by_id:
+            raise ValueError(f"Duplicate node id '{node_id}'")
+        if session.get(Agent, node["agent_id"]) is None:
+            raise ValueError(f"Node '{node_id}': agent {node['agent_id']} not found")
+        by_id[node_id] = node
+    for node in nodes:
+        for dep in node.get("depends_on", []):
+            if dep not in by_id:
+                raise ValueError(f"Node '{node['id']}' depends on unknown node '{dep}'")
+
+    # Kahn's algorithm: anything left unvisited is on a cycle
+    remaining = {node_id: set(node.get("depends_on", [])) for node_id, node in by_id.items()}
+    while True:
+        ready = [node_id for node_id, deps in remaining.items() if not deps]
+        if not ready:
+            break
+        for node_id in ready:
+            del remaining[node_id]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    if remaining:
+        raise ValueError(f"Pipeline has a cycle through: {', '.join(sorted(remaining))}")
+    return nodes
+
+
+class PipelineService:
+    """
+    Runs DAGs of agents. Every ready node (all dependencies succeeded) is started as an
+    ordinary run, so independent branches execute in parallel, bounded only by
+    MAX_CONCURRENT_RUNS. A node's run receives its upstream nodes' artifacts under
+    /data/inputs/<node>/ (see RunService.run_inputs). State lives in PipelineNode rows: a
+    driver task per active pipeline run moves nodes forward as their runs finish, and
+    retrying a pipeline run only re-executes nodes that did not succeed.
+    """
+
+    def __init__(self):
+        self._drivers: Dict[int, asyncio.Task] = {}
+        self._wake: Dict[int, asyncio.Event] = {}
+        self._listening = False
+
+    # -- definitions --
+
+    def create_pipeline(self, session: Session, name: str, description: Optional[str], nodes: List[dict]) -> Pipeline:
+        pipeline = Pipeline(name=name, description=description, spec=json.dumps(validate_nodes(session, nodes)))
+        session.add(pipeline)
+        session.commit()
+        session.refresh(pipeline)
+        return pipeline
+
+    def update_pipeline(self, session: Session, pipeline_id: int, name: str, description: Optional[str], nodes: List[dict]) -> Optional[Pipeline]:
+        pipeline = session.get(Pipeline, pipeline_id)
+        if not pipeline:
+            return None
+        pipeline.name = name
+        pipeline.description = description
+        pipeline.spec = json.dumps(validate_nodes(session, nodes))
+        pipeline.updated_at = datetime.utcnow()
+        session.add(pipeline)
+        session.commit()
+        session.refresh(pipeline)
+        return pipeline
+
+    def list_pipelines(self, session: Session) -> List[Pipeline]:
+        return session.exec(select(Pipeline).order_by(Pipeline.id)).all()
+
+    def get_pipeline(self, session: Session, pipeline_id: int) -> Optional[Pipeline]:
+        return session.get(Pipeline, pipeline_id)
+
+    def delete_pipeline(self, session: Session, pipeline_id: int) -> bool:
+        """Deletes the definition and its run history; the agents' runs are kept."""
+        pipeline = session.get(Pipeline, pipeline_id)
+        if not pipeline:
+            return False
+        run_ids = session.exec(select(PipelineRun.id).where(PipelineRun.pipeline_id == pipeline_id)).all()
+        if any(run_id in self._drivers for run_id in run_ids):
+            raise ValueError("Pipeline has an active run")
+        session.exec(delete(PipelineNode).where(PipelineNode.pipeline_run_id.in_(run_ids)))
+        session.exec(delete(PipelineRun).where(PipelineRun.pipeline_id == pipeline_id))
+        session.delete(pipeline)
+        session.commit()
+        return True
+
+    # -- runs --
+
+    def list_runs(self, session: Session, pipeline_id: int) -> List[PipelineRun]:
+        return session.exec(
+            select(PipelineRun).where(PipelineRun.pipeline_id == pipeline_id).order_by(PipelineRun.id.desc())
+        ).all()
+
+    def get_run(self, session: Session, pipeline_run_id: int) -> Optional[Tuple[PipelineRun, List[PipelineNode]]]:
+        pipeline_run = session.get(PipelineRun, pipeline_run_id)
+        if not pipeline_run:
+            return None
+        nodes = session.exec(
+            select(PipelineNode).where(PipelineNode.pipeline_run_id == pipeline_run_id).order_by(PipelineNode.id)
+        ).all()
+        return pipeline_run, nodes
+
+    def start(self, session: Session, pipeline_id: int) -> Optional[PipelineRun]:
+        pipeline = session.get(Pipeline, pipeline_id)
+        if not pipeline:
+            return None
+        pipeline_run = PipelineRun(pipeline_id=pipeline_id)
+        session.add(pipeline_run)
+        session.flush()
+        for node in json.loads(pipeline.spec):
+            session.add(PipelineNode(
+                pipeline_run_id=pipeline_run.id,
+                node=node["id"],
+                agent_id=node["agent_id"],
+                depends_on=json.dumps(node.get("depends_on", [])),
+                retries=node.get("retries", 0),
+            ))
+        session.commit()
+        session.refresh(pipeline_run)
+        self._spawn(pipeline_run.id)
+        return pipeline_run
+
+    def retry(self, session: Session, pipeline_run_id: int) -> Optional[PipelineRun]:
+        """Re-runs the failed, skipped and cancelled nodes; successful nodes keep their results."""
+        pipeline_run = session.get(PipelineRun, pipeline_run_id)
+        if not pipeline_run:
+            return None
+        if pipeline_run.status == "running":
+            raise ValueError("Pipeline run is still running")
+        nodes = session.exec(select(PipelineNode).where(PipelineNode.pipeline_run_id == pipeline_run_id)).all()
+        for node in nodes:
+            if node.status in FAILED_NODE_STATUSES:
+                node.status = "pending"
+                node.attempts = 0  # a fresh set of automatic retries
+                session.add(node)
+        pipeline_run.status = "running"
+        pipeline_run.end_time = None
+        pipeline_run.error = None
+        session.add(pipeline_run)
+        session.commit()
+        session.refresh(pipeline_run)
+        self._spawn(pipeline_run.id)
+        return pipeline_run
+
+    def cancel(self, session: Session, pipeline_run_id: int) -> Optional[PipelineRun]:
+        pipeline_run = session.get(PipelineRun, pipeline_run_id)
+        if not pipeline_run:
+            return None
+        if pipeline_run.status != "running":
+            raise ValueError(f"Pipeline run already finished ({pipeline_run.status})")
+        nodes = session.exec(select(PipelineNode).where(PipelineNode.pipeline_run_id == pipeline_run_id)).all()
+        for node in nodes:
+            if node.status == "running" and node.run_id is not None:
+                if not agent_executor.cancel_run(node.run_id):
+                    self._close_run(session, node.run_id)
+            if node.status in ("pending", "running"):
+                node.status = "cancelled"
+                session.add(node)
+        self._finish(session, pipeline_run, "cancelled")
+        self._notify_driver(pipeline_run_id)
+        return pipeline_run
+
+    def resume(self) -> int:
+        """Startup: picks up pipeline runs the previous process was driving."""
+        with Session(engine) as session:
+            ids = session.exec(select(PipelineRun.id).where(PipelineRun.status == "running")).all()
+        for pipeline_run_id in ids:
+            self._spawn(pipeline_run_id)
+        return len(ids)
+
+    async def stop(self):
+        tasks = list(self._drivers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # -- driver --
+
+    def _on_run_event(self, event: dict):
+        if event.get("type") == "run_finished":
+            for wake in self._wake.values():
+                wake.set()
+
+    def _notify_driver(self, pipeline_run_id: int):
+        wake = self._wake.get(pipeline_run_id)
+        if wake is not None:
+            wake.set()
+
+    def _spawn(self, pipeline_run_id: int):
+        if not self._listening:
+            agent_executor.add_listener(self._on_run_event)
+            self._listening = True
+        if pipeline_run_id in self._drivers:
+            self._notify_driver(pipeline_run_id)
+            return
+        self._wake[pipeline_run_id] = asyncio.Event()
+        task = asyncio.create_task(self._drive(pipeline_run_id))
+        self._drivers[pipeline_run_id] = task
+
+    async def _drive(self, pipeline_run_id: int):
+        wake = self._wake[pipeline_run_id]
+        try:
+            while True:
+                wake.clear()
+                progressed = await self._step(pipeline_run_id)
+                if progressed is None:
+                    return
+                if not progressed:
+                    try:
+                        await asyncio.wait_for(wake.wait(), POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+        except Exception as e:
+            print(f"Pipeline run {pipeline_run_id} driver failed: {e}")
+            traceback.print_exc()
+            self._fail(pipeline_run_id, f"Pipeline driver failed: {e}")
+        finally:
+            self._drivers.pop(pipeline_run_id, None)
+            self._wake.pop(pipeline_run_id, None)
+
+    async def _step(self, pipeline_run_id: int) -> Optional[bool]:
+        """
+        Advances one pipeline run: records finished node runs, skips nodes whose dependencies
+        failed and starts every node that became ready. Returns None once the pipeline run is
+        over, otherwise whether anything changed.
+        """
+        with Session(engine) as session:
+            pipeline_run = session.get(PipelineRun, pipeline_run_id)
+            if pipeline_run is None or pipeline_run.status != "running":
+                return None
+            nodes = session.exec(select(PipelineNode).where(PipelineNode.pipeline_run_id == pipeline_run_id)).all()
+            by_name = {node.node: node for node in nodes}
+            changed = False
+
+            for node in nodes:
+                if node.status != "running":
+                    continue
+                run = session.get(Run, node.run_id) if node.run_id is not None else None
+                if run is not None and run.status in ACTIVE_RUN_STATUSES:
+                    continue
+                if run is not None and run.status == "success":
+                    node.status = "success"
+                elif node.attempts <= node.retries:
+                    node.status = "pending"  # automatic retry
+                    PIPELINE_NODE_RETRIES.inc()
+                else:
+                    node.status = "failed"
+                session.add(node)
+                changed = True
+
+            ready = []
+            for node in nodes:
+                if node.status != "pending":
+                    continue
+                deps = [by_name[name].status for name in json.loads(node.depends_on)]
+                if all(status == "success" for status in deps):
+                    ready.append(node)
+                elif any(status in FAILED_NODE_STATUSES for status in deps):
+                    node.status = "skipped"
+                    session.add(node)
+                    changed = True
+
+            for node in ready:
+                try:
+                    run = agent_service.create_run(session, node.agent_id, trigger_type="pipeline")
+                except ValueError:
+                    node.status = "failed"
+                    session.add(node)
+                    session.commit()
+                    continue
+                node.run_id = run.id
+                node.status = "running"
+                node.attempts += 1
+                session.add(node)
+                session.commit()
+                try:
+                    await run_service.launch_run(session, run)
+                except Exception as e:
+                    # Draining runs stay queued for the next process; anything else fails the attempt
+                    if agent_executor.draining:
+                        return None
+                    run.status = "error"
+                    run.end_time = datetime.utcnow()
+                    append_system_message(run, f"Could not start run: {e}")
+                    session.add(run)
+                    session.commit()
+
+            if not ready and all(node.status not in ("pending", "running") for node in nodes):
+                self._finish(session, pipeline_run, "success" if all(n.status == "success" for n in nodes) else "failed")
+                return None
+            session.commit()
+            return changed or bool(ready)
+
+    def _finish(self, session: Session, pipeline_run: PipelineRun, status: str):
+        pipeline_run.status = status
+        pipeline_run.end_time = datetime.utcnow()
+        session.add(pipeline_run)
+        session.commit()
+        session.refresh(pipeline_run)
+        PIPELINE_RUNS.labels(status).inc()
+
+    def _fail(self, pipeline_run_id: int, error: str):
+        # Without a driver the run would otherwise stay "running" forever; retry() picks it up again
+        try:
+            with Session(engine) as session:
+                pipeline_run = session.get(PipelineRun, pipeline_run_id)
+                if pipeline_run is not None and pipeline_run.status == "running":
+                    pipeline_run.error = error
+                    self._finish(session, pipeline_run, "failed")
+        except Exception as e:
+            print(f"Could not mark pipeline run {pipeline_run_id} failed: {e}")
+
+    def _close_run(self, session: Session, run_id: int):
+        # A queued node run this process isn't executing (e.g. debounced or left by a restart)
+        run = session.get(Run, run_id)
+        if run is not None and run.status in ACTIVE_RUN_STATUSES:
+            run.status = "cancelled"
+            run.end_time = datetime.utcnow()
+            append_system_message(run, "Run cancelled.")
+            session.add(run)
+
+pipeline_service = PipelineService()
@@ -0,0 +1,150 @@
+import io
+import json
+import os
+import tarfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import registry
+from app.models import Agent, AgentVersion, LogDictionary, Run, WebhookEvent
+from app.models.link_agent_secret import LinkAgentSecret
+from app.runtime.logs import run_records
+from app.services.artifact_service import artifact_service
+from app.services.dashboard_service import dashboard_service
+from app.services.log_search_service import log_search_service
+
+RUNS_ARCHIVED = registry.counter("kernel_runs_archived_total", "Runs written to the archive before deletion")
+RUNS_PURGED = registry.counter("kernel_runs_purged_total", "Runs deleted by retention or agent deletion", ["reason"])
+
+ACTIVE_STATUSES = ("queued", "running", "interrupted")  # interrupted runs are requeued at startup
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+class RetentionService:
+    """
+    Keeps run history bounded. Every pass works in small batches, each its own short
+    transaction followed by a pause, so API writes and the executor are never locked out.
+    """
+
+    def policy(self, agent: Agent):
+        keep_last = agent.retention_keep_last if agent.retention_keep_last is not None else settings.RUN_RETENTION_KEEP_LAST
+        max_age = agent.retention_max_age_days if agent.retention_max_age_days is not None else settings.RUN_RETENTION_MAX_AGE_DAYS
+        return keep_last, max_age
+
+    def expired_run_ids(self, session: Session, agent: Agent, limit: int) -> List[int]:
+        keep_last, max_age = self.policy(agent)
+        finished = select(Run.id).where(Run.agent_id == agent.id, Run.status.not_in(ACTIVE_STATUSES))
+        ids = set()
+        if keep_last > 0:
+            newest = select(Run.id).where(Run.agent_id == agent.id).order_by(Run.id.desc()).limit(keep_last)
+            ids.update(session.exec(finished.where(Run.id.not_in(newest)).order_by(Run.id).limit(limit)).all())
+        if max_age > 0:
+            cutoff = datetime.utcnow() - timedelta(days=max_age)
+            ids.update(session.exec(finished.where(Run.end_time < cutoff).order_by(Run.id).limit(limit)).all())
+        return sorted(ids)[:limit]
+
+    def archive_run(self, run: Run, agent: Agent) -> str:
+        """Writes run metadata, logs (JSON lines), trace and artifacts to one .tar.gz."""
+        path = artifact_service.archive_path(agent.id, run.id)
+        meta = run.model_dump(exclude={"logs", "log_data", "trace"})
+        tmp = path + ".tmp"
+        with tarfile.open(tmp, "w:gz") as tar:
+            _add_bytes(tar, "run.json", json.dumps(meta, default=str, indent=2).encode())
+            _add_bytes(tar, "logs.jsonl", "".join(json.dumps(r.to_dict()) + "\n" for r in run_records(run)).encode())
+            if run.trace:
+                _add_bytes(tar, "trace.json", run.trace.encode())
+            run_dir = artifact_service.run_dir_path(agent.name, run.id)
+            if os.path.isdir(run_dir):
+                tar.add(run_dir, arcname="artifacts")
+        os.replace(tmp, path)
+        RUNS_ARCHIVED.inc()
+        return path
+
+    def _delete_runs(self, session: Session, agent: Agent, runs: List[Run], reason: str, archive: bool):
+        for run in runs:
+            if archive:
+                self.archive_run(run, agent)
+        ids = [run.id for run in runs]
+        log_search_service.remove_runs(session, ids)
+        session.exec(delete(Run).where(Run.id.in_(ids)))
+        session.commit()
+        for run in runs:
+            artifact_service.remove_run_dir(agent.name, run.id)
+        RUNS_PURGED.labels(reason).inc(len(ids))
+        dashboard_service.invalidate()
+
+    def _pause(self):
+        if settings.RETENTION_BATCH_PAUSE_MS > 0:
+            time.sleep(settings.RETENTION_BATCH_PAUSE_MS / 1000)
+
+    def enforce_agent(self, agent_id: int, max_batches: Optional[int] = None) -> int:
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with Session(engine) as session:
+                agent = session.get(Agent, agent_id)
+                if agent is None or agent.status == "deleting":
+                    break
+                ids = self.expired_run_ids(session, agent, settings.RETENTION_BATCH_SIZE)
+                if not ids:
+                    break
+                runs = session.exec(select(Run).where(Run.id.in_(ids))).all()
+                self._delete_runs(session, agent, runs, "retention", settings.RUN_ARCHIVE_ENABLED)
+            deleted += len(ids)
+            batches += 1
+            self._pause()
+        return deleted
+
+    def purge_agent(self, agent_id: int) -> bool:
+        """
+        Deletes an agent marked "deleting" run batch by run batch. Returns False while some of
+        its runs are still active; the maintenance job retries those later.
+        """
+        while True:
+            with Session(engine) as session:
+                agent = session.get(Agent, agent_id)
+                if agent is None:
+                    return True
+                runs = session.exec(
+                    select(Run)
+                    .where(Run.agent_id == agent_id, Run.status.not_in(ACTIVE_STATUSES))
+                    .limit(settings.RETENTION_BATCH_SIZE)
+                ).all()
+                if runs:
+                    self._delete_runs(session, agent, runs, "agent_deleted", archive=False)
+                else:
+                    if session.exec(select(Run.id).where(Run.agent_id == agent_id).limit(1)).first() is not None:
+                        return False
+                    session.exec(delete(LinkAgentSecret).where(LinkAgentSecret.agent_id == agent_id))
+                    session.exec(delete(LogDictionary).where(LogDictionary.agent_id == agent_id))
+                    session.exec(delete(WebhookEvent).where(WebhookEvent.agent_id == agent_id))
+                    session.exec(delete(AgentVersion).where(AgentVersion.agent_id == agent_id))
+                    session.exec(delete(Agent).where(Agent.id == agent_id))
+                    session.commit()
+                    return True
+            self._pause()
+
+    def run_pass(self) -> int:
+        """One maintenance pass: finish pending agent deletions, then apply retention."""
+        with Session(engine) as session:
+            agents = session.exec(select(Agent.id, Agent.status)).all()
+        deleted = 0
+        for agent_id, status in agents:
+            if status == "deleting":
+                self.purge_agent(agent_id)
+            else:
+                # A few batches per agent per pass keeps one huge backlog from starving the rest
+                deleted += self.enforce_agent(agent_id, max_batches=4)
+        return deleted
+
+retention_service = RetentionService()
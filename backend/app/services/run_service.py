@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import registry
+from app.models import Agent, AgentVersion, PipelineNode, Run
+from app.runtime.executor import INPUTS_DIR, ExecutorDraining, agent_executor
+from app.runtime.logs import append_system_message
+from app.services.agent_service import agent_service
+from app.services.artifact_service import artifact_service
+from app.services.dashboard_service import dashboard_service
+from app.services.secret_service import secret_service
+
+RUNS_RECOVERED = registry.counter("kernel_runs_recovered_total", "Runs reconciled at startup, by outcome", ["outcome"])
+RUN_CACHE = registry.counter("kernel_run_cache_total", "Result cache lookups for cacheable agents", ["result"])
+RUN_TRIGGERS = registry.counter("kernel_run_triggers_total", "Trigger requests by outcome (created, idempotent, coalesced, skipped)", ["outcome"])
+
+def _file_digest(path: str) -> str:
+    # Inbox uploads were hashed as they streamed in; only other inputs are read again
+    recorded = artifact_service.inbox_file_digest(path)
+    if recorded:
+        return recorded
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def input_digests(inputs: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """sandbox path -> sha256 of each input file; may read whole files, so call it off the loop."""
+    return {target: _file_digest(source) for target, source in (inputs or {}).items()}
+
+def result_cache_key(version: AgentVersion, payload: dict, digests: Optional[Dict[str, str]] = None) -> str:
+    material = json.dumps({
+        "code": version.code,
+        "dependencies": version.dependencies,
+        "payload": payload,
+        "inputs": digests or {},
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+class RunService:
+    def __init__(self):
+        self._debounced: Dict[int, int] = {}  # agent_id -> queued run waiting out its debounce window
+        self._launches: set = set()
+
+    async def trigger_run(
+        self,
+        session: Session,
+        agent_id: int,
+        trigger_type: str = "manual",
+        idempotency_key: Optional[str] = None,
+        input_files: Optional[List[str]] = None,
+    ) -> Tuple[Run, str]:
+        """
+        Creates and starts a run unless the trigger is a duplicate. Returns (run, outcome):
+        "idempotent" when the Idempotency-Key was seen within TRIGGER_IDEMPOTENCY_TTL_SECONDS,
+        "coalesced" when a debounced run is still waiting to start, "skipped" when the agent's
+        policy is "skip" and it already has a run queued or running, otherwise "created".
+        Nothing here awaits before the run is committed, so concurrent requests in this
+        process can't both miss the lookup. `input_files` are inbox file ids; a coalesced or
+        skipped trigger's files are not added to the run it is folded into.
+        """
+        agent = agent_service.get_agent(session, agent_id)
+        if not agent:
+            raise LookupError("Agent not found")
+        for file_id in input_files or []:
+            if artifact_service.inbox_file_path(file_id) is None:
+                raise ValueError(f"Input file {file_id} not found in the inbox")
+
+        if idempotency_key:
+            cutoff = datetime.utcnow() - timedelta(seconds=settings.TRIGGER_IDEMPOTENCY_TTL_SECONDS)
+            run = session.exec(
+                select(Run)
+                .where(Run.agent_id == agent_id, Run.idempotency_key == idempotency_key, Run.created_at >= cutoff)
+                .order_by(Run.id.desc())
+            ).first()
+            if run:
+                return self._outcome(run, "idempotent")
+
+        debounce = agent.debounce_seconds if agent.debounce_seconds is not None else settings.TRIGGER_DEBOUNCE_SECONDS
+        pending_id = self._debounced.get(agent_id)
+        if pending_id is not None:
+            run = session.get(Run, pending_id)
+            if run is not None and run.status == "queued":
+                run.coalesced_triggers = (run.coalesced_triggers or 0) + 1
+                session.add(run)
+                session.commit()
+                return self._outcome(run, "coalesced")
+
+        if (agent.concurrency_policy or "allow") == "skip":
+            current = session.exec(
+                select(Run).where(Run.agent_id == agent_id, Run.status.in_(("queued", "running"))).order_by(Run.id.desc())
+            ).first()
+            if current:
+                return self._outcome(current, "skipped")
+
+        run = agent_service.create_run(
+            session, agent_id, trigger_type=trigger_type, idempotency_key=idempotency_key, input_files=input_files
+        )
+        if debounce > 0:
+            # Start at the end of the window; triggers until then return this run
+            self._debounced[agent_id] = run.id
+            asyncio.get_running_loop().call_later(debounce, self._launch_debounced, agent_id, run.id)
+        else:
+            try:
+                await self.launch_run(session, run)
+            except ExecutorDraining:
+                raise  # stays queued; the next process's recovery pass starts it
+            except Exception as e:
+                # Don't leave a queued row behind: under "skip" it would swallow every later trigger
+                run.status = "error"
+                run.end_time = datetime.utcnow()
+                append_system_message(run, f"Could not start run: {e}")
+                session.add(run)
+                session.commit()
+                raise
+        return self._outcome(run, "created")
+
+    def _outcome(self, run: Run, outcome: str) -> Tuple[Run, str]:
+        RUN_TRIGGERS.labels(outcome).inc()
+        return run, outcome
+
+    def _launch_debounced(self, agent_id: int, run_id: int):
+        if self._debounced.get(agent_id) == run_id:
+            del self._debounced[agent_id]
+        task = asyncio.create_task(self._launch_queued(run_id))
+        self._launches.add(task)
+        task.add_done_callback(self._launches.discard)
+
+    async def _launch_queued(self, run_id: int):
+        with Session(engine) as session:
+            run = session.get(Run, run_id)
+            if run is None or run.status != "queued":
+                return  # cancelled or deleted while waiting
+            try:
+                await self.launch_run(session, run)
+            except ExecutorDraining:
+                pass  # stays queued; the next process's recovery pass starts it
+            except Exception as e:
+                print(f"Failed to start debounced run {run_id}: {e}")
+                run.status = "error"
+                run.end_time = datetime.utcnow()
+                append_system_message(run, f"Could not start run: {e}")
+                session.add(run)
+                session.commit()
+
+    async def launch_run(self, session: Session, run: Run):
+        """Hands a queued run to the executor with its agent's code, dependencies and secrets."""
+        agent = run.agent
+        version = session.get(AgentVersion, run.version_id) if run.version_id else None
+        if version is None:
+            raise ValueError("Run has no code version")
+        payload = json.loads(run.input_payload) if run.input_payload else {}
+        inputs = self.run_inputs(session, run)
+        if agent.cache_ttl_seconds:
+            digests = await asyncio.to_thread(input_digests, inputs) if inputs else None
+            run.cache_key = result_cache_key(version, payload, digests)
+            if self.complete_from_cache(session, run, agent.cache_ttl_seconds):
+                return
+        secrets = secret_service.resolve_agent_secrets(session, agent.id)
+        await agent_executor.start_run(
+            agent_name=agent.name,
+            run_id=run.id,
+            code=version.code,
+            dependencies=version.dependencies,
+            secrets=secrets,
+            payload=payload,
+            agent_id=agent.id,
+            version_id=version.id,
+            inputs=inputs,
+        )
+
+    def run_inputs(self, session: Session, run: Run) -> Dict[str, str]:
+        """
+        Input files for a run, as sandbox path -> local path: inbox uploads referenced by the
+        trigger under /data/inputs/, and for a pipeline node the artifacts of the nodes it
+        depends on under /data/inputs/<node>/.
+        """
+        inputs = {}
+        for file_id in json.loads(run.input_files) if run.input_files else []:
+            path = artifact_service.inbox_file_path(file_id)
+            if path is None:
+                raise ValueError(f"Input file {file_id} is no longer in the inbox")
+            inputs[f"{INPUTS_DIR}/{os.path.basename(path)}"] = path
+
+        node = session.exec(select(PipelineNode).where(PipelineNode.run_id == run.id)).first()
+        if node is None:
+            return inputs
+        upstream = session.exec(
+            select(PipelineNode).where(
+                PipelineNode.pipeline_run_id == node.pipeline_run_id,
+                PipelineNode.node.in_(json.loads(node.depends_on)),
+            )
+        ).all()
+        for dep in upstream:
+            agent = session.get(Agent, dep.agent_id)
+            if agent is None or dep.run_id is None:
+                continue
+            run_dir = artifact_service.run_dir_path(agent.name, dep.run_id)
+            if not os.path.isdir(run_dir):
+                continue
+            for name in sorted(os.listdir(run_dir)):
+                path = os.path.join(run_dir, name)
+                if os.path.isfile(path):
+                    inputs[f"{INPUTS_DIR}/{dep.node}/{name}"] = path
+        return inputs
+
+    def complete_from_cache(self, session: Session, run: Run, ttl_seconds: int) -> bool:
+        """
+        Finishes a queued run with the result of an earlier successful run with the same
+        cache_key. Logs are copied as stored (still compressed, no decode) and artifacts are
+        hard-linked, so neither depends on the source run surviving retention.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+        source = session.exec(
+            select(Run)
+            .where(
+                Run.agent_id == run.agent_id,
+                Run.cache_key == run.cache_key,
+                Run.status == "success",
+                Run.cached_from_run_id.is_(None),
+                Run.end_time >= cutoff,
+                Run.id != run.id,
+            )
+            .order_by(Run.id.desc())
+        ).first()
+        if source is None:
+            RUN_CACHE.labels("miss").inc()
+            session.add(run)
+            session.commit()
+            return False
+
+        now = datetime.utcnow()
+        run.status = "success"
+        run.start_time = now
+        run.end_time = now
+        run.cached_from_run_id = source.id
+        run.logs = source.logs
+        run.log_data = source.log_data
+        run.log_codec = source.log_codec
+        run.log_dict_id = source.log_dict_id
+        run.log_indexed = False  # picked up by the index backfill
+        linked = artifact_service.link_run_artifacts(run.agent.name, source.id, run.id)
+        run.artifacts_written = json.dumps(linked)
+        session.add(run)
+        session.commit()
+        dashboard_service.invalidate()
+        RUN_CACHE.labels("hit").inc()
+        return True
+
+    async def recover_runs(self) -> dict:
+        """
+        Startup reconciliation of runs the previous process left behind. Runs that never got a
+        sandbox (queued) or were stopped by a shutdown drain (interrupted) are started again, up
+        to RUN_MAX_RECOVERY_ATTEMPTS; runs that were mid-execution when the process died may
+        have had side effects, so they are failed.
+        """
+        outcome = {"requeued": 0, "failed": 0}
+        with Session(engine) as session:
+            runs = session.exec(
+                select(Run).where(Run.status.in_(("queued", "running", "interrupted"))).order_by(Run.id)
+            ).all()
+            to_launch = []
+            now = datetime.utcnow()
+            for run in runs:
+                if agent_executor.is_active(run.id):
+                    continue
+                retryable = run.status in ("queued", "interrupted") and run.agent.status != "deleting"
+                if retryable and settings.RECOVER_INTERRUPTED_RUNS and (run.recovery_attempts or 0) < settings.RUN_MAX_RECOVERY_ATTEMPTS:
+                    run.recovery_attempts = (run.recovery_attempts or 0) + 1
+                    run.status = "queued"
+                    append_system_message(run, f"Requeued after server restart (attempt {run.recovery_attempts}).")
+                    to_launch.append(run)
+                    outcome["requeued"] += 1
+                else:
+                    run.status = "error"
+                    run.end_time = now
+                    append_system_message(run, "Run interrupted (Server Restart)")
+                    outcome["failed"] += 1
+                session.add(run)
+            # One transaction for the whole reconciliation
+            session.commit()
+
+            for run in to_launch:
+                try:
+                    await self.launch_run(session, run)
+                except Exception as e:
+                    print(f"Failed to requeue run {run.id}: {e}")
+                    run.status = "error"
+                    run.end_time = datetime.utcnow()
+                    append_system_message(run, f"Could not requeue run: {e}")
+                    session.add(run)
+                    session.commit()
+        for name, count in outcome.items():
+            RUNS_RECOVERED.labels(name).inc(count)
+        if runs:
+            print(f"Recovered runs after restart: {outcome}")
+        return outcome
+
+run_service = RunService()
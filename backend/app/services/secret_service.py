@@ -1,27 +1,118 @@
-from typing import List, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import registry
 from app.models import Secret
 from app.models.agent import Agent
+from app.models.link_agent_secret import LinkAgentSecret
+from app.runtime.sandbox_pool import sandbox_pool
+
+SECRET_CACHE = registry.counter("kernel_secret_cache_lookups_total", "Agent secret resolutions by cache result", ["result"])
+
+def last_4(value: str) -> str:
+    return value[-4:] if len(value) > 4 else value
+
+class DecryptedSecretCache:
+    """
+    Short-TTL cache of decrypted secrets so hot trigger paths skip Fernet and relationship loads.
+    Per-agent env dicts expire after SECRET_CACHE_TTL_SECONDS and are the only place plaintext
+    is kept; 0 disables the cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents: Dict[int, Tuple[float, Dict[str, str]]] = {}
+
+    def get_agent(self, agent_id: int) -> Optional[Dict[str, str]]:
+        with self._lock:
+            entry = self._agents.get(agent_id)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return dict(entry[1])
+
+    def put_agent(self, agent_id: int, secrets: Dict[str, str]):
+        with self._lock:
+            self._agents[agent_id] = (time.monotonic() + settings.SECRET_CACHE_TTL_SECONDS, dict(secrets))
+
+    def invalidate_agent(self, agent_id: int):
+        with self._lock:
+            self._agents.pop(agent_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._agents.clear()
 
 class SecretService:
+    def __init__(self):
+        self.cache = DecryptedSecretCache()
+
+    def backfill_last_4(self) -> int:
+        """Startup migration: fills in last_4_chars on secrets stored before the column existed."""
+        from app.core.security import decrypt_value
+        with Session(engine) as session:
+            missing = session.exec(select(Secret).where(Secret.last_4_chars.is_(None))).all()
+            for secret in missing:
+                secret.last_4_chars = last_4(decrypt_value(secret.value))
+                session.add(secret)
+            session.commit()
+        return len(missing)
+
     def list_secrets(self, session: Session) -> List[Secret]:
         return session.exec(select(Secret)).all()
 
+    def list_secrets_query(self):
+        return select(Secret.id, Secret.key, Secret.last_4_chars, Secret.description)
+
+    def links_query(self, agent_id: int):
+        return (
+            select(Secret.id, Secret.key)
+            .join(LinkAgentSecret, LinkAgentSecret.secret_id == Secret.id)
+            .where(LinkAgentSecret.agent_id == agent_id)
+        )
+
+    def resolve_agent_secrets(self, session: Session, agent_id: int) -> Dict[str, str]:
+        """Decrypted {key: value} env for an agent, from one join query, cached for a short TTL."""
+        if settings.SECRET_CACHE_TTL_SECONDS > 0:
+            cached = self.cache.get_agent(agent_id)
+            if cached is not None:
+                SECRET_CACHE.labels("hit").inc()
+                return cached
+        SECRET_CACHE.labels("miss").inc()
+
+        rows = session.exec(
+            select(Secret.key, Secret.value)
+            .join(LinkAgentSecret, LinkAgentSecret.secret_id == Secret.id)
+            .where(LinkAgentSecret.agent_id == agent_id)
+        ).all()
+        from app.core.security import decrypt_value
+        secrets = {key: decrypt_value(value) for key, value in rows}
+        if settings.SECRET_CACHE_TTL_SECONDS > 0:
+            self.cache.put_agent(agent_id, secrets)
+        return secrets
+
     def create_secret(self, session: Session, key: str, value: str, description: str = None) -> Secret:
         from app.core.security import encrypt_value
         encrypted_val = encrypt_value(value)
-        secret = Secret(key=key, value=encrypted_val, description=description)
+        secret = Secret(key=key, value=encrypted_val, description=description, last_4_chars=last_4(value))
         session.add(secret)
         session.commit()
         session.refresh(secret)
+        self.cache.clear()
         return secret
 
     def delete_secret(self, session: Session, secret_id: int) -> bool:
         secret = session.get(Secret, secret_id)
         if not secret:
             return False
+        agent_ids = [a.id for a in secret.agents]
         session.delete(secret)
         session.commit()
+        self.cache.clear()
+        for agent_id in agent_ids:
+            sandbox_pool.invalidate_agent(agent_id)
         return True
 
     def get_links(self, session: Session, agent_id: int) -> List[Secret]:
@@ -39,6 +130,8 @@ class SecretService:
             agent.secrets.append(secret)
             session.add(agent)
             session.commit()
+            self.cache.invalidate_agent(agent_id)
+            sandbox_pool.invalidate_agent(agent_id)
         return True
 
     def unlink_secret(self, session: Session, agent_id: int, secret_id: int) -> bool:
@@ -50,6 +143,8 @@ class SecretService:
             agent.secrets.remove(secret)
             session.add(agent)
             session.commit()
+            self.cache.invalidate_agent(agent_id)
+            sandbox_pool.invalidate_agent(agent_id)
         return True
 
 secret_service = SecretService()
@@ -0,0 +1,328 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+from app.core.config import settings
+from app.core.database import engine
+from app.core.metrics import registry
+from app.models import Agent, Run, WebhookEvent
+from app.runtime.executor import agent_executor
+from app.runtime.logs import append_system_message
+from app.services.run_service import run_service
+
+WEBHOOK_EVENTS = registry.counter("kernel_webhook_events_total", "Webhook events accepted")
+WEBHOOK_REJECTED = registry.counter("kernel_webhook_rejected_total", "Webhook deliveries rejected", ["reason"])
+WEBHOOK_COMMIT_EVENTS = registry.histogram(
+    "kernel_webhook_commit_events", "Events per group commit", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+WEBHOOK_RUNS = registry.counter("kernel_webhook_runs_total", "Runs started from webhook events")
+WEBHOOK_PENDING = registry.gauge("kernel_webhook_pending_events", "Accepted webhook events not yet in a run")
+
+CONFIG_TTL_SECONDS = 5.0  # how long a validated agent's webhook settings are reused without a DB read
+DISPATCH_RETRY_MAX_SECONDS = 30.0  # cap on the dispatcher's backoff after a failed pass
+STOP_WRITER_SECONDS = 5.0  # how long shutdown waits for queued events to be committed
+
+
+class WebhookRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class WebhookService:
+    """
+    Per-agent webhook ingest. A delivery is checked against a short-lived in-memory copy of
+    the agent's settings, then handed to a writer task that group-commits everything that
+    arrives within WEBHOOK_COMMIT_WINDOW_MS in one transaction; the request gets its 202 once
+    that commit is durable. A dispatcher task then batches pending events into runs following
+    the agent's webhook_batch_size / webhook_batch_seconds. Events not yet in a run survive
+    restarts and are dispatched by the next process.
+    """
+
+    def __init__(self):
+        self._config: Dict[int, Tuple[float, Optional[str], int, float]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._pending: Dict[int, Tuple[int, float]] = {}  # agent_id -> (events, monotonic time of the oldest)
+        self._tasks: List[asyncio.Task] = []
+        self._in_flight: List[tuple] = []  # the batch the writer is committing
+
+    # -- configuration --
+
+    def configure(self, session: Session, agent_id: int, enabled: bool, batch_size: Optional[int], batch_seconds: Optional[float], rotate: bool) -> Optional[Tuple[Agent, Optional[str]]]:
+        """Updates an agent's webhook settings; returns the agent and a new token when one was issued."""
+        agent = session.get(Agent, agent_id)
+        if not agent or agent.status == "deleting":
+            return None
+        token = None
+        if not enabled:
+            agent.webhook_token_hash = None
+        elif rotate or agent.webhook_token_hash is None:
+            token = secrets.token_urlsafe(32)
+            agent.webhook_token_hash = _hash_token(token)
+        agent.webhook_batch_size = batch_size
+        agent.webhook_batch_seconds = batch_seconds
+        agent.updated_at = datetime.utcnow()
+        session.add(agent)
+        session.commit()
+        session.refresh(agent)
+        self._config.pop(agent_id, None)
+        return agent, token
+
+    async def _agent_config(self, agent_id: int) -> Tuple[Optional[str], int, float]:
+        cached = self._config.get(agent_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1:]
+        config = await asyncio.to_thread(self._load_config, agent_id)
+        self._config[agent_id] = (time.monotonic() + CONFIG_TTL_SECONDS, *config)
+        return config
+
+    def _load_config(self, agent_id: int) -> Tuple[Optional[str], int, float]:
+        with Session(engine) as session:
+            agent = session.get(Agent, agent_id)
+            if agent is None or agent.status == "deleting":
+                return None, 1, 0.0
+            return agent.webhook_token_hash, agent.webhook_batch_size or 1, agent.webhook_batch_seconds or 0.0
+
+    # -- ingest --
+
+    async def ingest(self, agent_id: int, token: Optional[str], body: bytes) -> int:
+        """Validates and durably stores one event; returns its id. Raises WebhookRejected."""
+        token_hash, _, _ = await self._agent_config(agent_id)
+        if token_hash is None:
+            WEBHOOK_REJECTED.labels("disabled").inc()
+            raise WebhookRejected(404, "Webhook not enabled for this agent")
+        if not token or not hmac.compare_digest(_hash_token(token), token_hash):
+            WEBHOOK_REJECTED.labels("token").inc()
+            raise WebhookRejected(401, "Invalid webhook token")
+        if len(body) > settings.WEBHOOK_MAX_PAYLOAD_BYTES:
+            WEBHOOK_REJECTED.labels("size").inc()
+            raise WebhookRejected(413, f"Payload exceeds {settings.WEBHOOK_MAX_PAYLOAD_BYTES} bytes")
+        try:
+            payload = body.decode("utf-8") if body else "null"
+        except UnicodeDecodeError:
+            WEBHOOK_REJECTED.labels("encoding").inc()
+            raise WebhookRejected(400, "Payload is not valid UTF-8")
+        try:
+            json.loads(payload)
+        except ValueError:
+            WEBHOOK_REJECTED.labels("json").inc()
+            raise WebhookRejected(400, "Payload is not valid JSON")
+        if self._queue is None:
+            raise WebhookRejected(503, "Webhook ingest is not running")
+
+        done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((agent_id, payload, done))
+        return await done
+
+    async def _writer(self, queue: asyncio.Queue):
+        window = settings.WEBHOOK_COMMIT_WINDOW_MS / 1000
+        while True:
+            first = await queue.get()
+            if first is None:
+                return  # stop(): everything queued before it has been committed
+            batch = [first]
+            closing = False
+            deadline = time.monotonic() + window
+            while len(batch) < settings.WEBHOOK_COMMIT_MAX_EVENTS:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 and queue.empty():
+                    break
+                try:
+                    item = queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self._in_flight = batch
+            await self._write_batch(batch)
+            self._in_flight = []
+            if closing:
+                return
+
+    async def _write_batch(self, batch: List[tuple]):
+        try:
+            ids = await asyncio.to_thread(self._commit, [(agent_id, payload) for agent_id, payload, _ in batch])
+        except Exception as e:
+            for _, _, done in batch:
+                if not done.done():
+                    done.set_exception(e)
+            return
+        WEBHOOK_COMMIT_EVENTS.observe(len(batch))
+        WEBHOOK_EVENTS.inc(len(batch))
+        now = time.monotonic()
+        for (agent_id, _, done), event_id in zip(batch, ids):
+            count, oldest = self._pending.get(agent_id, (0, now))
+            self._pending[agent_id] = (count + 1, oldest)
+            if not done.done():
+                done.set_result(event_id)
+        WEBHOOK_PENDING.inc(len(batch))
+        self._wake.set()
+
+    def _commit(self, rows: List[Tuple[int, str]]) -> List[int]:
+        with Session(engine) as session:
+            events = [WebhookEvent(agent_id=agent_id, payload=payload) for agent_id, payload in rows]
+            session.add_all(events)
+            session.flush()
+            ids = [event.id for event in events]
+            session.commit()
+        return ids
+
+    # -- dispatch --
+
+    async def _dispatcher(self):
+        backoff = 0.0
+        while True:
+            self._wake.clear()
+            try:
+                next_due = await self._dispatch_due()
+            except Exception as e:
+                # Pending counts are kept, so the failed agents are retried on the next pass
+                backoff = min(DISPATCH_RETRY_MAX_SECONDS, backoff * 2 or 1.0)
+                print(f"Webhook dispatch failed, retrying in {backoff:.0f}s: {e}")
+                next_due = time.monotonic() + backoff
+            else:
+                backoff = 0.0
+            timeout = None if next_due is None else max(0.0, next_due - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch_due(self) -> Optional[float]:
+        """One pass over agents with pending events; returns when the next batch falls due."""
+        next_due = None
+        now = time.monotonic()
+        for agent_id, (count, oldest) in list(self._pending.items()):
+            _, batch_size, batch_seconds = await self._agent_config(agent_id)
+            due = oldest + batch_seconds
+            if count >= batch_size or due <= now:
+                await self._dispatch_agent(agent_id, batch_size)
+            else:
+                next_due = due if next_due is None else min(next_due, due)
+        return next_due
+
+    async def _dispatch_agent(self, agent_id: int, batch_size: int):
+        """Turns an agent's pending events into runs of up to batch_size events each."""
+        while True:
+            claimed = await asyncio.to_thread(self._claim_events, agent_id, batch_size)
+            if claimed is None:
+                self._pending.pop(agent_id, None)
+                WEBHOOK_PENDING.set(sum(count for count, _ in self._pending.values()))
+                return
+            run_id, taken = claimed
+            WEBHOOK_RUNS.inc()
+
+            count, oldest = self._pending.get(agent_id, (0, time.monotonic()))
+            remaining = count - taken
+            if remaining > 0:
+                self._pending[agent_id] = (remaining, time.monotonic())
+            else:
+                self._pending.pop(agent_id, None)
+            WEBHOOK_PENDING.dec(min(count, taken))
+
+            with Session(engine) as session:
+                run = session.get(Run, run_id)
+                try:
+                    await run_service.launch_run(session, run)
+                except Exception as e:
+                    if agent_executor.draining:
+                        return  # stays queued for the next process
+                    run.status = "error"
+                    run.end_time = datetime.utcnow()
+                    append_system_message(run, f"Could not start run: {e}")
+                    session.add(run)
+                    session.commit()
+            if remaining < batch_size:
+                return
+
+    def _claim_events(self, agent_id: int, batch_size: int) -> Optional[Tuple[int, int]]:
+        """
+        Moves up to batch_size pending events into a new queued run in one transaction (run in
+        a worker thread); returns (run id, events taken), or None when there is nothing to run.
+        """
+        with Session(engine) as session:
+            events = session.exec(
+                select(WebhookEvent)
+                .where(WebhookEvent.agent_id == agent_id, WebhookEvent.run_id.is_(None))
+                .order_by(WebhookEvent.id)
+                .limit(batch_size)
+            ).all()
+            agent = session.get(Agent, agent_id)
+            if not events or agent is None or agent.status == "deleting":
+                return None
+            run = Run(
+                agent_id=agent_id,
+                version_id=agent.current_version_id,
+                trigger_type="webhook",
+                status="queued",
+                input_payload=json.dumps({"events": [
+                    {"id": e.id, "received_at": e.received_at.isoformat(), "payload": json.loads(e.payload)}
+                    for e in events
+                ]}),
+            )
+            session.add(run)
+            session.flush()
+            run_id = run.id
+            session.exec(update(WebhookEvent).where(WebhookEvent.id.in_([e.id for e in events])).values(run_id=run_id))
+            session.commit()
+        return run_id, len(events)
+
+    # -- lifecycle --
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        # Events accepted by a previous process but never dispatched
+        with Session(engine) as session:
+            rows = session.exec(
+                select(WebhookEvent.agent_id, func.count()).where(WebhookEvent.run_id.is_(None)).group_by(WebhookEvent.agent_id)
+            ).all()
+        now = time.monotonic()
+        self._pending = {agent_id: (count, now) for agent_id, count in rows}
+        WEBHOOK_PENDING.set(sum(count for _, count in rows))
+        self._tasks = [asyncio.create_task(self._writer(self._queue)), asyncio.create_task(self._dispatcher())]
+
+    async def stop(self):
+        queue, self._queue = self._queue, None  # new deliveries get a 503 from here on
+        if queue is not None and self._tasks:
+            # The writer commits what is already queued, then exits at the marker
+            queue.put_nowait(None)
+            await asyncio.wait(self._tasks[:1], timeout=STOP_WRITER_SECONDS)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Anything the writer didn't get to: answer those requests rather than leave them hanging
+        leftover = list(self._in_flight)
+        while queue is not None and not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        for _, _, done in leftover:
+            if not done.done():
+                done.set_exception(WebhookRejected(503, "Webhook ingest is shutting down"))
+        self._in_flight = []
+
+    def purge_dispatched(self, max_age_seconds: int) -> int:
+        """Maintenance: deletes events that were turned into runs more than max_age_seconds ago."""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+        with Session(engine) as session:
+            result = session.exec(delete(WebhookEvent).where(WebhookEvent.run_id.is_not(None), WebhookEvent.received_at < cutoff))
+            session.commit()
+        return result.rowcount
+
+webhook_service = WebhookService()
@@ -0,0 +1,176 @@
+"""
+End-to-end benchmark for AgentExecutor's hot path (broadcast, fan-out, flush_db, artifacts).
+
+Drives start_run/stream_logs against the synthetic sandbox backend with a throwaway SQLite DB
+and prints a JSON report so numbers can be compared across commits:
+
+    cd backend
+    python -m benchmarks.executor_bench --lines 20000 --subscribers 4 --runs 2 --json out.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="kernel-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ["ARTIFACTS_DIR"] = os.path.join(_tmp, "artifacts")
+os.environ["SANDBOX_BACKEND"] = "synthetic"
+
+from sqlalchemy import event  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.database import create_db_and_tables, engine  # noqa: E402
+from app.runtime.backends import register_sandbox_backend  # noqa: E402
+from app.runtime.backends.synthetic_backend import SyntheticBackend  # noqa: E402
+from app.runtime.executor import agent_executor  # noqa: E402
+from app.runtime.logs import STDOUT  # noqa: E402
+from app.services.agent_service import agent_service  # noqa: E402
+from benchmarks.common import LoopLagSampler, percentile  # noqa: E402
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is KB on Linux, bytes on macOS; peak rather than current, but close enough
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def parse_latency_ns(record, now_ns: int):
+    # Synthetic stdout lines look like "<seq> <perf_counter_ns> xxxx"
+    if record.stream != STDOUT:
+        return None
+    parts = record.text.split(" ", 2)
+    try:
+        return now_ns - int(parts[1])
+    except (IndexError, ValueError):
+        return None
+
+
+class DbWriteCounter:
+    def __init__(self):
+        self.bytes = 0
+        self.statements = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(("INSERT", "UPDATE")):
+            return
+        self.statements += 1
+        rows = parameters if executemany else [parameters]
+        for row in rows:
+            values = row.values() if isinstance(row, dict) else row
+            for value in values or ():
+                if isinstance(value, (str, bytes, bytearray, memoryview)):
+                    self.bytes += len(value)
+
+
+async def subscribe(run_id: int, latencies: list) -> int:
+    received = 0
+    async for record in agent_executor.stream_logs(run_id):
+        latency = parse_latency_ns(record, time.perf_counter_ns())
+        if latency is not None:
+            latencies.append(latency)
+            received += 1
+    return received
+
+
+async def bench(args) -> dict:
+    create_db_and_tables()
+    if args.frame_interval is not None:
+        settings.LOG_FRAME_INTERVAL_MS = args.frame_interval
+    register_sandbox_backend(SyntheticBackend(
+        lines=args.lines,
+        lines_per_second=args.rate,
+        line_size=args.line_size,
+        artifact_count=args.artifacts,
+        artifact_size=args.artifact_size,
+    ))
+    db_counter = DbWriteCounter()
+    db_path = engine.url.database
+    db_size_before = os.path.getsize(db_path)
+
+    with Session(engine) as session:
+        agent = agent_service.create_agent(session, "bench")
+        runs = [agent_service.create_run(session, agent.id) for _ in range(args.runs)]
+        agent_id, version_id = agent.id, agent.current_version_id
+        run_ids = [r.id for r in runs]
+
+    latencies: list = []
+    lag = LoopLagSampler()
+    rss_before = rss_bytes()
+    lag.start()
+    started = time.perf_counter()
+
+    subscribers = []
+    for run_id in run_ids:
+        await agent_executor.start_run(
+            agent_name="bench", run_id=run_id, code="", dependencies="",
+            agent_id=agent_id, version_id=version_id,
+        )
+        subscribers += [asyncio.create_task(subscribe(run_id, latencies)) for _ in range(args.subscribers)]
+    tasks = [agent_executor._active_runs[r]["task"] for r in run_ids if r in agent_executor._active_runs]
+    await asyncio.gather(*tasks, *subscribers)
+
+    elapsed = time.perf_counter() - started
+    await lag.stop()
+    rss_after = rss_bytes()
+    total_lines = args.lines * args.runs
+
+    return {
+        "config": vars(args),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_lines_per_s": round(total_lines / elapsed, 1),
+        "delivered_lines": len(latencies),
+        "latency_ms": {
+            f"p{q}": round(percentile(latencies, q) / 1e6, 3) if latencies else None
+            for q in (50, 90, 99)
+        } | {"max": round(max(latencies) / 1e6, 3) if latencies else None},
+        "event_loop_lag_ms": {
+            "mean": round(statistics.fmean(lag.samples) * 1e3, 3) if lag.samples else None,
+            "p99": round(percentile(lag.samples, 99) * 1e3, 3) if lag.samples else None,
+            "max": round(max(lag.samples) * 1e3, 3) if lag.samples else None,
+        },
+        "rss_growth_bytes": rss_after - rss_before,
+        "db": {
+            "bytes_written": db_counter.bytes,
+            "write_statements": db_counter.statements,
+            "file_growth_bytes": os.path.getsize(db_path) - db_size_before,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=20000, help="stdout lines per run")
+    parser.add_argument("--rate", type=float, default=0, help="lines/s per run, 0 = unthrottled")
+    parser.add_argument("--line-size", type=int, default=80, help="bytes per line")
+    parser.add_argument("--artifacts", type=int, default=5, help="artifacts written per run")
+    parser.add_argument("--artifact-size", type=int, default=64 * 1024, help="bytes per artifact")
+    parser.add_argument("--subscribers", type=int, default=4, help="stream_logs consumers per run")
+    parser.add_argument("--runs", type=int, default=1, help="concurrent runs")
+    parser.add_argument("--frame-interval", type=int, help="override LOG_FRAME_INTERVAL_MS (0 = one frame per line)")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    json_path = args.json_path
+    del args.json_path
+    report = asyncio.run(bench(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if json_path:
+        with open(json_path, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Cold-start benchmark: how long `import app.main` takes in a fresh interpreter, broken down
+per module with `python -X importtime`.
+
+    cd backend
+    python -m benchmarks.import_bench --repeat 5                # report
+    python -m benchmarks.import_bench --check                   # compare with the baseline
+    python -m benchmarks.import_bench --write-baseline          # accept current numbers
+
+--check exits non-zero when the median total grows past the baseline by more than
+--tolerance, or when a module that should load lazily (see LAZY_MODULES) is imported
+at startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "import_baseline.json")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy SDKs that must only be imported when a request needs them
+LAZY_MODULES = ("openai", "e2b", "e2b_code_interpreter", "cryptography", "zstandard")
+
+_PROBE = (
+    "import sys, json, app.main; "
+    "print('LAZY ' + json.dumps([m for m in %r if m in sys.modules]))" % (LAZY_MODULES,)
+)
+
+
+def measure_once() -> dict:
+    with tempfile.TemporaryDirectory(prefix="kernel-import-") as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", ARTIFACTS_DIR=os.path.join(tmp, "artifacts"))
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        # What app.main imports directly, plus every app module wherever it is first imported
+        if depth <= 1 or name.startswith("app."):
+            modules[name] = int(cumulative)
+    lazy_loaded = []
+    for line in proc.stdout.splitlines():
+        if line.startswith("LAZY "):
+            lazy_loaded = json.loads(line[5:])
+    return {"total_us": modules.get("app.main", 0), "modules": modules, "lazy_loaded": lazy_loaded}
+
+
+def breakdown(modules_runs: list, top: int) -> dict:
+    """Median cumulative ms of the slowest modules (children are included in their parent)."""
+    names = set().union(*(m.keys() for m in modules_runs))
+    medians = {n: statistics.median(m.get(n, 0) for m in modules_runs) / 1000 for n in names}
+    ranked = sorted(medians.items(), key=lambda kv: kv[1], reverse=True)
+    return {name: round(ms, 1) for name, ms in ranked[:top]}
+
+
+def run(repeat: int, top: int) -> dict:
+    runs = [measure_once() for _ in range(repeat)]
+    totals = [r["total_us"] / 1000 for r in runs]
+    return {
+        "repeat": repeat,
+        "python": sys.version.split()[0],
+        "total_ms": {"median": round(statistics.median(totals), 1), "min": round(min(totals), 1), "max": round(max(totals), 1)},
+        "slowest_imports_ms": breakdown([r["modules"] for r in runs], top),
+        "lazy_modules_loaded": sorted(set().union(*(r["lazy_loaded"] for r in runs))),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters to measure")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the breakdown")
+    parser.add_argument("--check", action="store_true", help="fail on regression against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, as a fraction of the baseline")
+    parser.add_argument("--write-baseline", action="store_true", help=f"save the report to {os.path.basename(BASELINE_PATH)}")
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat, args.top)
+    print(json.dumps(report, indent=2))
+
+    if args.write_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            f.write(json.dumps(report, indent=2) + "\n")
+
+    if args.check:
+        failures = []
+        if report["lazy_modules_loaded"]:
+            failures.append(f"imported at startup: {', '.join(report['lazy_modules_loaded'])}")
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+            limit = baseline["total_ms"]["median"] * (1 + args.tolerance)
+            if report["total_ms"]["median"] > limit:
+                failures.append(f"median {report['total_ms']['median']}ms > {limit:.1f}ms (baseline {baseline['total_ms']['median']}ms + {args.tolerance:.0%})")
+        else:
+            print(f"No baseline at {BASELINE_PATH}; run with --write-baseline first", file=sys.stderr)
+        if failures:
+            for failure in failures:
+                print(f"REGRESSION: {failure}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+API load test: drives the real FastAPI app over HTTP with concurrent clients and reports
+p50/p95/p99 latency, throughput and error rate per endpoint, plus event-loop lag of the
+server loop, for each scenario:
+
+    crud        agent create / get / list / dashboard / code update / delete
+    triggers    bursts of concurrent POST /runs/trigger/{id}
+    streams     many /runs/{id}/stream subscribers on live runs
+    artifacts   artifact listing and downloads
+    ai_chat     /ai/chat against a stub OpenAI-compatible server
+
+The app runs under uvicorn in a background thread with the synthetic sandbox backend and a
+throwaway SQLite DB; the LLM is a local stub that streams canned tokens, so no E2B or
+OpenAI keys are needed.
+
+    cd backend
+    python -m benchmarks.load_bench                             # report
+    python -m benchmarks.load_bench --scenario streams --concurrency 64
+    python -m benchmarks.load_bench --check                     # compare with the baseline
+    python -m benchmarks.load_bench --write-baseline            # accept current numbers
+
+--check exits non-zero when an endpoint's p95 grows past the baseline by more than
+--tolerance (plus --slack-ms, so sub-millisecond endpoints don't flap), when its error rate
+rises, or when the server loop's p99 lag regresses the same way. Compare baselines taken
+with the same options on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+_tmp = tempfile.mkdtemp(prefix="kernel-load-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ["ARTIFACTS_DIR"] = os.path.join(_tmp, "artifacts")
+os.environ["SANDBOX_BACKEND"] = "synthetic"
+# Background jobs would only add noise between scenarios
+os.environ.setdefault("LOG_COMPACTION_INTERVAL_SECONDS", "0")
+os.environ.setdefault("LOG_INDEX_INTERVAL_SECONDS", "0")
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from benchmarks.common import LoopLagSampler, percentile  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "load_baseline.json")
+SCENARIOS = ("crud", "triggers", "streams", "artifacts", "ai_chat")
+STUB_MODEL = "stub-coder"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# -- stub LLM --
+
+def stub_llm_app(tokens: int, token_delay: float) -> FastAPI:
+    """Just enough of the Ollama / OpenAI API for AIService: model tags and streamed chat completions."""
+    stub = FastAPI()
+
+    # AIService uses one base URL for both the Ollama tags call and the OpenAI client
+    @stub.get("/api/tags")
+    @stub.get("/v1/api/tags")
+    async def tags():
+        return {"models": [{"name": STUB_MODEL}]}
+
+    @stub.post("/v1/chat/completions")
+    async def completions():
+        async def chunks():
+            base = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": STUB_MODEL}
+            for i in range(tokens):
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+                delta = {"role": "assistant", "content": f"tok{i} "} if i == 0 else {"content": f"tok{i} "}
+                yield f"data: {json.dumps(base | {'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+            yield f"data: {json.dumps(base | {'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return stub
+
+
+# -- servers --
+
+class ServerThread:
+    """Runs an ASGI app under uvicorn on its own event loop in a daemon thread."""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+        self.loop = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.serve())
+
+    def start(self, timeout: float = 30):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"server on port {self.port} did not start")
+            time.sleep(0.05)
+
+    def call(self, coro, timeout: float = 30):
+        """Runs a coroutine on the server's loop from another thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=30)
+
+
+# -- measurement --
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}  # endpoint -> [seconds]
+        self.errors = {}
+
+    async def timed(self, endpoint: str, coro):
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except Exception:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            self.latencies.setdefault(endpoint, [])
+            return None
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - started)
+        return result
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies.get(endpoint, [])
+            errors = self.errors.get(endpoint, 0)
+            total = len(values) + errors
+            endpoints[endpoint] = {
+                "requests": total,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "throughput_rps": round(len(values) / elapsed, 1) if elapsed else None,
+                "latency_ms": {f"p{q}": round(percentile(values, q) * 1e3, 2) if values else None for q in (50, 95, 99)},
+            }
+        return endpoints
+
+
+async def request(client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    res = await client.request(method, url, **kwargs)
+    res.raise_for_status()
+    return res
+
+
+async def consume(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> int:
+    """Reads a streamed response to the end; returns the body size."""
+    size = 0
+    async with client.stream(method, url, **kwargs) as res:
+        res.raise_for_status()
+        async for chunk in res.aiter_bytes():
+            size += len(chunk)
+    return size
+
+
+async def gather_limited(concurrency: int, coros):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coro):
+        async with semaphore:
+            return await coro
+    return await asyncio.gather(*(limited(c) for c in coros))
+
+
+async def wait_finished(client: httpx.AsyncClient, agent_ids, run_ids, timeout: float = 120):
+    """Lets a scenario's runs finish so they don't spill into the next one."""
+    deadline = time.monotonic() + timeout
+    pending = set(run_ids)
+    while pending and time.monotonic() < deadline:
+        for agent_id in agent_ids:
+            runs = (await request(client, "GET", "/runs/", params={"agent_id": agent_id})).json()
+            pending -= {r["id"] for r in runs if r["status"] not in ("queued", "running")}
+        if pending:
+            await asyncio.sleep(0.1)
+
+
+# -- scenarios --
+
+async def scenario_crud(client, rec: Recorder, args):
+    async def lifecycle(i):
+        res = await rec.timed("POST /agents/", request(client, "POST", "/agents/", json={"name": f"crud-{i}-{time.monotonic_ns()}", "code": "print(1)"}))
+        if res is None:
+            return
+        agent_id = res.json()["id"]
+        await rec.timed("GET /agents/{id}/code", request(client, "GET", f"/agents/{agent_id}/code"))
+        await rec.timed("GET /agents/", request(client, "GET", "/agents/"))
+        await rec.timed("GET /agents/dashboard", request(client, "GET", "/agents/dashboard"))
+        await rec.timed("POST /agents/{id}/code", request(client, "POST", f"/agents/{agent_id}/code", json={"code": "print(2)"}))
+        await rec.timed("DELETE /agents/{id}", request(client, "DELETE", f"/agents/{agent_id}"))
+    await gather_limited(args.concurrency, [lifecycle(i) for i in range(args.requests)])
+
+
+async def scenario_triggers(client, rec: Recorder, args):
+    agents = [
+        (await request(client, "POST", "/agents/", json={"name": f"trigger-{i}-{time.monotonic_ns()}", "code": "print(1)"})).json()["id"]
+        for i in range(max(1, args.agents))
+    ]
+    run_ids = []
+
+    async def trigger(i):
+        res = await rec.timed("POST /runs/trigger/{id}", request(client, "POST", f"/runs/trigger/{agents[i % len(agents)]}"))
+        if res is not None:
+            run_ids.append(res.json()["id"])
+    # Every trigger of a burst in flight at once
+    for burst in range(0, args.requests, args.concurrency):
+        await asyncio.gather(*(trigger(i) for i in range(burst, min(args.requests, burst + args.concurrency))))
+    await wait_finished(client, agents, run_ids)
+
+
+async def scenario_streams(client, rec: Recorder, args):
+    agent_id = (await request(client, "POST", "/agents/", json={"name": f"stream-{time.monotonic_ns()}", "code": "print(1)"})).json()["id"]
+    runs = max(1, args.concurrency // args.subscribers)
+    run_ids = [(await request(client, "POST", f"/runs/trigger/{agent_id}")).json()["id"] for _ in range(runs)]
+    subscribers = []
+    for run_id in run_ids:
+        for i in range(args.subscribers):
+            # Alternate the default line-per-event stream and framed streams
+            params = {"framed": "true"} if i % 2 else {}
+            endpoint = "GET /runs/{id}/stream?framed" if params else "GET /runs/{id}/stream"
+            subscribers.append(rec.timed(endpoint, consume(client, "GET", f"/runs/{run_id}/stream", params=params)))
+    await asyncio.gather(*subscribers)
+    await wait_finished(client, [agent_id], run_ids)
+
+
+async def scenario_artifacts(client, rec: Recorder, args):
+    agent_id = (await request(client, "POST", "/agents/", json={"name": f"artifacts-{time.monotonic_ns()}", "code": "print(1)"})).json()["id"]
+    run_id = (await request(client, "POST", f"/runs/trigger/{agent_id}")).json()["id"]
+    await wait_finished(client, [agent_id], [run_id])
+    listing = (await request(client, "GET", f"/artifacts/{agent_id}/{run_id}")).json()
+    names = sorted(listing)
+    if not names:
+        raise RuntimeError("synthetic run produced no artifacts")
+
+    async def fetch(i):
+        await rec.timed("GET /artifacts/{agent}/{run}", request(client, "GET", f"/artifacts/{agent_id}/{run_id}"))
+        await rec.timed("GET /artifacts/{agent}/{run}/{file}", consume(client, "GET", f"/artifacts/{agent_id}/{run_id}/{names[i % len(names)]}"))
+    await gather_limited(args.concurrency, [fetch(i) for i in range(args.requests)])
+
+
+async def scenario_ai_chat(client, rec: Recorder, args):
+    body = {"messages": [{"role": "user", "content": "hello"}], "model": STUB_MODEL}
+    await gather_limited(args.concurrency, [
+        rec.timed("POST /ai/chat", consume(client, "POST", "/ai/chat", json=body)) for _ in range(args.requests)
+    ])
+
+
+RUNNERS = {
+    "crud": scenario_crud,
+    "triggers": scenario_triggers,
+    "streams": scenario_streams,
+    "artifacts": scenario_artifacts,
+    "ai_chat": scenario_ai_chat,
+}
+
+
+def run(args) -> dict:
+    stub_port = free_port()
+    stub = ServerThread(stub_llm_app(args.llm_tokens, args.llm_token_delay_ms / 1000), stub_port)
+    stub.start()
+    os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1"
+    from app.main import app
+    from app.runtime.backends import register_sandbox_backend
+    from app.runtime.backends.synthetic_backend import SyntheticBackend
+
+    register_sandbox_backend(SyntheticBackend(
+        lines=args.lines, lines_per_second=args.rate, artifact_count=args.artifacts, artifact_size=args.artifact_size,
+    ))
+
+    port = free_port()
+    server = ServerThread(app, port)
+    server.start()
+    scenarios = {}
+    try:
+        for name in args.scenario or SCENARIOS:
+            lag = LoopLagSampler()
+
+            async def start_lag():
+                lag.start()
+            server.call(start_lag())
+            rec = Recorder()
+
+            async def drive():
+                limits = httpx.Limits(max_connections=args.concurrency + 8, max_keepalive_connections=args.concurrency + 8)
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}/api", timeout=120, limits=limits) as client:
+                    started = time.perf_counter()
+                    await RUNNERS[name](client, rec, args)
+                    return time.perf_counter() - started
+            elapsed = asyncio.run(drive())
+            server.call(lag.stop())
+            samples = lag.samples
+            scenarios[name] = {
+                "elapsed_s": round(elapsed, 3),
+                "endpoints": rec.report(elapsed),
+                "event_loop_lag_ms": {
+                    "mean": round(statistics.fmean(samples) * 1e3, 2) if samples else None,
+                    "p99": round(percentile(samples, 99) * 1e3, 2) if samples else None,
+                    "max": round(max(samples) * 1e3, 2) if samples else None,
+                },
+            }
+            print(f"{name}: {elapsed:.2f}s", file=sys.stderr)
+    finally:
+        server.stop()
+        stub.stop()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("check", "write_baseline", "tolerance", "slack_ms", "json_path")}
+    return {"python": sys.version.split()[0], "cpus": os.cpu_count(), "config": config, "scenarios": scenarios}
+
+
+def regressions(report: dict, baseline: dict, tolerance: float, slack_ms: float) -> list:
+    def limit(value):
+        return value * (1 + tolerance) + slack_ms
+
+    failures = []
+    for name, scenario in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        for endpoint, stats in scenario["endpoints"].items():
+            base_stats = base["endpoints"].get(endpoint)
+            if base_stats is None:
+                continue
+            p95, base_p95 = stats["latency_ms"]["p95"], base_stats["latency_ms"]["p95"]
+            if p95 is not None and base_p95 is not None and p95 > limit(base_p95):
+                failures.append(f"{name} {endpoint}: p95 {p95}ms > {limit(base_p95):.1f}ms (baseline {base_p95}ms)")
+            if stats["error_rate"] > base_stats["error_rate"]:
+                failures.append(f"{name} {endpoint}: error rate {stats['error_rate']:.2%} (baseline {base_stats['error_rate']:.2%})")
+        lag, base_lag = scenario["event_loop_lag_ms"]["p99"], base["event_loop_lag_ms"]["p99"]
+        if lag is not None and base_lag is not None and lag > limit(base_lag):
+            failures.append(f"{name}: event loop lag p99 {lag}ms > {limit(base_lag):.1f}ms (baseline {base_lag}ms)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only this scenario (repeatable)")
+    parser.add_argument("--requests", type=int, default=200, help="requests (or request sequences) per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--agents", type=int, default=8, help="agents the trigger bursts are spread over")
+    parser.add_argument("--subscribers", type=int, default=8, help="stream subscribers per run; the streams scenario opens --concurrency in total")
+    parser.add_argument("--lines", type=int, default=500, help="stdout lines per synthetic run")
+    parser.add_argument("--rate", type=float, default=2000, help="lines/s per synthetic run, 0 = unthrottled")
+    parser.add_argument("--artifacts", type=int, default=4, help="artifacts per synthetic run")
+    parser.add_argument("--artifact-size", type=int, default=256 * 1024, help="bytes per artifact")
+    parser.add_argument("--llm-tokens", type=int, default=50, help="chunks the stub LLM streams per completion")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=2, help="stub LLM delay per chunk")
+    parser.add_argument("--check", action="store_true", help="fail on regression against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown, as a fraction of the baseline")
+    parser.add_argument("--slack-ms", type=float, default=5, help="allowed slowdown in ms on top of --tolerance")
+    parser.add_argument("--write-baseline", action="store_true", help=f"save the report to {os.path.basename(BASELINE_PATH)}")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            f.write(output + "\n")
+    if args.write_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            f.write(output + "\n")
+
+    if args.check:
+        if not os.path.exists(BASELINE_PATH):
+            print(f"No baseline at {BASELINE_PATH}; run with --write-baseline first", file=sys.stderr)
+            return
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        failures = regressions(report, baseline, args.tolerance, args.slack_ms)
+        if failures:
+            for failure in failures:
+                print(f"REGRESSION: {failure}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
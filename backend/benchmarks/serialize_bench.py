@@ -0,0 +1,184 @@
+"""
+List endpoint serialization benchmark: the row-tuple + orjson path (app.api.responses) against
+the previous ORM object + response_model path, on a seeded throwaway DB.
+
+The previous handlers are mounted unchanged under /legacy on the same app, so both paths are
+measured end to end through FastAPI in one process. Every
+endpoint's fast response is also checked to decode to the same JSON as the legacy one.
+
+    cd backend
+    python -m benchmarks.serialize_bench --agents 50 --runs 40 --versions 20 --json out.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="kernel-serialize-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ["ARTIFACTS_DIR"] = os.path.join(_tmp, "artifacts")
+os.environ["SANDBOX_BACKEND"] = "synthetic"
+
+from datetime import datetime, timedelta  # noqa: E402
+from typing import List  # noqa: E402
+
+from fastapi import APIRouter, Depends  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+from app.api.endpoints.secrets import SecretRead  # noqa: E402
+from app.api.responses import NDJSON, _orjson  # noqa: E402
+from app.core.database import create_db_and_tables, engine, get_session  # noqa: E402
+from app.core.security import encrypt_value  # noqa: E402
+from app.models import Agent, AgentVersion, Run, RunRead, Secret  # noqa: E402
+from app.models.link_agent_secret import LinkAgentSecret  # noqa: E402
+from app.runtime.logs import STDOUT, encode_records, make_record  # noqa: E402
+from app.services.agent_service import agent_service  # noqa: E402
+from app.services.secret_service import secret_service  # noqa: E402
+
+legacy = APIRouter()
+
+
+@legacy.get("/agents/", response_model=List[Agent])
+def legacy_list_agents(session: Session = Depends(get_session)):
+    return agent_service.list_agents(session)
+
+
+@legacy.get("/agents/{agent_id}/versions", response_model=List[dict])
+def legacy_list_agent_versions(agent_id: int, session: Session = Depends(get_session)):
+    versions = agent_service.list_agent_versions(session, agent_id)
+    return [{"id": v.id, "created_at": v.created_at, "parent_version_id": v.parent_version_id, "code": v.code} for v in versions]
+
+
+@legacy.get("/agents/{agent_id}/secrets", response_model=List[dict])
+def legacy_list_agent_secrets(agent_id: int, session: Session = Depends(get_session)):
+    return [{"id": s.id, "key": s.key} for s in secret_service.get_links(session, agent_id)]
+
+
+@legacy.get("/runs/", response_model=List[RunRead])
+def legacy_list_actions(agent_id: int, session: Session = Depends(get_session)):
+    return [RunRead.from_run(run) for run in agent_service.list_runs(session, agent_id)]
+
+
+@legacy.get("/secrets/", response_model=List[SecretRead])
+def legacy_list_secrets(session: Session = Depends(get_session)):
+    return [
+        SecretRead(id=s.id, key=s.key, last_4_chars=s.last_4_chars or "", description=s.description)
+        for s in secret_service.list_secrets(session)
+    ]
+
+
+def seed(args) -> int:
+    """Returns the id of the agent carrying the runs and versions."""
+    code = "".join(f"def step_{i}(x):\n    return x + {i}\n\n" for i in range(args.code_lines // 3))
+    log_data = encode_records([make_record(i, STDOUT, f"line {i} " + "x" * 60) for i in range(args.log_lines)])
+    started = datetime.utcnow() - timedelta(days=1)
+    with Session(engine) as session:
+        agents = [Agent(name=f"agent-{i}", description="benchmark agent " * 4, schedule="*/5 * * * *") for i in range(args.agents)]
+        session.add_all(agents)
+        session.flush()
+        target = agents[0].id
+        versions = [AgentVersion(agent_id=target, code=code, dependencies="requests\n") for _ in range(args.versions)]
+        session.add_all(versions)
+        session.flush()
+        session.add_all([
+            Run(
+                agent_id=target, version_id=versions[0].id, status="success", trigger_type="manual",
+                start_time=started + timedelta(seconds=i), end_time=started + timedelta(seconds=i, milliseconds=500),
+                log_data=log_data, artifacts_written="[]", created_at=started + timedelta(seconds=i),
+            )
+            for i in range(args.runs)
+        ])
+        secrets = [
+            Secret(key=f"KEY_{i}", value=encrypt_value(f"value-{i:04d}"), last_4_chars=f"{i:04d}", description="token")
+            for i in range(args.secrets)
+        ]
+        session.add_all(secrets)
+        session.flush()
+        session.add_all([LinkAgentSecret(agent_id=target, secret_id=s.id) for s in secrets])
+        session.commit()
+    return target
+
+
+def measure(client: TestClient, url: str, repeat: int, headers=None) -> dict:
+    timings, size = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        res = client.get(url, headers=headers)
+        timings.append(time.perf_counter() - started)
+        res.raise_for_status()
+        size = len(res.content)
+    return {"median_ms": round(statistics.median(timings) * 1e3, 2), "min_ms": round(min(timings) * 1e3, 2), "bytes": size}
+
+
+def run(args) -> dict:
+    create_db_and_tables()
+    agent_id = seed(args)
+    from app.main import app
+    app.include_router(legacy, prefix="/legacy")
+    endpoints = {
+        "list_agents": "/agents/",
+        "list_actions": f"/runs/?agent_id={agent_id}",
+        "list_actions_no_logs": f"/runs/?agent_id={agent_id}&logs=false",
+        "list_agent_versions": f"/agents/{agent_id}/versions",
+        "list_agent_secrets": f"/agents/{agent_id}/secrets",
+        "list_secrets": "/secrets/",
+    }
+    report = {}
+    with TestClient(app) as client:
+        for name, path in endpoints.items():
+            legacy_path = "/legacy" + path.replace("&logs=false", "")
+            fast = client.get("/api" + path).json()
+            expected = client.get(legacy_path).json()
+            if name.endswith("_no_logs"):
+                expected = [dict(run, logs="") for run in expected]
+            if fast != expected:
+                raise SystemExit(f"{name}: fast path response differs from the legacy one")
+            ndjson = [json.loads(line) for line in client.get("/api" + path, headers={"Accept": NDJSON}).text.splitlines()]
+            if ndjson != fast:
+                raise SystemExit(f"{name}: NDJSON rows differ from the JSON list")
+
+            before = measure(client, legacy_path, args.repeat)
+            after = measure(client, "/api" + path, args.repeat)
+            streamed = measure(client, "/api" + path, args.repeat, headers={"Accept": NDJSON})
+            report[name] = {
+                "rows": len(fast),
+                "legacy": before,
+                "fast": after,
+                "ndjson": streamed,
+                "speedup": round(before["median_ms"] / after["median_ms"], 2) if after["median_ms"] else None,
+            }
+    return {
+        "config": vars(args),
+        "encoder": "orjson" if _orjson() is not None else "json",
+        "python": sys.version.split()[0],
+        "endpoints": report,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=500, help="agents for list_agents")
+    parser.add_argument("--runs", type=int, default=2000, help="runs of the measured agent")
+    parser.add_argument("--versions", type=int, default=500, help="code versions of the measured agent")
+    parser.add_argument("--secrets", type=int, default=200, help="secrets, all linked to the measured agent")
+    parser.add_argument("--log-lines", type=int, default=20, help="stored log lines per run")
+    parser.add_argument("--code-lines", type=int, default=150, help="lines of code per version")
+    parser.add_argument("--repeat", type=int, default=5, help="requests per endpoint and path")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    json_path = args.json_path
+    del args.json_path
+    output = json.dumps(run(args), indent=2)
+    print(output)
+    if json_path:
+        with open(json_path, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import pytest
+
+from app.services.code_patch import PatchError, apply_patch, parse_patch, patch_code
+
+CODE = """max = 1
+x = 1
+
+
+def main():
+    print(x, max)
+"""
+
+
+def block(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n"
+
+
+def test_search_matches_whole_line_not_substring():
+    # "x = 1\n" is also the tail of "max = 1\n"; only the whole line may match
+    patched = patch_code(CODE, block("x = 1\n", "x = 2\n"))
+    assert patched.splitlines()[:2] == ["max = 1", "x = 2"]
+
+
+def test_search_inside_a_line_does_not_match():
+    with pytest.raises(PatchError, match="does not match"):
+        apply_patch("max = 1\n", [("x = 1\n", "x = 2\n")])
+
+
+def test_trailing_whitespace_is_ignored():
+    patched = apply_patch(CODE, [("    print(x, max)   \n", "    print(max)\n")])
+    assert patched.endswith("    print(max)\n")
+
+
+def test_ambiguous_search_is_rejected():
+    with pytest.raises(PatchError, match="matches 2 places"):
+        apply_patch("a = 1\na = 1\n", [("a = 1\n", "a = 2\n")])
+
+
+def test_empty_replace_deletes_lines():
+    assert apply_patch(CODE, [("x = 1\n", "")]).splitlines()[:2] == ["max = 1", ""]
+
+
+def test_patch_that_breaks_syntax_is_rejected():
+    with pytest.raises(PatchError, match="does not compile"):
+        patch_code(CODE, block("def main():\n", "def main(:\n"))
+
+
+def test_text_around_blocks_is_ignored():
+    assert parse_patch("Here is the fix:\n" + block("x = 1\n", "x = 2\n")) == [("x = 1\n", "x = 2\n")]
@@ -1,5 +1,5 @@
 import { ActiveSession } from "@/lib/active-session";
-import { Agent, deleteAgent, getAgents, triggerRun } from "@/lib/api";
+import { Agent, AgentSummary, deleteAgent, getDashboard, triggerRun } from "@/lib/api";
 import { useTerminalContext } from "@/lib/terminal-context";
 import clsx from "clsx";
 import { useEffect, useState } from "react";
@@ -11,7 +11,7 @@ interface AgentListProps {
 }
 
 export default function AgentList({ initialAgents }: AgentListProps) {
-    const [agents, setAgents] = useState<Agent[]>(initialAgents || []);
+    const [agents, setAgents] = useState<(Agent | AgentSummary)[]>(initialAgents || []);
     const [loading, setLoading] = useState(!initialAgents);
     const [error, setError] = useState<string | null>(null);
 
@@ -21,7 +21,7 @@ export default function AgentList({ initialAgents }: AgentListProps) {
 
     const fetchAgents = async () => {
         try {
-            const data = await getAgents();
+            const data = await getDashboard();
             setAgents(data);
             setError(null);
         } catch (e) {
@@ -127,6 +127,11 @@ export default function AgentList({ initialAgents }: AgentListProps) {
                     <span className="w-4 font-bold text-center">{selected ? ">" : " "}</span>
                     <span className="w-48 font-bold">{agent.name}</span>
                     <span className={clsx(agent.status === "active" ? "text-green-500" : "text-gray-600")}>{agent.status}</span>
+                    {"latest_run" in agent && agent.latest_run && (
+                        <span className={clsx("w-24 text-xs", agent.latest_run.status === "success" ? "text-green-700" : agent.latest_run.status === "running" ? "text-yellow-500" : "text-red-500")}>
+                            {agent.latest_run.status}
+                        </span>
+                    )}
                     <span className="text-gray-500 text-xs italic flex-1">{agent.description}</span>
                 </div>
             )}
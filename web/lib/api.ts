@@ -31,6 +31,18 @@ export async function getAgents(): Promise<Agent[]> {
   return res.json();
 }
 
+export interface AgentSummary extends Agent {
+  latest_run: { id: number; status: string; trigger_type: string; start_time?: string; end_time?: string } | null;
+  run_counts: { total: number; success: number; failed: number; active: number };
+  last_success_at: string | null;
+}
+
+export async function getDashboard(): Promise<AgentSummary[]> {
+  const res = await fetch(`${API_URL}/agents/dashboard`);
+  if (!res.ok) throw new Error("Failed to fetch dashboard");
+  return res.json();
+}
+
 export async function getAgentVersions(id: number): Promise<AgentVersion[]> {
   const res = await fetch(`${API_URL}/agents/${id}/versions`);
   if (!res.ok) throw new Error("Failed to fetch agent versions");